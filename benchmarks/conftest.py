@@ -0,0 +1,223 @@
+"""Fixtures of the benchmark suite: synthetic reports scaled from the demo reports shipped
+in `static/data`, their workflow dataframes and a database to store them.
+
+The size of the reports is set with `--report-companies` and `--report-chunks`, and the
+demo report they are built from with `--report-demo`. The peak memory of every case is
+reported at the end of the run and saved in the `extra_info` of its benchmark.
+"""
+
+import json
+import os
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlmodel import SQLModel
+
+# Override environment variables before the settings are loaded
+os.environ.update(
+    {
+        "BIGDATA_API_KEY": "fake-key",
+        "OPENAI_API_KEY": "fake-key",
+        "LOG_LEVEL": "ERROR",
+    }
+)
+
+from bigdata_risk_analyzer.api.db import create_db_engine  # noqa: E402
+from bigdata_risk_analyzer.api.models import RiskAnalysisRequest  # noqa: E402
+from bigdata_risk_analyzer.api.storage import StorageManager  # noqa: E402
+from bigdata_risk_analyzer.models import RiskAnalysisResponse  # noqa: E402
+from bigdata_risk_analyzer.service import LABELED_CHUNK_COLUMNS  # noqa: E402
+
+DEMO_REPORTS_DIR = Path(__file__).parents[1] / "bigdata_risk_analyzer/static/data"
+DEMO_REPORTS = sorted(path.stem for path in DEMO_REPORTS_DIR.glob("*.json"))
+
+peak_memory_key = pytest.StashKey[dict[str, int]]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("synthetic reports")
+    group.addoption(
+        "--report-demo",
+        default="import_tariffs",
+        choices=DEMO_REPORTS,
+        help="Demo report the synthetic reports are built from",
+    )
+    group.addoption(
+        "--report-companies",
+        type=int,
+        default=500,
+        help="Number of companies of the synthetic reports",
+    )
+    group.addoption(
+        "--report-chunks",
+        type=int,
+        default=20_000,
+        help="Number of evidence chunks of the synthetic reports",
+    )
+
+
+def pytest_configure(config):
+    config.stash[peak_memory_key] = {}
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    peaks = config.stash[peak_memory_key]
+    if not peaks:
+        return
+    terminalreporter.section("peak memory")
+    width = max(len(name) for name in peaks)
+    for name, peak in peaks.items():
+        terminalreporter.write_line(f"{name:<{width}}  {peak / 1024 / 1024:>8.1f} MiB")
+
+
+class DemoTaxonomy:
+    """Stand-in for the taxonomy returned by the workflow, only `_to_dict` is used."""
+
+    def __init__(self, taxonomy: dict):
+        self.taxonomy = taxonomy
+
+    def _to_dict(self) -> dict:
+        return self.taxonomy
+
+
+def copy_name(name: str, copy: int) -> str:
+    return name if copy == 0 else f"{name} #{copy}"
+
+
+def scale_report(demo: dict, n_companies: int, n_chunks: int) -> dict:
+    """Report with the taxonomy of a demo report and `n_companies` and `n_chunks` copied
+    from it, the copies of a company are renamed so every company is distinct."""
+    scoring = list(demo["risk_scoring"].items())
+    risk_scoring = {}
+    for i in range(n_companies):
+        name, company = scoring[i % len(scoring)]
+        copy = i // len(scoring)
+        risk_scoring[copy_name(name, copy)] = {
+            **company,
+            "ticker": copy_name(company["ticker"], copy),
+        }
+
+    n_copies = max(1, -(-n_companies // len(scoring)))
+    content = []
+    for i in range(n_chunks):
+        chunk = demo["content"][i % len(demo["content"])]
+        copy = (i // len(demo["content"])) % n_copies
+        content.append(
+            {
+                **chunk,
+                "company": copy_name(chunk["company"], copy),
+                "ticker": copy_name(chunk["ticker"], copy),
+                "document_id": f"{chunk['document_id']}-{i}",
+            }
+        )
+    return {
+        "risk_scoring": risk_scoring,
+        "risk_taxonomy": demo["risk_taxonomy"],
+        "content": content,
+    }
+
+
+@pytest.fixture(scope="session")
+def synthetic_report(pytestconfig) -> dict:
+    demo_path = DEMO_REPORTS_DIR / f"{pytestconfig.getoption('report_demo')}.json"
+    return scale_report(
+        json.loads(demo_path.read_text()),
+        pytestconfig.getoption("report_companies"),
+        pytestconfig.getoption("report_chunks"),
+    )
+
+
+@pytest.fixture(scope="session")
+def report(synthetic_report) -> RiskAnalysisResponse:
+    return RiskAnalysisResponse.model_validate(synthetic_report)
+
+
+@pytest.fixture(scope="session")
+def workflow_frames(
+    synthetic_report,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, DemoTaxonomy]:
+    """Output of the workflow that `build_response` turns into the synthetic report."""
+    df_company = pd.DataFrame(
+        [
+            {
+                "Company": name,
+                "Ticker": company["ticker"],
+                "Sector": company["sector"],
+                "Industry": company["industry"],
+                "Composite Score": company["composite_score"],
+                **company["risks"],
+            }
+            for name, company in synthetic_report["risk_scoring"].items()
+        ]
+    )
+    df_motivation = pd.DataFrame(
+        {
+            "Company": list(synthetic_report["risk_scoring"]),
+            "Motivation": [
+                company["motivation"]
+                for company in synthetic_report["risk_scoring"].values()
+            ],
+        }
+    )
+    df_labeled = pd.DataFrame(synthetic_report["content"]).rename(
+        columns={field: column for column, field in LABELED_CHUNK_COLUMNS.items()}
+    )
+    return (
+        df_company,
+        df_motivation,
+        df_labeled,
+        DemoTaxonomy(synthetic_report["risk_taxonomy"]),
+    )
+
+
+@pytest.fixture(scope="session")
+def request_payload(synthetic_report, pytestconfig) -> dict:
+    """Request of an analysis of the companies of the synthetic report."""
+    return {
+        "main_theme": synthetic_report["risk_taxonomy"]["label"],
+        "focus": "Impact on costs, revenues and supply chains",
+        "companies": [
+            f"{i:06X}" for i in range(pytestconfig.getoption("report_companies"))
+        ],
+        "start_date": "2025-04-01",
+        "end_date": "2025-10-01",
+        "keywords": ["tariffs", "costs"],
+        "frequency": "M",
+    }
+
+
+@pytest.fixture(scope="session")
+def request_model(request_payload) -> RiskAnalysisRequest:
+    return RiskAnalysisRequest.model_validate(request_payload)
+
+
+@pytest.fixture(scope="session")
+def db_string(tmp_path_factory) -> str:
+    db_string = f"sqlite:///{tmp_path_factory.mktemp('db') / 'benchmarks.db'}"
+    SQLModel.metadata.create_all(create_db_engine(db_string))
+    return db_string
+
+
+@pytest.fixture(scope="session")
+def storage_manager(db_string) -> StorageManager:
+    return StorageManager(create_db_engine(db_string))
+
+
+@pytest.fixture
+def peak_memory(benchmark, request):
+    """Run a function once more while tracing its allocations, to record its peak memory
+    next to the timings of the benchmark."""
+
+    def measure(fn, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_mib"] = round(peak / 1024 / 1024, 2)
+        request.config.stash[peak_memory_key][request.node.name] = peak
+
+    return measure
@@ -0,0 +1,176 @@
+"""Load test of a running service: submits risk analyses to `/risk-analysis` at a target
+rate and follows each one with `/status` until it completes, then reports the latencies,
+the throughput and the rejections of the job queue.
+
+Run the service with `BACKEND=replay` to test it without Bigdata.com and LLM access, the
+analyses submitted are the requests of the recordings in `--recordings` (record them
+first with `BACKEND=record`), or the request in a JSON file with `--request`:
+
+    uv run python benchmarks/load_test.py --qps 2 --duration 60 --recordings recordings
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+def load_requests(recordings: str | None, request_file: str | None) -> list[dict]:
+    if request_file:
+        return [json.loads(Path(request_file).read_text())]
+    store = CheckpointStore(recordings)
+    requests = [
+        store.load(path.parent.name, "request")
+        for path in sorted(Path(recordings).glob(f"*/request{CheckpointStore.suffix}"))
+    ]
+    if not requests:
+        raise SystemExit(f"No recorded requests found in {recordings}")
+    return requests
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LoadTest:
+    def __init__(
+        self, url: str, token: str | None, poll_interval: float, timeout: float
+    ):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.outcomes = Counter()
+        self.submit_latencies = []
+        self.status_latencies = []
+        self.completion_times = []
+
+    def call(self, method: str, path: str, params: dict, body: dict | None = None):
+        if self.token:
+            params = {**params, "token": self.token}
+        request = urllib.request.Request(
+            f"{self.url}{path}?{urllib.parse.urlencode(params)}",
+            method=method,
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            headers={"Content-Type": "application/json"},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, payload = response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, None
+        return status, payload, time.perf_counter() - start
+
+    def record(self, outcome: str, latencies: list[float] | None = None, value=None):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            if latencies is not None:
+                latencies.append(value)
+
+    def run_analysis(self, body: dict):
+        start = time.perf_counter()
+        try:
+            status, payload, latency = self.call(
+                "POST", "/risk-analysis", {"use_cache": "false"}, body
+            )
+        except OSError:
+            self.record("submit_error")
+            return
+        self.record(f"submit_{status}", self.submit_latencies, latency)
+        if status != 202:
+            return
+
+        request_id, since = payload["request_id"], 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                status, payload, latency = self.call(
+                    "GET",
+                    f"/status/{request_id}",
+                    {"include_report": "false", "since": since},
+                )
+            except OSError:
+                self.record("status_error")
+                continue
+            with self.lock:
+                self.status_latencies.append(latency)
+            if status != 200:
+                self.record(f"status_{status}")
+                return
+            since = payload["log_cursor"]
+            if payload["status"] in TERMINAL_STATUSES:
+                self.record(
+                    payload["status"],
+                    self.completion_times,
+                    time.perf_counter() - start,
+                )
+                return
+
+    def run(self, requests: list[dict], qps: float, duration: float) -> float:
+        n_submissions = int(qps * duration)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=min(max(n_submissions, 1), 512)
+        ) as executor:
+            for i in range(n_submissions):
+                # Keep the target rate regardless of how long the submissions take
+                time.sleep(max(0.0, start + i / qps - time.perf_counter()))
+                executor.submit(self.run_analysis, requests[i % len(requests)])
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float):
+        print(f"Elapsed: {elapsed:.1f}s")
+        for outcome, count in sorted(self.outcomes.items()):
+            print(f"  {outcome}: {count}")
+        print(f"Throughput: {self.outcomes['completed'] / elapsed:.2f} analyses/s")
+        for name, values in [
+            ("Submit latency", self.submit_latencies),
+            ("Status latency", self.status_latencies),
+            ("Time to complete", self.completion_times),
+        ]:
+            print(
+                f"{name}: p50={percentile(values, 0.5) * 1000:.1f}ms "
+                f"p95={percentile(values, 0.95) * 1000:.1f}ms "
+                f"p99={percentile(values, 0.99) * 1000:.1f}ms (n={len(values)})"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", default=None, help="ACCESS_TOKEN of the service")
+    parser.add_argument("--qps", type=float, default=1.0, help="Submissions per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--recordings", default="recordings")
+    parser.add_argument("--request", default=None, help="JSON file with a request")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    load_test = LoadTest(args.url, args.token, args.poll_interval, args.timeout)
+    requests = load_requests(args.recordings, args.request)
+    print(
+        f"Submitting {int(args.qps * args.duration)} analyses at {args.qps} per second "
+        f"({len(requests)} distinct requests) to {args.url}"
+    )
+    elapsed = load_test.run(requests, args.qps, args.duration)
+    load_test.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmarks of the paths run for every analysis and every poll of its status, on the
+synthetic reports of `conftest.py`.
+
+Run with `make benchmark`, see `uv run -m pytest benchmarks --help` for the options.
+"""
+
+import asyncio
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from bigdata_risk_analyzer.api.app import app, get_storage_manager
+from bigdata_risk_analyzer.api.db import create_async_db_engine
+from bigdata_risk_analyzer.api.models import RiskAnalysisRequest
+from bigdata_risk_analyzer.api.sql_models import SQLRiskAnalyzerReport
+from bigdata_risk_analyzer.api.storage import AsyncStorageManager
+from bigdata_risk_analyzer.service import build_response
+
+LOG_MESSAGES = 1_000
+
+
+@pytest.fixture(scope="module")
+def completed_request_id(storage_manager, request_model, report):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    for i in range(LOG_MESSAGES):
+        storage_manager.log_message(request_id, f"Message {i}")
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+    return request_id
+
+
+@pytest.fixture(scope="module")
+def get(db_string):
+    """GET requests to the app, on its own event loop so the async engine of the storage
+    manager is reused between requests."""
+    loop = asyncio.new_event_loop()
+    async_engine = create_async_db_engine(db_string)
+    async_storage_manager = AsyncStorageManager(async_engine)
+    app.dependency_overrides[get_storage_manager] = lambda: async_storage_manager
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+    def get(url: str, **params) -> httpx.Response:
+        return loop.run_until_complete(client.get(url, params=params))
+
+    yield get
+
+    app.dependency_overrides.pop(get_storage_manager)
+    loop.run_until_complete(client.aclose())
+    loop.run_until_complete(async_engine.dispose())
+    loop.close()
+
+
+def test_build_response(benchmark, peak_memory, workflow_frames, report):
+    response = benchmark(build_response, *workflow_frames)
+    peak_memory(build_response, *workflow_frames)
+    assert response == report
+
+
+def test_report_from_response(benchmark, peak_memory, request_model, report):
+    request_id = uuid4()
+    sql_report = benchmark(
+        SQLRiskAnalyzerReport.from_risk_analyzer_response,
+        request_id,
+        request_model,
+        report,
+    )
+    peak_memory(
+        SQLRiskAnalyzerReport.from_risk_analyzer_response,
+        request_id,
+        request_model,
+        report,
+    )
+    assert sql_report.content_size == len(report.content.root)
+
+
+def test_request_validation(benchmark, peak_memory, request_payload):
+    request = benchmark(RiskAnalysisRequest.model_validate, request_payload)
+    peak_memory(RiskAnalysisRequest.model_validate, request_payload)
+    assert len(request.companies) == len(request_payload["companies"])
+
+
+def test_log_message(benchmark, peak_memory, storage_manager, request_model):
+    def new_job():
+        request_id = uuid4()
+        storage_manager.enqueue_job(request_id, request_model)
+        return (request_id,), {}
+
+    def log_messages(request_id):
+        for i in range(LOG_MESSAGES):
+            storage_manager.log_message(request_id, f"Message {i}")
+        storage_manager.flush_logs()
+
+    benchmark.pedantic(log_messages, setup=new_job, rounds=10)
+    (request_id,), _ = new_job()
+    peak_memory(log_messages, request_id)
+    assert len(storage_manager.get_logs(request_id)) == LOG_MESSAGES
+
+
+def test_mark_workflow_as_completed(
+    benchmark, peak_memory, storage_manager, request_model, report
+):
+    def new_job():
+        request_id = uuid4()
+        storage_manager.enqueue_job(request_id, request_model)
+        return (request_id, request_model, report), {}
+
+    benchmark.pedantic(
+        storage_manager.mark_workflow_as_completed, setup=new_job, rounds=5
+    )
+    args, _ = new_job()
+    peak_memory(storage_manager.mark_workflow_as_completed, *args)
+    assert storage_manager.get_report_version(args[0]) is not None
+
+
+def test_get_report(benchmark, peak_memory, storage_manager, completed_request_id):
+    status = benchmark(storage_manager.get_report, completed_request_id)
+    peak_memory(storage_manager.get_report, completed_request_id)
+    assert len(status.logs) == LOG_MESSAGES
+
+
+@pytest.mark.parametrize("include_report", [True, False])
+def test_status(benchmark, peak_memory, get, completed_request_id, include_report):
+    url = f"/status/{completed_request_id}"
+    response = benchmark(get, url, include_report=include_report)
+    peak_memory(get, url, include_report=include_report)
+    assert response.status_code == 200
+    assert ("content" in response.text) == include_report
@@ -1,55 +1,261 @@
-from functools import partial
-from typing import Annotated
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Annotated, AsyncIterator
 from uuid import UUID, uuid4
 
 from bigdata_client import Bigdata
 from bigdata_client.models.search import DocumentType
-from fastapi import BackgroundTasks, Body, Depends, FastAPI, HTTPException, Security
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from sqlmodel import Session, SQLModel, create_engine
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Security
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
+from pydantic import ValidationError
+from sqlmodel import SQLModel
+from starlette.concurrency import run_in_threadpool
 
 from bigdata_risk_analyzer import LOG_LEVEL, __version__, logger
+from bigdata_risk_analyzer.api.assets import StaticAssets
+from bigdata_risk_analyzer.api.compression import CompressionMiddleware
+from bigdata_risk_analyzer.api.db import (
+    create_async_db_engine,
+    create_db_engine,
+    has_async_driver,
+)
+from bigdata_risk_analyzer.api.events import (
+    TERMINAL_STATUSES,
+    WorkflowEvent,
+    WorkflowEventType,
+    hub,
+)
+from bigdata_risk_analyzer.api.maintenance import DatabaseMaintenance
+from bigdata_risk_analyzer.api.migrations import migrate
 from bigdata_risk_analyzer.api.models import (
     ExampleWatchlists,
+    ReportContentFacets,
+    ReportContentFilters,
+    ReportContentPage,
+    ReportExtensionRequest,
+    ReportListFilters,
+    ReportScorePage,
+    ReportSummaryPage,
+    RiskAnalysisBatchAcceptedResponse,
+    RiskAnalysisBatchRequest,
+    RiskAnalysisBatchStatusResponse,
     RiskAnalysisRequest,
     RiskAnalyzerAcceptedResponse,
     RiskAnalyzerStatusResponse,
+    ScoreAggregate,
+    ScoreFilters,
+    ScoreGroupBy,
+    ScoreInterval,
     WorkflowStatus,
+    example_analysis_window,
+)
+from bigdata_risk_analyzer.api.scheduler import (
+    JobScheduler,
+    QueueFullError,
+    WorkerType,
 )
 from bigdata_risk_analyzer.api.secure import query_scheme
-from bigdata_risk_analyzer.api.storage import StorageManager
-from bigdata_risk_analyzer.api.utils import get_example_values_from_schema
+from bigdata_risk_analyzer.api.storage import AsyncStorageManager, StorageManager
+from bigdata_risk_analyzer.api.utils import (
+    etag_matches,
+    get_content_etag,
+    get_example_values_from_schema,
+    get_report_etag,
+)
+from bigdata_risk_analyzer.backends import Backend, RecordedBigdata
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+from bigdata_risk_analyzer.entity_cache import EntityCache
+from bigdata_risk_analyzer.metrics import RequestMetricsMiddleware, render_metrics
 from bigdata_risk_analyzer.models import RiskAnalysisResponse
-from bigdata_risk_analyzer.service import process_request
+from bigdata_risk_analyzer.service import prepare_companies, process_request
 from bigdata_risk_analyzer.settings import settings
 from bigdata_risk_analyzer.templates import loader
 from bigdata_risk_analyzer.traces import TraceEventName, send_trace
 
-BIGDATA: Bigdata | None = None
-engine = create_engine(settings.DB_STRING, echo=LOG_LEVEL == "DEBUG")
+BIGDATA: Bigdata | RecordedBigdata | None = None
+engine = create_db_engine(
+    settings.DB_STRING,
+    echo=LOG_LEVEL == "DEBUG",
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+)
+# Used by the endpoints, which do not block a thread while waiting for the database.
+# Databases without an async driver are queried with the sync engine from a thread
+async_engine = (
+    create_async_db_engine(
+        settings.DB_STRING,
+        echo=LOG_LEVEL == "DEBUG",
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    if has_async_driver(settings.DB_STRING)
+    else None
+)
+if async_engine is None:
+    logger.warning(
+        "No async driver for the database, the endpoints query it from worker threads",
+        backend=engine.url.get_backend_name(),
+    )
+# Every operation gets its own session from the engine pool
+storage_manager = StorageManager(engine, event_hub=hub)
+async_storage_manager = AsyncStorageManager(async_engine or engine)
+
+# Companies and watchlists resolved by the jobs
+entity_cache = (
+    EntityCache(
+        ttl_seconds=settings.ENTITY_CACHE_TTL_SECONDS,
+        watchlist_ttl_seconds=settings.ENTITY_CACHE_WATCHLIST_TTL_SECONDS,
+        max_size=settings.ENTITY_CACHE_MAX_SIZE,
+        engine=engine if settings.ENTITY_CACHE_PERSIST else None,
+    )
+    if settings.ENTITY_CACHE_TTL_SECONDS > 0
+    else None
+)
+
+# Live Bigdata.com and LLM services, or recorded calls
+backend = Backend(
+    mode=settings.BACKEND,
+    recordings_dir=settings.RECORDINGS_DIR,
+    latency_seconds=settings.REPLAY_LATENCY_SECONDS,
+)
+
+# Intermediate results of the jobs, so failed jobs can be resumed
+checkpoints = (
+    CheckpointStore(settings.CHECKPOINT_DIR) if settings.CHECKPOINT_DIR else None
+)
+
+# The shards of the analyses running at the same time share the CPUs. Analyses on process
+# workers are not sharded, it would nest a process pool in every worker process
+max_parallelism = (
+    max(
+        1,
+        min(
+            settings.ANALYSIS_MAX_PARALLELISM,
+            (os.cpu_count() or 1) // settings.JOB_WORKERS,
+        ),
+    )
+    if settings.JOB_WORKER_TYPE == WorkerType.THREAD
+    else 1
+)
 
 
 def create_db_and_tables():
     logger.info("Setting up data storage", db_string=settings.DB_STRING)
     SQLModel.metadata.create_all(engine)
+    # Databases created by previous versions are brought to the current schema
+    migrate(engine)
 
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def get_storage_manager() -> AsyncStorageManager:
+    return async_storage_manager
 
 
-def get_storage_manager(session: Session = Depends(get_session)) -> StorageManager:
-    return StorageManager(session)
+def check_parallelism(request: RiskAnalysisRequest):
+    if request.parallelism > 1 and settings.JOB_WORKER_TYPE == WorkerType.PROCESS:
+        raise HTTPException(
+            status_code=422,
+            detail="Analyses can not be split in shards with process workers (JOB_WORKER_TYPE=process), set parallelism to 1.",
+        )
 
 
-def lifespan(app: FastAPI):
+def run_job(request_id: UUID):
+    """Run a queued risk analysis. Each job gets its own storage manager, so its log buffer
+    is flushed when the job finishes."""
+    global BIGDATA
+    if BIGDATA is None:
+        # Process workers do not go through the lifespan, create the client on first use
+        BIGDATA = backend.bigdata_client(settings.BIGDATA_API_KEY)
+
+    job_storage_manager = StorageManager(
+        engine,
+        log_flush_size=settings.LOG_FLUSH_SIZE,
+        log_flush_interval=settings.LOG_FLUSH_INTERVAL_SECONDS,
+        event_hub=hub,
+    )
+    request = job_storage_manager.get_job_request(request_id)
+    if request is None:
+        logger.error("Queued job not found", request_id=str(request_id))
+        return
+    try:
+        process_request(
+            request,
+            bigdata=BIGDATA,
+            request_id=request_id,
+            storage_manager=job_storage_manager,
+            entity_cache=entity_cache,
+            checkpoints=checkpoints,
+            labeling_batch_size=settings.LABELING_BATCH_SIZE,
+            max_parallelism=max_parallelism,
+            backend=backend,
+        )
+    finally:
+        job_storage_manager.flush_logs()
+
+
+def init_process_worker():
+    # Connections inherited from the parent process must not be reused
+    engine.dispose(close=False)
+
+
+scheduler = JobScheduler(
+    job_fn=run_job,
+    worker_initializer=init_process_worker,
+    max_workers=settings.JOB_WORKERS,
+    max_queue_size=settings.JOB_QUEUE_MAX_SIZE,
+    worker_type=settings.JOB_WORKER_TYPE,
+)
+# Retention of the finished analyses, archival and compaction of the database
+maintenance = (
+    DatabaseMaintenance(
+        storage_manager,
+        retention_days={
+            WorkflowStatus.COMPLETED: settings.COMPLETED_RETENTION_DAYS,
+            WorkflowStatus.FAILED: settings.FAILED_RETENTION_DAYS,
+        },
+        interval_seconds=settings.DB_MAINTENANCE_INTERVAL_SECONDS,
+        archive_dir=settings.ARCHIVE_DIR or None,
+        checkpoints=checkpoints,
+        vacuum_free_ratio=settings.DB_VACUUM_FREE_RATIO,
+    )
+    if settings.DB_MAINTENANCE_INTERVAL_SECONDS > 0
+    else None
+)
+# Serializes the cache lookups and the queue capacity check with the enqueueing of new jobs
+submission_lock = asyncio.Lock()
+
+
+def requeue_unfinished_jobs():
+    """Put back in the queue the jobs that were waiting or running when the service stopped."""
+    for request_id in storage_manager.get_unfinished_jobs():
+        if storage_manager.get_status(request_id) == WorkflowStatus.IN_PROGRESS:
+            storage_manager.log_message(
+                request_id, "Workflow interrupted by a service restart, re-queued."
+            )
+            storage_manager.update_status(request_id, WorkflowStatus.QUEUED)
+        scheduler.submit(request_id, force=True)
+        logger.info("Re-queued unfinished job", request_id=str(request_id))
+    storage_manager.flush_logs()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     global BIGDATA
     logger.info("Starting Risk Analyzer service")
 
     # Instantiate Bigdata client
-    BIGDATA = Bigdata(api_key=settings.BIGDATA_API_KEY)
+    BIGDATA = backend.bigdata_client(settings.BIGDATA_API_KEY)
 
     send_trace(
         BIGDATA,
@@ -59,9 +265,19 @@ def lifespan(app: FastAPI):
         },
     )
     create_db_and_tables()
+    requeue_unfinished_jobs()
+    scheduler.start()
+    if maintenance is not None:
+        maintenance.start()
 
     yield
 
+    if maintenance is not None:
+        maintenance.shutdown()
+    scheduler.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 
 app = FastAPI(
     title="Risk Analyzer API",
@@ -70,63 +286,407 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
+if settings.RESPONSE_COMPRESSION_LEVEL > 0:
+    # Streamed responses are compressed as they are sent, Server-Sent Events are excluded
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE,
+        compresslevel=settings.RESPONSE_COMPRESSION_LEVEL,
+        quality=settings.RESPONSE_BROTLI_QUALITY,
+    )
+# Latency of every request, by endpoint, exposed in /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
+# Precompressed static files, templates link them by their fingerprinted URLs
+static_assets = StaticAssets(
+    directory=settings.STATIC_DIR, build_dir=settings.STATIC_BUILD_DIR
+)
+app.mount("/static", static_assets, name="static")
 
 
 @app.get(
     "/health",
     summary="Health check endpoint",
 )
-def health_check():
-    return {"status": "ok", "version": __version__}
+async def health_check():
+    health = {"status": "ok", "version": __version__}
+    if entity_cache is not None:
+        health["entity_cache"] = entity_cache.stats()
+    return health
 
 
 @app.get(
-    "/",
-    summary="Example frontend for testing the risk analyzer.",
-    response_class=HTMLResponse,
+    "/metrics",
+    summary="Prometheus metrics",
+    response_class=Response,
 )
-async def sample_frontend(_: str = Security(query_scheme)) -> HTMLResponse:
+async def metrics(_: str = Security(query_scheme)) -> Response:
+    """Metrics of the service in the Prometheus text format: the duration of each stage
+    of the workflows, the time analyses wait in the queue, the number of queued and running
+    analyses, the latency of the database operations and the latency of each endpoint."""
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@lru_cache(maxsize=4)
+def render_frontend(today: date, demo_mode: bool) -> tuple[str, str]:
+    """Frontend page with its ETag. Cached by the day of the analysis window examples and
+    the settings it renders, so both invalidate it."""
     # Get example values from the schema for all fields
     example_values = get_example_values_from_schema(RiskAnalysisRequest)
+    start_date, end_date = example_analysis_window(today)
+    example_values.update(start_date=start_date, end_date=end_date)
     example_values["example_watchlists"] = list(dict(ExampleWatchlists).values())
-    example_values["demo_mode"] = settings.DEMO_MODE
+    example_values["demo_mode"] = demo_mode
+
+    content = loader.get_template("api/index.html.jinja").render(
+        **example_values, static_url=static_assets.url
+    )
+    return content, get_content_etag(content)
+
 
-    return HTMLResponse(
-        content=loader.get_template("api/index.html.jinja").render(**example_values),
-        media_type="text/html",
+@app.get(
+    "/",
+    summary="Example frontend for testing the risk analyzer.",
+    response_class=HTMLResponse,
+)
+async def sample_frontend(
+    if_none_match: Annotated[str | None, Header()] = None,
+    _: str = Security(query_scheme),
+) -> Response:
+    """The page has an `ETag` header, send it back in the `If-None-Match` header to get a
+    304 without a body if the page did not change."""
+    content, etag = render_frontend(date.today(), settings.DEMO_MODE)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=content, headers=headers)
+
+
+async def find_cached_request(
+    storage_manager: AsyncStorageManager, request_hash: str
+) -> RiskAnalyzerAcceptedResponse | None:
+    """Look for an identical request that is in progress or was completed recently."""
+    inflight_id = await storage_manager.find_inflight_job(request_hash)
+    if inflight_id is not None:
+        return RiskAnalyzerAcceptedResponse(
+            request_id=str(inflight_id),
+            status=await storage_manager.get_status(inflight_id),
+            cached=True,
+        )
+
+    if settings.RESULT_CACHE_TTL_SECONDS <= 0:
+        return None
+    report_id = await storage_manager.find_cached_report(
+        request_hash, max_age=timedelta(seconds=settings.RESULT_CACHE_TTL_SECONDS)
+    )
+    if report_id is not None:
+        return RiskAnalyzerAcceptedResponse(
+            request_id=str(report_id), status=WorkflowStatus.COMPLETED, cached=True
+        )
+    return None
+
+
+async def get_cached_response(
+    storage_manager: AsyncStorageManager, request_hash: str
+) -> JSONResponse | None:
+    cached = await find_cached_request(storage_manager, request_hash)
+    if cached is None:
+        return None
+    return JSONResponse(
+        status_code=200 if cached.status == WorkflowStatus.COMPLETED else 202,
+        content=cached.model_dump(),
     )
 
 
 @app.post("/risk-analysis", response_model=RiskAnalysisResponse)
-def analyze_risk(
+async def analyze_risk(
     request: Annotated[RiskAnalysisRequest, Body()],
-    background_tasks: BackgroundTasks,
-    storage_manager: StorageManager = Depends(get_storage_manager),
+    use_cache: Annotated[
+        bool,
+        Query(
+            description="Reuse the report of an identical request, either completed recently or still in progress."
+        ),
+    ] = True,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
     _: str = Security(query_scheme),
 ) -> JSONResponse:
-    """This endpoints starts the generation of therisk analyzer workflow on the background
-    and will return a request_id that can be used to check the status of the request in the
-    `/status/{request_id}` endpoint.
+    """This endpoints queues the risk analyzer workflow to be run by one of the background
+    workers and will return a request_id that can be used to check the status of the request
+    in the `/status/{request_id}` endpoint. If the queue is full, a 429 is returned.
+
+    If an identical request was completed within the cache TTL, its request_id is returned
+    straight away with a `completed` status. If an identical request is still queued or
+    running, its request_id is returned instead of starting a new analysis.
+
+    Set `reuse_taxonomy` to reuse the latest risk taxonomy generated for the same theme,
+    focus and model, or `taxonomy_id` to use the taxonomy of a previous report, instead of
+    generating a new one. A 404 is returned if the `taxonomy_id` does not exist.
     Note: for now, it only supports news as document type.
     """
     # While we improve the UX of working with several document types with different sets of parameters
     # we will limit the document type to news
     DOCUMENT_TYPE = DocumentType.NEWS
     request.document_type = DOCUMENT_TYPE
+    if request.extends_report_id is not None:
+        raise HTTPException(
+            status_code=422,
+            detail="Use /report/{request_id}/extend to extend a report.",
+        )
+    check_parallelism(request)
+    if request.taxonomy_id is not None and not (
+        await storage_manager.taxonomy_exists(request.taxonomy_id)
+    ):
+        raise HTTPException(status_code=404, detail="Risk taxonomy not found")
+    return await submit_request(request, use_cache, storage_manager)
+
+
+async def submit_request(
+    request: RiskAnalysisRequest,
+    use_cache: bool,
+    storage_manager: AsyncStorageManager,
+) -> JSONResponse:
     request_id = uuid4()
+    request_hash = request.request_hash()
 
-    storage_manager.update_status(request_id, WorkflowStatus.QUEUED)
+    async with submission_lock:
+        if use_cache:
+            cached_response = await get_cached_response(storage_manager, request_hash)
+            if cached_response is not None:
+                return cached_response
 
-    background_tasks.add_task(
-        partial(
-            process_request,
-            request,
-            bigdata=BIGDATA,
-            request_id=request_id,
-            storage_manager=storage_manager,
+        if scheduler.queue_depth >= scheduler.max_queue_size:
+            raise HTTPException(
+                status_code=429,
+                detail=str(QueueFullError(scheduler.max_queue_size)),
+                headers={"Retry-After": "60"},
+            )
+        await storage_manager.enqueue_job(request_id, request)
+        scheduler.submit(request_id)
+
+    return JSONResponse(
+        status_code=202,
+        content=RiskAnalyzerAcceptedResponse(
+            request_id=str(request_id), status=WorkflowStatus.QUEUED
+        ).model_dump(),
+    )
+
+
+async def resolve_universes(requests: list[RiskAnalysisRequest]):
+    """Resolve each distinct universe of a batch once, before its jobs are queued, so the
+    jobs find the companies in the entity cache instead of all resolving them at the
+    same time. Invalid universes are rejected with a 422."""
+    if entity_cache is None or BIGDATA is None:
+        return
+    universes = {
+        json.dumps(request.companies): request.companies for request in requests
+    }
+    for companies in universes.values():
+        try:
+            await run_in_threadpool(
+                prepare_companies, companies, BIGDATA, entity_cache=entity_cache
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid companies: {e}")
+        except Exception as e:
+            # The jobs resolve the companies again, let them report the error
+            logger.warning("Could not resolve the companies of a batch", error=str(e))
+
+
+@app.post(
+    "/risk-analysis/batch",
+    summary="Queue several risk analyses at once",
+    response_model=RiskAnalysisBatchAcceptedResponse,
+)
+async def analyze_risk_batch(
+    batch: Annotated[RiskAnalysisBatchRequest, Body()],
+    use_cache: Annotated[
+        bool,
+        Query(
+            description="Reuse the reports of identical requests, either completed recently, still in progress or repeated in the batch."
+        ),
+    ] = True,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """Queue a batch of risk analyses, for example many scenarios over the same universe,
+    and return a batch_id to follow all of them in `/risk-analysis/batch/{batch_id}`, with
+    the request_id of each analysis in the order of the batch.
+
+    Each distinct universe is resolved once for the whole batch. The batch is queued as a
+    whole: a 429 is returned if the queue can not take all its new analyses. Identical
+    requests, in the batch or already completed or in progress, share a request_id unless
+    `use_cache=false`.
+    """
+    for request in batch.requests:
+        request.document_type = DocumentType.NEWS
+        if request.extends_report_id is not None:
+            raise HTTPException(
+                status_code=422,
+                detail="Use /report/{request_id}/extend to extend a report.",
+            )
+        check_parallelism(request)
+    taxonomy_ids = {
+        request.taxonomy_id
+        for request in batch.requests
+        if request.taxonomy_id is not None
+    }
+    for taxonomy_id in taxonomy_ids:
+        if not await storage_manager.taxonomy_exists(taxonomy_id):
+            raise HTTPException(status_code=404, detail="Risk taxonomy not found")
+    await resolve_universes(batch.requests)
+
+    batch_id = uuid4()
+    async with submission_lock:
+        accepted = []
+        jobs = []
+        by_hash = {}
+        for request in batch.requests:
+            request_hash = request.request_hash()
+            if use_cache and request_hash in by_hash:
+                accepted.append(by_hash[request_hash])
+                continue
+            response = (
+                await find_cached_request(storage_manager, request_hash)
+                if use_cache
+                else None
+            )
+            if response is None:
+                request_id = uuid4()
+                jobs.append((request_id, request))
+                response = RiskAnalyzerAcceptedResponse(
+                    request_id=str(request_id), status=WorkflowStatus.QUEUED
+                )
+            by_hash[request_hash] = response
+            accepted.append(response)
+
+        if scheduler.queue_depth + len(jobs) > scheduler.max_queue_size:
+            raise HTTPException(
+                status_code=429,
+                detail=str(QueueFullError(scheduler.max_queue_size)),
+                headers={"Retry-After": "60"},
+            )
+        await storage_manager.enqueue_batch(
+            batch_id, jobs, [UUID(response.request_id) for response in accepted]
         )
+        for request_id, request in jobs:
+            scheduler.submit(request_id)
+
+    return JSONResponse(
+        status_code=202,
+        content=RiskAnalysisBatchAcceptedResponse(
+            batch_id=str(batch_id), requests=accepted
+        ).model_dump(),
     )
+
+
+@app.get(
+    "/risk-analysis/batch/{batch_id}",
+    summary="Get the status of a batch of risk analyses",
+    response_model=RiskAnalysisBatchStatusResponse,
+)
+async def get_batch_status(
+    batch_id: UUID,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> RiskAnalysisBatchStatusResponse:
+    """Aggregate status of a batch, with the number of analyses in each status and the
+    status of each one. Use `/status/{request_id}` or `/report/{request_id}` to follow
+    the progress or get the report of an analysis."""
+    status = await storage_manager.get_batch_status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+    return status
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def dump_chunk(chunk: dict) -> str:
+    return json.dumps(chunk, ensure_ascii=False, separators=(",", ":"))
+
+
+async def stream_report_json(
+    request_id: UUID,
+    report: RiskAnalysisResponse,
+    storage_manager: AsyncStorageManager,
+) -> AsyncIterator[str]:
+    """Serialize a report loaded without its evidence, writing the evidence in batches as
+    it is read from the database instead of building the whole document in memory."""
+    head = report.model_dump_json(exclude={"content"})
+    yield f'{head[:-1]},"content":['
+    separator = ""
+    async for chunks in storage_manager.stream_report_content(
+        request_id, batch_size=settings.REPORT_STREAM_BATCH_SIZE
+    ):
+        yield separator + ",".join(dump_chunk(chunk) for chunk in chunks)
+        separator = ","
+    yield "]}"
+
+
+async def stream_report_ndjson(
+    request_id: UUID,
+    report: RiskAnalysisResponse,
+    storage_manager: AsyncStorageManager,
+) -> AsyncIterator[str]:
+    """Serialize a report as newline-delimited JSON: a first line with the scores and the
+    taxonomy, then one line per evidence chunk."""
+    yield report.model_dump_json(exclude={"content"}) + "\n"
+    async for chunks in storage_manager.stream_report_content(
+        request_id, batch_size=settings.REPORT_STREAM_BATCH_SIZE
+    ):
+        yield "".join(dump_chunk(chunk) + "\n" for chunk in chunks)
+
+
+async def stream_status_json(
+    status: RiskAnalyzerStatusResponse,
+    report: RiskAnalysisResponse,
+    storage_manager: AsyncStorageManager,
+) -> AsyncIterator[str]:
+    head = status.model_dump_json(exclude={"report"})
+    yield f'{head[:-1]},"report":'
+    async for part in stream_report_json(
+        UUID(status.request_id), report, storage_manager
+    ):
+        yield part
+    yield "}"
+
+
+@app.post(
+    "/risk-analysis/{request_id}/resume",
+    summary="Resume a failed risk analysis",
+)
+async def resume_risk_analysis(
+    request_id: UUID,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """Queue a failed risk analysis again, with the same request_id. The workflow resumes
+    from the last completed stage (taxonomy, search, labeling batches or results) instead
+    of starting over. A 409 is returned if the analysis did not fail, and a 429 if the
+    queue is full."""
+    async with submission_lock:
+        status = await storage_manager.get_status(request_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Request ID not found")
+        if status != WorkflowStatus.FAILED:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Only failed analyses can be resumed, this one is {status}.",
+            )
+        if scheduler.queue_depth >= scheduler.max_queue_size:
+            raise HTTPException(
+                status_code=429,
+                detail=str(QueueFullError(scheduler.max_queue_size)),
+                headers={"Retry-After": "60"},
+            )
+        if not await storage_manager.requeue_failed_job(request_id):
+            raise HTTPException(
+                status_code=409, detail="The analysis can not be resumed."
+            )
+        scheduler.submit(request_id)
+    hub.publish_status(request_id, WorkflowStatus.QUEUED)
+
     return JSONResponse(
         status_code=202,
         content=RiskAnalyzerAcceptedResponse(
@@ -135,19 +695,418 @@ def analyze_risk(
     )
 
 
+@app.post(
+    "/report/{request_id}/extend",
+    summary="Extend a risk analyzer report to a later end date",
+)
+async def extend_report(
+    request_id: UUID,
+    extension: Annotated[ReportExtensionRequest, Body()],
+    use_cache: Annotated[
+        bool,
+        Query(
+            description="Reuse the report of an identical extension, either completed recently or still in progress."
+        ),
+    ] = True,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """Queue a new analysis that extends a completed report to a later `end_date`. Only
+    the dates after the end of the report are searched and labeled, with the risk taxonomy
+    of the report, and the new evidence is merged with the evidence of the report. The
+    scores are recomputed, and the motivations only for the companies with new evidence.
+
+    The extended report gets a new request_id, the original report is left unchanged. A 404
+    is returned if the report does not exist, a 409 if it can not be extended and a 422 if
+    the `end_date` is not after the end date of the report."""
+    report = await storage_manager.get_analysis_report(
+        request_id, include_content=False
+    )
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    base_request = await storage_manager.get_job_request(request_id)
+    if base_request is None:
+        raise HTTPException(
+            status_code=409,
+            detail="The report was created by a previous version and can not be extended.",
+        )
+    end_date = extension.end_date.isoformat()
+    if end_date <= base_request.end_date:
+        raise HTTPException(
+            status_code=422,
+            detail=f"The end date must be after the end date of the report ({base_request.end_date}).",
+        )
+    try:
+        request = RiskAnalysisRequest.model_validate(
+            {
+                **base_request.model_dump(),
+                "end_date": end_date,
+                "extends_report_id": request_id,
+            }
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return await submit_request(request, use_cache, storage_manager)
+
+
 @app.get(
     "/status/{request_id}",
     summary="Get the status of a risk analyzer report",
+    response_model=RiskAnalyzerStatusResponse,
 )
-def get_status(
+async def get_status(
     request_id: UUID,
-    storage_manager: StorageManager = Depends(get_storage_manager),
+    since: Annotated[
+        int,
+        Query(
+            ge=0,
+            description="Only return the log messages after this cursor, use the `log_cursor` of the previous response.",
+        ),
+    ] = 0,
+    include_report: Annotated[
+        bool,
+        Query(
+            description="Include the complete report once completed. Set to false and use `/report/{request_id}` to fetch it separately."
+        ),
+    ] = True,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
     _: str = Security(query_scheme),
-) -> RiskAnalyzerStatusResponse:
+) -> RiskAnalyzerStatusResponse | Response:
     """Get the status of a risk analyzer report by its request_id. If the report is still running,
     you will get the current status and logs. If the report is completed, you will also get the
-    complete report"""
-    report = storage_manager.get_report(request_id)
+    complete report, streamed as it is read from the database."""
+    status = await storage_manager.get_report(
+        request_id, since=since, include_report=False
+    )
+    if status is None:
+        raise HTTPException(status_code=404, detail="Request ID not found")
+    status.queue_position = scheduler.position(request_id)
+    status.queue_depth = scheduler.queue_depth
+
+    report = None
+    if include_report and status.status == WorkflowStatus.COMPLETED:
+        report = await storage_manager.get_analysis_report(
+            request_id, include_content=False
+        )
     if report is None:
+        return status
+    return StreamingResponse(
+        stream_status_json(status, report, storage_manager),
+        media_type="application/json",
+    )
+
+
+def format_sse(event: WorkflowEvent) -> str:
+    """Serialize an event in the Server-Sent Events format, log events carry their sequence
+    number as the event ID so clients can resume with the Last-Event-ID header."""
+    event_id = (
+        f"id: {event.data['seq']}\n" if event.type == WorkflowEventType.LOG else ""
+    )
+    return f"{event_id}event: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+
+async def stream_workflow_events(
+    request_id: UUID,
+    storage_manager: AsyncStorageManager,
+    since: int,
+):
+    """Stream the progress of a workflow: the logs stored so far, then the events published
+    by the workflow as they happen, until it completes. When no event arrives for a while the
+    database is checked, which also covers workflows run by process workers."""
+    subscription = hub.subscribe(request_id)
+    try:
+        cursor = since
+        # Read the stored state after subscribing, so no event is missed in between
+        status = await storage_manager.get_report(
+            request_id, cursor, include_report=False
+        )
+        while status is not None:
+            first_seq = status.log_cursor - len(status.logs)
+            for i, message in enumerate(status.logs):
+                yield format_sse(
+                    WorkflowEvent(
+                        type=WorkflowEventType.LOG,
+                        data={"seq": first_seq + i, "message": message},
+                    )
+                )
+            cursor = max(cursor, status.log_cursor)
+            yield format_sse(
+                WorkflowEvent(
+                    type=WorkflowEventType.STATUS,
+                    data={
+                        "status": status.status,
+                        "queue_position": scheduler.position(request_id),
+                        "queue_depth": scheduler.queue_depth,
+                    },
+                )
+            )
+            if status.status in TERMINAL_STATUSES:
+                yield format_sse(
+                    WorkflowEvent(
+                        type=WorkflowEventType.COMPLETE, data={"status": status.status}
+                    )
+                )
+                return
+
+            # Logs published before subscribing that are not in the database yet
+            pending = subscription.history
+            subscription.history = []
+            while True:
+                if pending:
+                    event = pending.pop(0)
+                else:
+                    if subscription.overflowed:
+                        break
+                    try:
+                        event = await asyncio.wait_for(
+                            subscription.queue.get(),
+                            timeout=settings.STREAM_POLL_INTERVAL_SECONDS,
+                        )
+                    except TimeoutError:
+                        break
+
+                if event.type == WorkflowEventType.LOG:
+                    if event.data["seq"] < cursor:
+                        continue
+                    cursor = event.data["seq"] + 1
+                elif event.type == WorkflowEventType.STATUS and event.data[
+                    "status"
+                ] in (WorkflowStatus.QUEUED, WorkflowStatus.IN_PROGRESS):
+                    event = WorkflowEvent(
+                        type=event.type,
+                        data={
+                            **event.data,
+                            "queue_position": scheduler.position(request_id),
+                            "queue_depth": scheduler.queue_depth,
+                        },
+                    )
+                yield format_sse(event)
+                if event.type == WorkflowEventType.COMPLETE:
+                    return
+
+            # Nothing happened for a while, or events were dropped: sync with the database
+            subscription.overflowed = False
+            status = await storage_manager.get_report(
+                request_id, cursor, include_report=False
+            )
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@app.get(
+    "/status/{request_id}/stream",
+    summary="Stream the progress of a risk analyzer report",
+    response_class=StreamingResponse,
+)
+async def stream_status(
+    request_id: UUID,
+    since: Annotated[
+        int,
+        Query(
+            ge=0,
+            description="Only stream the log messages after this cursor.",
+        ),
+    ] = 0,
+    last_event_id: Annotated[int | None, Header(ge=0)] = None,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> StreamingResponse:
+    """Stream the progress of a risk analyzer report as Server-Sent Events. The stream sends
+    `log` events with each log message, `status` events on status changes and a final
+    `complete` event once the workflow is completed or failed. Reconnecting clients resume
+    after the last received log message using the `Last-Event-ID` header."""
+    if last_event_id is not None:
+        since = max(since, last_event_id + 1)
+    workflow_status = await storage_manager.get_status(request_id)
+    if workflow_status is None:
         raise HTTPException(status_code=404, detail="Request ID not found")
-    return report
+
+    return StreamingResponse(
+        stream_workflow_events(request_id, storage_manager, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get(
+    "/report/{request_id}",
+    summary="Get a completed risk analyzer report",
+    response_model=RiskAnalysisResponse,
+)
+async def get_report(
+    request_id: UUID,
+    include_content: Annotated[
+        bool,
+        Query(
+            description="Include the evidence (content) of the report, set to false to only get the scores and taxonomy, with the content not set."
+        ),
+    ] = True,
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept: Annotated[str | None, Header()] = None,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> Response:
+    """Get the report of a completed risk analysis. The report is streamed as it is read from
+    the database, as JSON or, with an `Accept: application/x-ndjson` header, as
+    newline-delimited JSON with the scores and taxonomy in the first line and one evidence
+    chunk per line after it.
+
+    The response has an `ETag` header, send it back in the `If-None-Match` header to get a
+    304 without a body if the report did not change."""
+    version = await storage_manager.get_report_version(request_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    etag = get_report_etag(request_id, version)
+    # The compression middleware adds Accept-Encoding to Vary when it encodes the report
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if if_none_match is not None and etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    report = await storage_manager.get_analysis_report(
+        request_id, include_content=False
+    )
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    # Reports loaded without their evidence are small enough to be sent in one go
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        if not include_content:
+            return Response(
+                content=report.model_dump_json(exclude={"content"}) + "\n",
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers,
+            )
+        return StreamingResponse(
+            stream_report_ndjson(request_id, report, storage_manager),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers,
+        )
+    if not include_content:
+        return JSONResponse(content=report.model_dump(mode="json"), headers=headers)
+    return StreamingResponse(
+        stream_report_json(request_id, report, storage_manager),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@app.get("/reports", summary="List the submitted analyses and their reports")
+async def list_reports(
+    filters: Annotated[ReportListFilters, Depends()],
+    cursor: Annotated[
+        UUID | None,
+        Query(
+            description="Return the analyses after this one, use the `next_cursor` of the previous page."
+        ),
+    ] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=500, description="Maximum number of items per page.")
+    ] = 50,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> ReportSummaryPage:
+    """List the submitted analyses, most recent first, one page at a time. Returns a
+    summary of each analysis (status, theme, model, analysis window and the size of its
+    report once completed) without the reports, optionally filtered by theme, LLM model,
+    status, watchlist, submission date and analysis window. Fetch a report with
+    `/report/{request_id}`."""
+    return await storage_manager.list_reports(filters, cursor=cursor, limit=limit)
+
+
+@app.get(
+    "/reports/{request_id}/content",
+    summary="Get the evidence of a completed risk analyzer report",
+)
+async def get_report_content(
+    request_id: UUID,
+    filters: Annotated[ReportContentFilters, Depends()],
+    cursor: Annotated[
+        int | None,
+        Query(
+            ge=0,
+            description="Return the evidence after this cursor, use the `next_cursor` of the previous page.",
+        ),
+    ] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of items per page.")
+    ] = 50,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> ReportContentPage:
+    """Get the evidence (labeled chunks) of a completed report one page at a time, in the
+    order of the report, optionally filtered by company, ticker, risk factor, risk channel,
+    sub-scenario, time period, date range or text."""
+    page = await storage_manager.get_report_content(
+        request_id, filters, cursor=cursor, limit=limit
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return page
+
+
+@app.get(
+    "/reports/{request_id}/content/facets",
+    summary="Get the values the evidence of a report can be filtered by",
+)
+async def get_report_content_facets(
+    request_id: UUID,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> ReportContentFacets:
+    """Get the number of evidence chunks of a completed report and the distinct companies,
+    tickers, risk factors, risk channels, sub-scenarios and time periods they refer to."""
+    facets = await storage_manager.get_report_content_facets(request_id)
+    if facets is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return facets
+
+
+@app.get(
+    "/analytics/scores",
+    summary="Get the scores of the companies across all the stored reports",
+)
+async def get_scores(
+    filters: Annotated[ScoreFilters, Depends()],
+    cursor: Annotated[
+        int | None,
+        Query(
+            ge=0,
+            description="Return the scores after this cursor, use the `next_cursor` of the previous page.",
+        ),
+    ] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of items per page.")
+    ] = 100,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> ReportScorePage:
+    """Get the scores of the companies in all the completed reports, most recent reports
+    first, one page at a time. Returns the composite scores, or the scores of a single
+    `risk`, optionally filtered by company, ticker, sector, theme and creation date of the
+    reports. For example, the composite score of a company in every tariff scenario of the
+    last quarter, with `ticker`, `theme=tariff` and `start_date`."""
+    return await storage_manager.get_scores(filters, cursor=cursor, limit=limit)
+
+
+@app.get(
+    "/analytics/scores/aggregate",
+    summary="Aggregate the scores of the stored reports by company, sector or theme",
+)
+async def get_score_aggregates(
+    filters: Annotated[ScoreFilters, Depends()],
+    group_by: Annotated[
+        ScoreGroupBy, Query(description="Aggregate the scores by this field.")
+    ] = ScoreGroupBy.COMPANY,
+    interval: Annotated[
+        ScoreInterval,
+        Query(
+            description="Aggregate the scores by day, week or month the reports were created, or over all time."
+        ),
+    ] = ScoreInterval.ALL,
+    storage_manager: AsyncStorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> list[ScoreAggregate]:
+    """Get the number of reports and scores and the mean, minimum and maximum score of each
+    company, sector or theme, over time or over all time. The scores are filtered as in
+    `/analytics/scores`, the composite scores are aggregated unless a `risk` is given."""
+    return await storage_manager.get_score_aggregates(filters, group_by, interval)
@@ -0,0 +1,202 @@
+"""Static assets of the frontend, served precompressed and with fingerprinted URLs.
+
+Every file of the static directory gets a fingerprint from its content, and gzip and
+brotli variants built once in a build directory, named after the fingerprint so they are
+only rebuilt when the file changes. Build them ahead of time with
+`python -m bigdata_risk_analyzer.api.assets`, which also deletes the variants of removed
+or changed files. The missing ones are built on startup, by every server process, so
+nothing is deleted then.
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import brotli
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from bigdata_risk_analyzer.api.compression import accepted_encodings
+
+PACKAGE_DIRECTORY = Path(__file__).parents[1]
+
+# Fingerprinted URLs never change content, browsers keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Other URLs are revalidated with their ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first, with the suffix of their variants
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# Fast enough to build the variants on startup, within 10% of the best compression
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+# Smaller files are not worth compressing, and variants are only kept if they save this
+# fraction of the size
+MIN_SIZE = 1024
+MIN_SAVING = 0.1
+
+
+@dataclass
+class StaticAsset:
+    path: str
+    file: Path
+    digest: str
+    media_type: str
+    # Compressed variants by content encoding
+    variants: dict[str, Path] = field(default_factory=dict)
+
+    @property
+    def fingerprinted_path(self) -> str:
+        stem, dot, suffix = self.path.rpartition(".")
+        if not dot or "/" in suffix:
+            return f"{self.path}.{self.digest}"
+        return f"{stem}.{self.digest}.{suffix}"
+
+    def negotiate(self, accept_encoding: str) -> tuple[str | None, Path]:
+        """Content encoding and file of the variant to serve for an Accept-Encoding
+        header, the uncompressed file if the client accepts none of the variants."""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding, self.variants[encoding]
+        return None, self.file
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _write_variant(variant: Path, data: bytes):
+    """Write a variant to a temporary file of its own first and rename it, so processes
+    building the same variant at the same time never see a partial one."""
+    variant.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=variant.parent, prefix=f".{variant.name}.", delete=False
+    ) as tmp_file:
+        tmp_file.write(data)
+    try:
+        os.replace(tmp_file.name, variant)
+    except OSError:
+        os.unlink(tmp_file.name)
+        raise
+
+
+def build_assets(
+    static_dir: str | Path, build_dir: str | Path, prune: bool = False
+) -> dict[str, StaticAsset]:
+    """Fingerprint the files of `static_dir` and build their compressed variants in
+    `build_dir`, the variants of files that did not change are reused. With `prune`, the
+    variants of removed or changed files are deleted, only do it when no server is
+    running. Returns the assets by path."""
+    static_dir, build_dir = Path(static_dir), Path(build_dir)
+    assets = {}
+    built = set()
+    for file in sorted(static_dir.rglob("*")):
+        if not file.is_file() or file.name.startswith("."):
+            continue
+        path = file.relative_to(static_dir).as_posix()
+        data = file.read_bytes()
+        asset = StaticAsset(
+            path=path,
+            file=file,
+            digest=hashlib.sha256(data).hexdigest()[:12],
+            media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        )
+        assets[path] = asset
+        if len(data) < MIN_SIZE:
+            continue
+        for encoding, suffix in ENCODINGS.items():
+            variant = build_dir / f"{asset.fingerprinted_path}{suffix}"
+            # An empty variant marks a file that does not compress well
+            if not variant.exists():
+                compressed = _compress(data, encoding)
+                if len(compressed) > len(data) * (1 - MIN_SAVING):
+                    compressed = b""
+                _write_variant(variant, compressed)
+            built.add(variant)
+            if variant.stat().st_size > 0:
+                asset.variants[encoding] = variant
+
+    if prune:
+        for variant in build_dir.rglob("*"):
+            if variant.is_file() and variant not in built:
+                variant.unlink()
+    return assets
+
+
+class StaticAssets(StaticFiles):
+    """Static files served precompressed by content negotiation, with ETags. Files
+    requested by their fingerprinted path (see `url`) are cached by browsers for good,
+    the others are revalidated on every use."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        build_dir: str | Path,
+        mount_path: str = "/static",
+    ):
+        super().__init__(directory=directory)
+        self.mount_path = mount_path
+        self.assets = build_assets(directory, build_dir)
+        self.fingerprinted = {
+            asset.fingerprinted_path: asset for asset in self.assets.values()
+        }
+
+    def url(self, path: str) -> str:
+        """URL of a static file, fingerprinted if the file exists."""
+        asset = self.assets.get(path)
+        return f"{self.mount_path}/{asset.fingerprinted_path if asset else path}"
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path = Path(path).as_posix()
+        asset = self.fingerprinted.get(path)
+        immutable = asset is not None
+        if asset is None:
+            asset = self.assets.get(path)
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding, file = asset.negotiate(request_headers.get("accept-encoding", ""))
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+            if immutable
+            else REVALIDATE_CACHE_CONTROL,
+            "ETag": f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"',
+        }
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        response = FileResponse(file, headers=headers, media_type=asset.media_type)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the compressed variants of the static assets."
+    )
+    parser.add_argument(
+        "--static-dir", default=str(PACKAGE_DIRECTORY / "static"), type=Path
+    )
+    parser.add_argument(
+        "--build-dir", default=str(PACKAGE_DIRECTORY.parent / "static_build"), type=Path
+    )
+    args = parser.parse_args()
+    assets = build_assets(args.static_dir, args.build_dir, prune=True)
+    print(
+        f"Built {sum(len(asset.variants) for asset in assets.values())} variants of "
+        f"{len(assets)} static assets in {args.build_dir}"
+    )
@@ -0,0 +1,75 @@
+"""Compression of the API responses, brotli for the clients that accept it and gzip for
+the others. Streamed responses are compressed as they are sent, and responses that are
+already encoded (such as the precompressed static files) or Server-Sent Events are left
+as they are."""
+
+import brotli
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Content encodings accepted by an Accept-Encoding header, without the ones
+    explicitly refused with `q=0`."""
+    accepted = set()
+    for value in accept_encoding.split(","):
+        encoding, _, params = value.partition(";")
+        name, _, quality = params.replace(" ", "").partition("=")
+        try:
+            if name == "q" and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Every part of a streamed response is flushed, so clients can decode it as it
+        # arrives
+        compressed = self.compressor.process(body)
+        if more_body:
+            return compressed + self.compressor.flush()
+        return compressed + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress the responses larger than `minimum_size` bytes, with brotli at `quality`
+    when the client accepts it, and otherwise with gzip at `compresslevel`."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        compresslevel: int = 6,
+        quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.quality = quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        responder: ASGIApp
+        if "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, self.quality)
+        elif "gzip" in accepted:
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
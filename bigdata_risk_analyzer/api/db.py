@@ -0,0 +1,169 @@
+import os
+from importlib.util import find_spec
+
+from sqlalchemy import URL, Engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+# Async drivers used for the databases supported by the async storage, asyncpg is
+# installed with the `postgres` extra
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def _is_in_memory_sqlite(url: URL) -> bool:
+    return url.database in (None, "", ":memory:")
+
+
+def _engine_options(
+    url: URL,
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float,
+    sqlite_busy_timeout: float,
+) -> dict:
+    if url.get_backend_name() != "sqlite":
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_pre_ping": True,
+        }
+
+    connect_args = {"check_same_thread": False, "timeout": sqlite_busy_timeout}
+    if _is_in_memory_sqlite(url):
+        return {"connect_args": connect_args, "poolclass": StaticPool}
+    return {
+        "connect_args": connect_args,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+    }
+
+
+def _enable_sqlite_wal(engine: Engine):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL, only the last transactions may be lost on a power failure
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+def create_db_engine(
+    db_string: str,
+    echo: bool = False,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30.0,
+    sqlite_busy_timeout: float = 30.0,
+) -> Engine:
+    """Create an engine that can be shared by the API and the job workers, each of them
+    opening short-lived sessions from its connection pool.
+
+    SQLite databases are opened in WAL mode so status reads do not block on (nor are
+    blocked by) the writes of running jobs, and connections can be used from any thread.
+    In-memory SQLite databases use a single shared connection, as each connection would
+    otherwise see its own empty database. For other databases the pool is sized with
+    `pool_size` and `max_overflow`.
+    """
+    url = make_url(db_string)
+    engine = create_engine(
+        url,
+        echo=echo,
+        **_engine_options(
+            url, pool_size, max_overflow, pool_timeout, sqlite_busy_timeout
+        ),
+    )
+    if url.get_backend_name() == "sqlite" and not _is_in_memory_sqlite(url):
+        _enable_sqlite_wal(engine)
+    return engine
+
+
+def get_async_url(db_string: str) -> URL:
+    """Async version of a database URL, e.g. `sqlite:///risk_analyzer.db` becomes
+    `sqlite+aiosqlite:///risk_analyzer.db`."""
+    url = make_url(db_string)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(
+            f"Database '{backend}' is not supported, use one of: {', '.join(ASYNC_DRIVERS)}."
+        )
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def has_async_driver(db_string: str) -> bool:
+    """Whether the database is supported by the async storage and its driver is
+    installed, otherwise the endpoints use the sync engine from a worker thread."""
+    backend = make_url(db_string).get_backend_name()
+    return backend in ASYNC_DRIVERS and find_spec(ASYNC_DRIVERS[backend]) is not None
+
+
+def create_async_db_engine(
+    db_string: str,
+    echo: bool = False,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30.0,
+    sqlite_busy_timeout: float = 30.0,
+) -> AsyncEngine:
+    """Async counterpart of `create_db_engine` for the same database, used by the API
+    endpoints so they do not hold a thread while waiting for the database."""
+    url = get_async_url(db_string)
+    engine = create_async_engine(
+        url,
+        echo=echo,
+        **_engine_options(
+            url, pool_size, max_overflow, pool_timeout, sqlite_busy_timeout
+        ),
+    )
+    if url.get_backend_name() == "sqlite" and not _is_in_memory_sqlite(url):
+        _enable_sqlite_wal(engine.sync_engine)
+    return engine
+
+
+def get_database_size(engine: Engine) -> int | None:
+    """Size of the database in bytes, including the WAL file of SQLite databases. None for
+    in-memory databases and backends that do not report it."""
+    url = engine.url
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        if url.database is None or _is_in_memory_sqlite(url):
+            return None
+        paths = (url.database, f"{url.database}-wal")
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    if backend == "postgresql":
+        with engine.connect() as connection:
+            return connection.execute(
+                text("SELECT pg_database_size(current_database())")
+            ).scalar()
+    return None
+
+
+def optimize_database(engine: Engine, vacuum_free_ratio: float = 0.2) -> bool:
+    """Refresh the statistics of the query planner and vacuum SQLite databases once at
+    least `vacuum_free_ratio` of their pages are free (left by deleted rows), returns
+    whether the database was vacuumed. PostgreSQL reclaims space with its autovacuum.
+    """
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if engine.url.get_backend_name() != "sqlite":
+            connection.exec_driver_sql("ANALYZE")
+            return False
+
+        page_count = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        vacuum = page_count > 0 and free_pages / page_count >= vacuum_free_ratio
+        if vacuum:
+            connection.exec_driver_sql("VACUUM")
+            # VACUUM writes the whole database to the WAL, give the space back
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        # Statistics from a sample of each index, so it stays fast on large databases
+        connection.exec_driver_sql("PRAGMA analysis_limit=1000")
+        connection.exec_driver_sql("ANALYZE")
+        return vacuum
@@ -0,0 +1,120 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from enum import StrEnum
+from threading import Lock
+from uuid import UUID
+
+from bigdata_risk_analyzer.api.models import WorkflowStatus
+
+
+class WorkflowEventType(StrEnum):
+    LOG = "log"
+    STATUS = "status"
+    COMPLETE = "complete"
+
+
+TERMINAL_STATUSES = {WorkflowStatus.COMPLETED, WorkflowStatus.FAILED}
+
+
+@dataclass
+class WorkflowEvent:
+    type: WorkflowEventType
+    data: dict
+
+
+@dataclass(eq=False)
+class Subscription:
+    request_id: UUID
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    # Events published before subscribing, still pending to be written to the database
+    history: list[WorkflowEvent] = field(default_factory=list)
+    # Set when events were dropped because the subscriber was not keeping up
+    overflowed: bool = False
+
+    def _put(self, event: WorkflowEvent):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventHub:
+    """In-process publish/subscribe hub for workflow progress.
+
+    Publishers are the workflow threads, subscribers are coroutines on the event loop, so
+    events are handed over with `call_soon_threadsafe`. The last log events of each running
+    workflow are kept so late subscribers can catch up with messages not yet flushed to the
+    database. Events published in other processes (process workers) are not seen here,
+    subscribers should fall back to reading the database periodically.
+    """
+
+    def __init__(self, history_size: int = 500, queue_size: int = 1000):
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self._subscriptions: dict[UUID, set[Subscription]] = {}
+        self._history: dict[UUID, deque[WorkflowEvent]] = {}
+        self._lock = Lock()
+
+    def subscribe(self, request_id: UUID) -> Subscription:
+        """Subscribe to the events of a workflow, must be called from the event loop."""
+        subscription = Subscription(
+            request_id=request_id,
+            loop=asyncio.get_running_loop(),
+            queue=asyncio.Queue(maxsize=self.queue_size),
+        )
+        with self._lock:
+            subscription.history = list(self._history.get(request_id, ()))
+            self._subscriptions.setdefault(request_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.request_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.request_id]
+
+    def publish(self, request_id: UUID, event: WorkflowEvent):
+        with self._lock:
+            if event.type == WorkflowEventType.LOG:
+                self._history.setdefault(
+                    request_id, deque(maxlen=self.history_size)
+                ).append(event)
+            elif event.type == WorkflowEventType.COMPLETE:
+                # Everything is in the database once the workflow is finished
+                self._history.pop(request_id, None)
+            subscriptions = list(self._subscriptions.get(request_id, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # The event loop of the subscriber is closed
+                self.unsubscribe(subscription)
+
+    def publish_log(self, request_id: UUID, seq: int, message: str, level: str):
+        self.publish(
+            request_id,
+            WorkflowEvent(
+                type=WorkflowEventType.LOG,
+                data={"seq": seq, "message": message, "level": level},
+            ),
+        )
+
+    def publish_status(self, request_id: UUID, status: WorkflowStatus):
+        self.publish(
+            request_id,
+            WorkflowEvent(type=WorkflowEventType.STATUS, data={"status": status}),
+        )
+        if status in TERMINAL_STATUSES:
+            self.publish(
+                request_id,
+                WorkflowEvent(type=WorkflowEventType.COMPLETE, data={"status": status}),
+            )
+
+
+hub = EventHub()
@@ -0,0 +1,190 @@
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Event, Thread
+from uuid import UUID
+
+from bigdata_risk_analyzer import logger
+from bigdata_risk_analyzer.api.db import get_database_size, optimize_database
+from bigdata_risk_analyzer.api.models import WorkflowStatus
+from bigdata_risk_analyzer.api.storage import StorageManager
+from bigdata_risk_analyzer.api.utils import compress_json
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+from bigdata_risk_analyzer.metrics import DB_SIZE_BYTES, PRUNED_WORKFLOWS
+
+# Only finished workflows can be deleted
+RETAINED_STATUSES = (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED)
+# Taxonomies are stored right before the report that references them, recent ones are kept
+# so the taxonomy of a report being stored is not deleted
+TAXONOMY_GRACE_PERIOD = timedelta(hours=1)
+
+
+class DatabaseMaintenance:
+    """Periodic maintenance of the database on a background thread, so its size and the
+    query latency stay flat over time. Every `interval_seconds`:
+
+    - Workflows completed or failed longer ago than the retention of their status are
+      deleted with their job, logs and report. With an `archive_dir`, each workflow is
+      first archived there as gzip compressed JSON, by month of its last update, and the
+      checkpoints of failed workflows are deleted with them.
+    - Batches whose workflows were all deleted are deleted, and so are the stored
+      taxonomies that no remaining report references.
+    - Expired entries of the persistent entity cache are deleted.
+    - The statistics of the query planner are refreshed and SQLite databases are vacuumed
+      once `vacuum_free_ratio` of their pages are free.
+    - The size of the database is exposed in the `DB_SIZE_BYTES` metric.
+    """
+
+    def __init__(
+        self,
+        storage_manager: StorageManager,
+        retention_days: dict[WorkflowStatus, int],
+        interval_seconds: float = 3600,
+        archive_dir: str | Path | None = None,
+        checkpoints: CheckpointStore | None = None,
+        vacuum_free_ratio: float = 0.2,
+        batch_size: int = 100,
+    ):
+        for status in retention_days:
+            if status not in RETAINED_STATUSES:
+                raise ValueError(
+                    f"Retention can only be set for {', '.join(RETAINED_STATUSES)} workflows."
+                )
+        self.storage_manager = storage_manager
+        # A retention of 0 days keeps the workflows forever
+        self.retention = {
+            status: timedelta(days=days)
+            for status, days in retention_days.items()
+            if days > 0
+        }
+        self.interval_seconds = interval_seconds
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.checkpoints = checkpoints
+        self.vacuum_free_ratio = vacuum_free_ratio
+        self.batch_size = batch_size
+        self._stopping = Event()
+        self._thread: Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = Thread(
+            target=self._loop, name="risk-analyzer-maintenance", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            "Database maintenance started",
+            interval_seconds=self.interval_seconds,
+            retention_days={
+                str(status): retention.days
+                for status, retention in self.retention.items()
+            },
+        )
+
+    def shutdown(self, wait: bool = False):
+        self._stopping.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error("Database maintenance failed", error=str(e))
+            self._stopping.wait(self.interval_seconds)
+
+    def run(self) -> dict[WorkflowStatus, int]:
+        """Run the maintenance once, returns the number of workflows deleted by status."""
+        pruned = {
+            status: self.prune(status, datetime.now() - retention)
+            for status, retention in self.retention.items()
+        }
+        pruned_batches = self.prune_batches()
+        pruned_taxonomies = self.storage_manager.delete_unreferenced_taxonomies(
+            datetime.now() - TAXONOMY_GRACE_PERIOD
+        )
+        expired_entities = self.storage_manager.delete_expired_entities()
+        vacuumed = optimize_database(
+            self.storage_manager.engine, vacuum_free_ratio=self.vacuum_free_ratio
+        )
+        db_size = get_database_size(self.storage_manager.engine)
+        if db_size is not None:
+            DB_SIZE_BYTES.set(db_size)
+        logger.info(
+            "Database maintenance completed",
+            pruned={str(status): count for status, count in pruned.items()},
+            pruned_batches=pruned_batches,
+            pruned_taxonomies=pruned_taxonomies,
+            expired_entities=expired_entities,
+            vacuumed=vacuumed,
+            db_size=db_size,
+        )
+        return pruned
+
+    def prune(self, status: WorkflowStatus, before: datetime) -> int:
+        """Archive and delete the workflows in `status` last updated before `before`, in
+        batches so the database is never locked for long. Returns how many were deleted."""
+        deleted = 0
+        while not self._stopping.is_set():
+            request_ids = self.storage_manager.get_expired_workflows(
+                status, before, limit=self.batch_size
+            )
+            if not request_ids:
+                break
+            if self.archive_dir is not None:
+                for request_id in request_ids:
+                    self.archive(request_id)
+            expired = self.storage_manager.delete_expired_workflows(
+                request_ids, status, before
+            )
+            if self.checkpoints is not None:
+                for request_id in expired:
+                    self.checkpoints.delete(request_id)
+            PRUNED_WORKFLOWS.labels(status=status).inc(len(expired))
+            deleted += len(expired)
+            if len(request_ids) < self.batch_size:
+                break
+        return deleted
+
+    def prune_batches(self) -> int:
+        """Delete the batches whose workflows were all deleted, checking `batch_size`
+        batches at a time. Returns how many were deleted."""
+        deleted = 0
+        after = None
+        while not self._stopping.is_set():
+            count, after = self.storage_manager.delete_orphaned_batches(
+                after, limit=self.batch_size
+            )
+            deleted += count
+            if after is None:
+                break
+        return deleted
+
+    def archive(self, request_id: UUID) -> Path | None:
+        """Write a workflow, with its request, logs and report, to the archive directory.
+        Returns the path of the archive, None if the workflow does not exist or there is
+        no archive directory."""
+        workflow = self.storage_manager.get_report(request_id)
+        if workflow is None or self.archive_dir is None:
+            return None
+        request = self.storage_manager.get_job_request(request_id)
+        document = {
+            "request": request.model_dump(mode="json") if request else None,
+            **workflow.model_dump(mode="json", exclude={"log_cursor"}),
+        }
+        path = (
+            self.archive_dir
+            / f"{workflow.last_updated:%Y-%m}"
+            / f"{request_id}.json.gz"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary name first, an interrupted write never leaves a partial
+        # archive behind
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(compress_json(json.dumps(document)))
+        os.replace(tmp_path, path)
+        return path
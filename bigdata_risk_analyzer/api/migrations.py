@@ -0,0 +1,293 @@
+"""Migrations of databases created by previous versions, run on startup once the missing
+tables are created.
+
+Every step checks the schema first and is safe to run again, so no migration history is
+stored: columns added to existing tables are created (as nullable, rows written by
+previous versions have no value for them), missing indexes are created, and data still
+in the layout of previous versions is moved to the current one before its legacy column
+is dropped.
+"""
+
+from pydantic import ValidationError
+from sqlalchemy import (
+    JSON,
+    Connection,
+    DateTime,
+    Engine,
+    String,
+    Uuid,
+    column,
+    insert,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy import table as sql_table
+from sqlmodel import SQLModel, col
+
+from bigdata_risk_analyzer import logger
+from bigdata_risk_analyzer.api.models import LogLevel, RiskAnalysisRequest
+from bigdata_risk_analyzer.api.sql_models import (
+    SQLJob,
+    SQLReportChunk,
+    SQLReportScore,
+    SQLRiskAnalyzerReport,
+    SQLWorkflowLog,
+    SQLWorkflowStatus,
+)
+from bigdata_risk_analyzer.api.utils import compress_json
+from bigdata_risk_analyzer.models import RiskAnalysisResponse
+
+# Workflow logs were stored as a JSON array of messages in the workflow status
+LEGACY_LOGS_COLUMN = "logs"
+# Reports were stored as a single JSON document
+LEGACY_REPORT_COLUMN = "screener_report"
+# Columns of the jobs that analyses are listed and searched by, from their request
+JOB_METADATA_COLUMNS = (
+    "theme",
+    "focus",
+    "llm_model",
+    "start_date",
+    "end_date",
+    "watchlist_id",
+)
+
+
+def _column_names(connection: Connection, table_name: str) -> set[str]:
+    return {column["name"] for column in inspect(connection).get_columns(table_name)}
+
+
+def _quote(connection: Connection, name: str) -> str:
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+def add_missing_columns(connection: Connection) -> list[str]:
+    """Add the columns of the models that are missing from their existing tables,
+    returns them as `table.column`."""
+    existing_tables = set(inspect(connection).get_table_names())
+    added = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = _column_names(connection, table.name)
+        for table_column in table.columns:
+            if table_column.name in existing_columns:
+                continue
+            column_type = table_column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f"ALTER TABLE {_quote(connection, table.name)} "
+                f"ADD COLUMN {_quote(connection, table_column.name)} {column_type}"
+            )
+            added.append(f"{table.name}.{table_column.name}")
+    return added
+
+
+def create_missing_indexes(connection: Connection):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _drop_column(connection: Connection, table_name: str, column_name: str):
+    connection.exec_driver_sql(
+        f"ALTER TABLE {_quote(connection, table_name)} "
+        f"DROP COLUMN {_quote(connection, column_name)}"
+    )
+
+
+def move_legacy_logs(connection: Connection) -> int:
+    """Move the logs stored in the workflow statuses to the log table, one row per
+    message, returns the number of workflows moved."""
+    table_name = inspect(SQLWorkflowStatus).local_table.name
+    if LEGACY_LOGS_COLUMN not in _column_names(connection, table_name):
+        return 0
+
+    legacy_status = sql_table(
+        table_name,
+        column("id", Uuid()),
+        column("last_updated", DateTime()),
+        column(LEGACY_LOGS_COLUMN, JSON()),
+    )
+    statuses = connection.execute(legacy_status.select()).all()
+    for request_id, last_updated, logs in statuses:
+        if not logs:
+            continue
+        # Messages were not timestamped, they get the last update of their workflow
+        connection.execute(
+            insert(SQLWorkflowLog),
+            [
+                {
+                    "request_id": request_id,
+                    "seq": seq,
+                    "timestamp": last_updated,
+                    "level": LogLevel.INFO,
+                    "message": message,
+                }
+                for seq, message in enumerate(logs)
+            ],
+        )
+    _drop_column(connection, table_name, LEGACY_LOGS_COLUMN)
+    return len(statuses)
+
+
+def move_legacy_reports(connection: Connection) -> int:
+    """Split the reports stored as a single JSON document into their compressed scores
+    and taxonomy, their evidence chunks and their indexed scores, returns the number of
+    reports moved. Reports are loaded one at a time."""
+    table_name = inspect(SQLRiskAnalyzerReport).local_table.name
+    if LEGACY_REPORT_COLUMN not in _column_names(connection, table_name):
+        return 0
+
+    legacy_report = sql_table(
+        table_name,
+        column("id", Uuid()),
+        column("created_at", DateTime()),
+        column("theme", String()),
+        column(LEGACY_REPORT_COLUMN, JSON()),
+    )
+    reports = connection.execute(
+        legacy_report.select()
+        .with_only_columns(
+            legacy_report.c.id, legacy_report.c.created_at, legacy_report.c.theme
+        )
+        .where(legacy_report.c[LEGACY_REPORT_COLUMN].is_not(None))
+    ).all()
+    for report_id, created_at, theme in reports:
+        response = RiskAnalysisResponse.model_validate(
+            connection.execute(
+                legacy_report.select()
+                .with_only_columns(legacy_report.c[LEGACY_REPORT_COLUMN])
+                .where(legacy_report.c.id == report_id)
+            ).scalar_one()
+        )
+        connection.execute(
+            update(SQLRiskAnalyzerReport)
+            .where(col(SQLRiskAnalyzerReport.id) == report_id)
+            .values(
+                risk_scoring=compress_json(response.risk_scoring.model_dump_json()),
+                risk_taxonomy=compress_json(response.risk_taxonomy.model_dump_json()),
+                content_size=len(response.content.root)
+                if response.content is not None
+                else None,
+            )
+        )
+        if response.content is not None and response.content.root:
+            connection.execute(
+                insert(SQLReportChunk),
+                SQLReportChunk.rows_from_content(report_id, response.content),
+            )
+        if response.risk_scoring.root:
+            connection.execute(
+                insert(SQLReportScore),
+                SQLReportScore.rows_from_report(
+                    SQLRiskAnalyzerReport(
+                        id=report_id, created_at=created_at, theme=theme
+                    ),
+                    response.risk_scoring,
+                ),
+            )
+    _drop_column(connection, table_name, LEGACY_REPORT_COLUMN)
+    return len(reports)
+
+
+def fill_job_metadata(connection: Connection) -> int:
+    """Set the metadata columns of the jobs submitted with previous versions from their
+    request, returns the number of jobs updated."""
+    jobs = connection.execute(
+        select(col(SQLJob.id), col(SQLJob.request)).where(col(SQLJob.theme).is_(None))
+    ).all()
+    updated = 0
+    for job_id, request in jobs:
+        try:
+            job = SQLJob.from_request(
+                job_id, RiskAnalysisRequest.model_validate(request)
+            )
+        except ValidationError:
+            logger.warning(
+                "Could not read the request of a job", request_id=str(job_id)
+            )
+            continue
+        connection.execute(
+            update(SQLJob)
+            .where(col(SQLJob.id) == job_id)
+            .values({name: getattr(job, name) for name in JOB_METADATA_COLUMNS})
+        )
+        updated += 1
+    return updated
+
+
+def create_missing_jobs(connection: Connection) -> int:
+    """Create the jobs of the reports completed by versions that did not store them, with
+    the request rebuilt from the columns of the report, so they are listed by `/reports`.
+    Returns the number of jobs created."""
+    reports = connection.execute(
+        select(
+            col(SQLRiskAnalyzerReport.id),
+            col(SQLRiskAnalyzerReport.created_at),
+            col(SQLRiskAnalyzerReport.companies),
+            col(SQLRiskAnalyzerReport.llm_model),
+        )
+        .add_columns(
+            col(SQLRiskAnalyzerReport.theme),
+            col(SQLRiskAnalyzerReport.focus),
+            col(SQLRiskAnalyzerReport.start_date),
+            col(SQLRiskAnalyzerReport.end_date),
+            col(SQLRiskAnalyzerReport.fiscal_year),
+            col(SQLRiskAnalyzerReport.rerank_threshold),
+            col(SQLRiskAnalyzerReport.frequency),
+            col(SQLRiskAnalyzerReport.document_limit),
+            col(SQLRiskAnalyzerReport.batch_size),
+        )
+        .where(
+            ~select(col(SQLJob.id))
+            .where(col(SQLJob.id) == SQLRiskAnalyzerReport.id)
+            .exists()
+        )
+    ).all()
+    created = 0
+    for report in reports:
+        try:
+            request = RiskAnalysisRequest(
+                main_theme=report.theme,
+                focus=report.focus or "",
+                companies=report.companies,
+                start_date=report.start_date.date().isoformat(),
+                end_date=report.end_date.date().isoformat(),
+                llm_model=report.llm_model,
+                fiscal_year=report.fiscal_year,
+                rerank_threshold=report.rerank_threshold,
+                frequency=report.frequency,
+                document_limit=report.document_limit,
+                batch_size=report.batch_size,
+            )
+        except ValidationError:
+            logger.warning(
+                "Could not rebuild the request of a report", request_id=str(report.id)
+            )
+            continue
+        job = SQLJob.from_request(report.id, request)
+        job.created_at = report.created_at
+        connection.execute(insert(SQLJob).values(job.model_dump()))
+        created += 1
+    return created
+
+
+def migrate(engine: Engine):
+    """Bring a database created by a previous version to the current schema, in a single
+    transaction. The tables of the models must have been created first."""
+    with engine.begin() as connection:
+        added_columns = add_missing_columns(connection)
+        create_missing_indexes(connection)
+        moved_logs = move_legacy_logs(connection)
+        moved_reports = move_legacy_reports(connection)
+        updated_jobs = fill_job_metadata(connection)
+        created_jobs = create_missing_jobs(connection)
+    if added_columns or moved_logs or moved_reports or updated_jobs or created_jobs:
+        logger.info(
+            "Migrated the database",
+            added_columns=added_columns,
+            moved_logs=moved_logs,
+            moved_reports=moved_reports,
+            updated_jobs=updated_jobs,
+            created_jobs=created_jobs,
+        )
@@ -1,12 +1,16 @@
+import hashlib
+import json
 from datetime import date, datetime, timedelta
 from enum import Enum, StrEnum
 from typing import List, Literal, Optional, Self
+from uuid import UUID
 
 from bigdata_client.models.search import DocumentType
 from pydantic import BaseModel, Field, model_validator
+from pydantic.json_schema import SkipJsonSchema
 from pydantic_core import ValidationError
 
-from bigdata_risk_analyzer.models import RiskAnalysisResponse
+from bigdata_risk_analyzer.models import LabeledChunk, RiskAnalysisResponse
 
 
 class FrequencyEnum(StrEnum):
@@ -24,6 +28,12 @@ class WorkflowStatus(StrEnum):
     FAILED = "failed"
 
 
+class LogLevel(StrEnum):
+    INFO = "info"
+    WARNING = "warning"
+    ERROR = "error"
+
+
 class WatchlistExample(BaseModel):
     id: str = Field(..., description="The unique identifier for the watchlist.")
     name: str = Field(..., description="The name of the watchlist.")
@@ -62,6 +72,12 @@ class ExampleWatchlists(Enum):
         yield self.value.model_dump()
 
 
+def example_analysis_window(today: date | None = None) -> tuple[str, str]:
+    """Start and end dates suggested for the analysis window, the last 30 days."""
+    today = today or date.today()
+    return (today - timedelta(days=30)).isoformat(), today.isoformat()
+
+
 class RiskAnalysisRequest(BaseModel):
     main_theme: str = Field(
         ...,
@@ -92,12 +108,12 @@ class RiskAnalysisRequest(BaseModel):
     start_date: str = Field(
         default="2024-01-01",
         description="Start date of the analysis window (format: YYYY-MM-DD). Defaults to 6 months ago.",
-        example=(date.today() - timedelta(days=30)).isoformat(),
+        example=example_analysis_window()[0],
     )
     end_date: str = Field(
         default="2024-12-31",
         description="End date of the analysis window (format: YYYY-MM-DD). Defaults to yesterday.",
-        example=date.today().isoformat(),
+        example=example_analysis_window()[1],
     )
 
     keywords: List[str] | None = Field(
@@ -141,6 +157,24 @@ class RiskAnalysisRequest(BaseModel):
         description="Number of entities to include in each batch for parallel querying.",
         example=10,
     )
+    parallelism: int = Field(
+        default=1,
+        ge=1,
+        description="Number of worker processes the companies are split across for the search and labeling, capped by the server. Useful for large universes, it does not change the results.",
+        example=1,
+    )
+    reuse_taxonomy: bool = Field(
+        default=False,
+        description="Reuse the latest risk taxonomy generated for the same main_theme, focus and llm_model instead of generating a new one.",
+        example=False,
+    )
+    taxonomy_id: UUID | None = Field(
+        default=None,
+        description="Use the risk taxonomy of a previous report (its `taxonomy_id`) instead of generating a new one, so the scores of both reports are comparable.",
+        example=None,
+    )
+    # Set by `/report/{request_id}/extend`, the report this request extends in time
+    extends_report_id: SkipJsonSchema[UUID | None] = None
 
     @model_validator(mode="after")
     def fiscal_year_only_when_transcrips_or_filings(self) -> Self:
@@ -222,10 +256,73 @@ class RiskAnalysisRequest(BaseModel):
             )
         return values
 
+    def request_hash(self) -> str:
+        """Canonical hash of the request, two requests with the same hash produce the same
+        report. The order of the companies and the parallelism are not relevant."""
+        canonical = self.model_dump(mode="json", exclude={"parallelism"})
+        if isinstance(canonical["companies"], list):
+            canonical["companies"] = sorted(canonical["companies"])
+        return hashlib.sha256(
+            json.dumps(canonical, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def taxonomy_hash(self) -> str:
+        """Hash of the inputs the risk taxonomy is generated from, requests with the same
+        hash can share a taxonomy."""
+        canonical = {
+            "main_theme": self.main_theme,
+            "focus": self.focus,
+            "llm_model": self.llm_model,
+        }
+        return hashlib.sha256(
+            json.dumps(canonical, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+
+class ReportExtensionRequest(BaseModel):
+    end_date: date = Field(
+        description="New end date of the analysis window (format: YYYY-MM-DD), after the end date of the report.",
+        example=example_analysis_window()[1],
+    )
+
 
 class RiskAnalyzerAcceptedResponse(BaseModel):
     request_id: str
     status: WorkflowStatus
+    cached: bool = Field(
+        default=False,
+        description="Whether the request was answered with an existing report or attached to an identical request already in progress.",
+    )
+
+
+class RiskAnalysisBatchRequest(BaseModel):
+    requests: list[RiskAnalysisRequest] = Field(
+        min_length=1,
+        description="Risk analyses to run, typically several scenarios over the same universe.",
+    )
+
+
+class RiskAnalysisBatchAcceptedResponse(BaseModel):
+    batch_id: str
+    requests: list[RiskAnalyzerAcceptedResponse] = Field(
+        description="One entry per request of the batch, in the same order. Identical requests share the same request_id."
+    )
+
+
+class BatchRequestStatus(BaseModel):
+    request_id: str
+    status: WorkflowStatus
+
+
+class RiskAnalysisBatchStatusResponse(BaseModel):
+    batch_id: str
+    status: WorkflowStatus = Field(
+        description="Completed when all the analyses are completed, failed when none is pending and at least one failed, queued while none has started and in progress otherwise."
+    )
+    counts: dict[WorkflowStatus, int] = Field(
+        description="Number of analyses in each status."
+    )
+    requests: list[BatchRequestStatus] = Field(default_factory=list)
 
 
 class RiskAnalyzerStatusResponse(BaseModel):
@@ -233,4 +330,183 @@ class RiskAnalyzerStatusResponse(BaseModel):
     last_updated: datetime
     status: WorkflowStatus
     logs: list[str] = Field(default_factory=list)
+    log_cursor: int = Field(
+        default=0,
+        description="Pass it as `since` in the next status request to only get new log messages.",
+    )
+    queue_position: int | None = Field(
+        default=None,
+        description="Position of the request in the job queue, only set while it is queued.",
+    )
+    queue_depth: int | None = Field(
+        default=None, description="Number of requests waiting in the job queue."
+    )
     report: RiskAnalysisResponse | None = None
+
+
+class ReportContentFilters(BaseModel):
+    company: str | None = Field(default=None, description="Company name.")
+    ticker: str | None = Field(default=None, description="Company ticker.")
+    risk_factor: str | None = Field(default=None, description="Risk factor.")
+    risk_channel: str | None = Field(default=None, description="Risk channel.")
+    sub_scenario: str | None = Field(default=None, description="Sub-scenario.")
+    time_period: str | None = Field(
+        default=None, description="Time period, e.g. 'Oct 2025'."
+    )
+    start_date: date | None = Field(
+        default=None, description="Only evidence published on or after this date."
+    )
+    end_date: date | None = Field(
+        default=None, description="Only evidence published on or before this date."
+    )
+    search: str | None = Field(
+        default=None,
+        description="Case insensitive text to look for in the headline, quote or motivation.",
+    )
+
+
+class ReportContentPage(BaseModel):
+    items: list[LabeledChunk] = Field(default_factory=list)
+    total: int = Field(description="Number of evidence chunks matching the filters.")
+    next_cursor: int | None = Field(
+        default=None,
+        description="Pass it as `cursor` to get the next page, not set on the last page.",
+    )
+
+
+class ReportContentFacets(BaseModel):
+    total: int = Field(description="Number of evidence chunks in the report.")
+    companies: list[str] = Field(default_factory=list)
+    tickers: list[str] = Field(default_factory=list)
+    risk_factors: list[str] = Field(default_factory=list)
+    risk_channels: list[str] = Field(default_factory=list)
+    sub_scenarios: list[str] = Field(default_factory=list)
+    time_periods: list[str] = Field(default_factory=list)
+
+
+class ScoreFilters(BaseModel):
+    company: str | None = Field(default=None, description="Company name.")
+    ticker: str | None = Field(default=None, description="Company ticker.")
+    sector: str | None = Field(default=None, description="Company sector.")
+    theme: str | None = Field(
+        default=None,
+        description="Case insensitive text to look for in the main theme of the reports.",
+    )
+    risk: str | None = Field(
+        default=None,
+        description="Risk (sub-scenario) to get the scores of, the composite score of the companies if not set.",
+    )
+    start_date: date | None = Field(
+        default=None, description="Only reports created on or after this date."
+    )
+    end_date: date | None = Field(
+        default=None, description="Only reports created on or before this date."
+    )
+
+
+class ReportScore(BaseModel):
+    report_id: UUID
+    created_at: datetime
+    theme: str
+    company: str
+    ticker: str
+    sector: str
+    industry: str
+    risk: str | None = Field(
+        default=None, description="Risk of the score, not set for composite scores."
+    )
+    score: int
+    composite_score: int
+
+
+class ReportScorePage(BaseModel):
+    items: list[ReportScore] = Field(default_factory=list)
+    next_cursor: int | None = Field(
+        default=None,
+        description="Pass it as `cursor` to get the next page, not set on the last page.",
+    )
+
+
+class ScoreGroupBy(StrEnum):
+    COMPANY = "company"
+    SECTOR = "sector"
+    THEME = "theme"
+
+
+class ScoreInterval(StrEnum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    ALL = "all"
+
+
+class ScoreAggregate(BaseModel):
+    group: str = Field(description="Company, sector or theme of the scores.")
+    period: date | None = Field(
+        default=None,
+        description="First day of the period of the scores, not set when aggregating over all time.",
+    )
+    reports: int = Field(description="Number of reports with scores in the group.")
+    count: int = Field(description="Number of scores in the group.")
+    mean_score: float
+    min_score: int
+    max_score: int
+
+
+class ReportListFilters(BaseModel):
+    theme: str | None = Field(default=None, description="Main theme of the analyses.")
+    llm_model: str | None = Field(
+        default=None, description="LLM model of the analyses."
+    )
+    status: WorkflowStatus | None = Field(
+        default=None, description="Status of the analyses."
+    )
+    watchlist: str | None = Field(
+        default=None, description="ID of the watchlist the analyses were run on."
+    )
+    created_after: date | None = Field(
+        default=None, description="Only analyses submitted on or after this date."
+    )
+    created_before: date | None = Field(
+        default=None, description="Only analyses submitted on or before this date."
+    )
+    start_date: date | None = Field(
+        default=None,
+        description="Only analyses whose analysis window ends on or after this date.",
+    )
+    end_date: date | None = Field(
+        default=None,
+        description="Only analyses whose analysis window starts on or before this date.",
+    )
+
+
+class ReportSummary(BaseModel):
+    request_id: UUID
+    status: WorkflowStatus
+    created_at: datetime
+    last_updated: datetime
+    theme: str
+    focus: str
+    llm_model: str
+    start_date: str
+    end_date: str
+    watchlist_id: str | None = Field(
+        default=None,
+        description="ID of the watchlist of the analysis, not set for lists of companies.",
+    )
+    content_size: int | None = Field(
+        default=None,
+        description="Number of evidence chunks of the report, only set once completed.",
+    )
+    taxonomy_id: UUID | None = Field(
+        default=None,
+        description="Risk taxonomy of the report, only set once completed.",
+    )
+
+
+class ReportSummaryPage(BaseModel):
+    items: list[ReportSummary] = Field(default_factory=list)
+    next_cursor: UUID | None = Field(
+        default=None,
+        description="Pass it as `cursor` to get the next page, not set on the last page.",
+    )
@@ -0,0 +1,165 @@
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import StrEnum
+from threading import Condition, Thread
+from typing import Callable
+from uuid import UUID
+
+from bigdata_risk_analyzer import logger
+from bigdata_risk_analyzer.metrics import (
+    JOBS_IN_PROGRESS,
+    JOBS_QUEUED,
+    QUEUE_WAIT_SECONDS,
+)
+
+
+class WorkerType(StrEnum):
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a scheduler whose queue is at capacity."""
+
+    def __init__(self, max_queue_size: int):
+        super().__init__(
+            f"The job queue is full ({max_queue_size} jobs waiting), please try again later."
+        )
+        self.max_queue_size = max_queue_size
+
+
+class JobScheduler:
+    """Runs queued risk analyses on a fixed number of workers.
+
+    Jobs are identified by their request_id, the job function is responsible for loading
+    everything else it needs. With `WorkerType.PROCESS` each worker thread hands its job
+    to a process pool of the same size, so the job function must be importable from a
+    module (picklable).
+    """
+
+    def __init__(
+        self,
+        job_fn: Callable[[UUID], None],
+        max_workers: int = 2,
+        max_queue_size: int = 100,
+        worker_type: WorkerType = WorkerType.THREAD,
+        worker_initializer: Callable[[], None] | None = None,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.job_fn = job_fn
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.worker_type = WorkerType(worker_type)
+        self.worker_initializer = worker_initializer
+        self._queue: deque[UUID] = deque()
+        # When each queued job was submitted, to measure how long it waits
+        self._submitted_at: dict[UUID, float] = {}
+        self._running: set[UUID] = set()
+        self._condition = Condition()
+        self._workers: list[Thread] = []
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._stopping = False
+
+    @property
+    def queue_depth(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        with self._condition:
+            return len(self._running)
+
+    def position(self, request_id: UUID) -> int | None:
+        """1-based position of a job in the queue, None if it is not waiting."""
+        with self._condition:
+            try:
+                return self._queue.index(request_id) + 1
+            except ValueError:
+                return None
+
+    def submit(self, request_id: UUID, force: bool = False) -> int:
+        """Queue a job and return its position (0 if it is already running). Raises
+        QueueFullError if the queue is at capacity, unless `force` is set (used to re-queue
+        persisted jobs on startup)."""
+        with self._condition:
+            if request_id in self._running:
+                return 0
+            if request_id in self._queue:
+                return self._queue.index(request_id) + 1
+            if not force and len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(self.max_queue_size)
+            self._queue.append(request_id)
+            self._submitted_at[request_id] = time.monotonic()
+            JOBS_QUEUED.inc()
+            self._condition.notify()
+            return len(self._queue)
+
+    def start(self):
+        if self._workers:
+            return
+        self._stopping = False
+        if self.worker_type == WorkerType.PROCESS:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=self.worker_initializer
+            )
+        for i in range(self.max_workers):
+            worker = Thread(
+                target=self._worker_loop, name=f"risk-analyzer-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        logger.info(
+            "Job scheduler started",
+            workers=self.max_workers,
+            worker_type=self.worker_type.value,
+            max_queue_size=self.max_queue_size,
+        )
+
+    def shutdown(self, wait: bool = False):
+        """Stop picking up new jobs. Jobs still in the queue stay persisted and are
+        picked up again on the next start."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=True)
+            self._process_pool = None
+        self._workers = []
+
+    def _next_job(self) -> UUID | None:
+        with self._condition:
+            while not self._queue and not self._stopping:
+                self._condition.wait()
+            if self._stopping:
+                return None
+            request_id = self._queue.popleft()
+            self._running.add(request_id)
+            JOBS_QUEUED.dec()
+            JOBS_IN_PROGRESS.inc()
+            QUEUE_WAIT_SECONDS.observe(
+                time.monotonic() - self._submitted_at.pop(request_id)
+            )
+            return request_id
+
+    def _worker_loop(self):
+        while True:
+            request_id = self._next_job()
+            if request_id is None:
+                return
+            try:
+                if self._process_pool is not None:
+                    self._process_pool.submit(self.job_fn, request_id).result()
+                else:
+                    self.job_fn(request_id)
+            except Exception as e:
+                logger.error("Job failed", request_id=str(request_id), error=str(e))
+            finally:
+                with self._condition:
+                    self._running.discard(request_id)
+                JOBS_IN_PROGRESS.dec()
@@ -1,25 +1,96 @@
-from datetime import datetime
-from uuid import UUID
+from datetime import date, datetime
+from uuid import UUID, uuid4
 
-from sqlalchemy.ext.mutable import MutableList
-from sqlmodel import JSON, Column, Field, SQLModel
+from sqlmodel import JSON, Column, Field, Index, LargeBinary, SQLModel
 
 from bigdata_risk_analyzer.api.models import RiskAnalysisRequest
-from bigdata_risk_analyzer.models import RiskAnalysisResponse
+from bigdata_risk_analyzer.api.utils import compress_json, decompress_json
+from bigdata_risk_analyzer.models import (
+    LabeledChunk,
+    LabeledContent,
+    RiskAnalysisResponse,
+    RiskScoring,
+    RiskTaxonomy,
+)
 
 
 class SQLWorkflowStatus(SQLModel, table=True):
     id: UUID = Field(primary_key=True)
     last_updated: datetime
-    status: str
-    logs: list[str] = Field(
-        default_factory=list, sa_column=Column(MutableList.as_mutable(JSON))
+    status: str = Field(index=True)
+
+
+class SQLWorkflowLog(SQLModel, table=True):
+    """Append-only log of a workflow, one row per message."""
+
+    __table_args__ = (
+        Index("ix_sqlworkflowlog_request_id_seq", "request_id", "seq", unique=True),
     )
 
+    id: int | None = Field(default=None, primary_key=True)
+    request_id: UUID
+    seq: int
+    timestamp: datetime
+    level: str
+    message: str
+
+
+class SQLJob(SQLModel, table=True):
+    """Submitted analyses, with the request to run them and the metadata they are listed
+    and searched by in `/reports`."""
+
+    __table_args__ = (
+        # Analyses are listed most recent first, optionally filtered by one of these
+        Index("ix_sqljob_created_at_id", "created_at", "id"),
+        *(
+            Index(f"ix_sqljob_{column}_created_at_id", column, "created_at", "id")
+            for column in ("theme", "llm_model", "watchlist_id")
+        ),
+    )
+
+    id: UUID = Field(primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    request_hash: str = Field(index=True)
+    request: dict = Field(sa_column=Column(JSON))
+    theme: str | None = None
+    focus: str | None = None
+    llm_model: str | None = None
+    # Analysis window as ISO dates, which sort chronologically
+    start_date: str | None = None
+    end_date: str | None = None
+    # Set when the companies of the request are a watchlist
+    watchlist_id: str | None = None
+
+    @staticmethod
+    def from_request(request_id: UUID, request: RiskAnalysisRequest) -> "SQLJob":
+        return SQLJob(
+            id=request_id,
+            request_hash=request.request_hash(),
+            request=request.model_dump(mode="json"),
+            theme=request.main_theme,
+            focus=request.focus,
+            llm_model=request.llm_model,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            watchlist_id=request.companies
+            if isinstance(request.companies, str)
+            else None,
+        )
+
+
+class SQLBatch(SQLModel, table=True):
+    """Requests submitted together to `/risk-analysis/batch`."""
+
+    id: UUID = Field(primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    # Request IDs in submission order, identical requests share a request ID
+    request_ids: list[str] = Field(sa_column=Column(JSON))
+
 
 class SQLRiskAnalyzerReport(SQLModel, table=True):
     id: UUID = Field(primary_key=True)
     created_at: datetime = Field(default_factory=datetime.now)
+    request_hash: str | None = Field(default=None, index=True)
     companies: str | list[str] = Field(sa_column=Column(JSON))
     llm_model: str
     theme: str
@@ -32,7 +103,15 @@ class SQLRiskAnalyzerReport(SQLModel, table=True):
     frequency: str
     document_limit: int
     batch_size: int
-    screener_report: dict = Field(sa_column=Column(JSON))
+    # Scores and taxonomy of the report as gzip compressed JSON, the evidence is stored
+    # separately in SQLReportChunk so it is only loaded when needed
+    risk_scoring: bytes = Field(sa_column=Column(LargeBinary))
+    risk_taxonomy: bytes = Field(sa_column=Column(LargeBinary))
+    # Number of evidence chunks, None if the report has no content
+    content_size: int | None = None
+    # Stored taxonomies are deleted once no report references them
+    taxonomy_id: UUID | None = Field(default=None, index=True)
+    stage_timings: dict[str, float] | None = Field(default=None, sa_column=Column(JSON))
 
     @staticmethod
     def from_risk_analyzer_response(
@@ -42,6 +121,7 @@ class SQLRiskAnalyzerReport(SQLModel, table=True):
     ) -> "SQLRiskAnalyzerReport":
         return SQLRiskAnalyzerReport(
             id=request_id,
+            request_hash=request.request_hash(),
             companies=request.companies,
             llm_model=request.llm_model,
             theme=request.main_theme,
@@ -56,5 +136,166 @@ class SQLRiskAnalyzerReport(SQLModel, table=True):
             frequency=request.frequency.value,
             document_limit=request.document_limit,
             batch_size=request.batch_size,
-            screener_report=response.model_dump(),
+            risk_scoring=compress_json(response.risk_scoring.model_dump_json()),
+            risk_taxonomy=compress_json(response.risk_taxonomy.model_dump_json()),
+            content_size=len(response.content.root)
+            if response.content is not None
+            else None,
+            taxonomy_id=response.taxonomy_id,
+            stage_timings=response.stage_timings,
+        )
+
+    def to_risk_analyzer_response(
+        self, chunks: list[LabeledChunk] | None = None
+    ) -> RiskAnalysisResponse:
+        """Rebuild the report, with the given evidence chunks as content. The content is
+        not set when the evidence was not loaded."""
+        return RiskAnalysisResponse(
+            risk_scoring=RiskScoring.model_validate_json(
+                decompress_json(self.risk_scoring)
+            ),
+            risk_taxonomy=RiskTaxonomy.model_validate_json(
+                decompress_json(self.risk_taxonomy)
+            ),
+            content=LabeledContent(root=chunks) if chunks is not None else None,
+            taxonomy_id=self.taxonomy_id,
+            stage_timings=self.stage_timings,
         )
+
+
+class SQLReportChunk(SQLModel, table=True):
+    """Evidence of a report, one row per labeled chunk in the order of the report."""
+
+    __table_args__ = (
+        Index(
+            "ix_sqlreportchunk_report_id_position", "report_id", "position", unique=True
+        ),
+        # Evidence is filtered within a report and paginated by position
+        *(
+            Index(
+                f"ix_sqlreportchunk_report_id_{column}", "report_id", column, "position"
+            )
+            for column in (
+                "company",
+                "ticker",
+                "risk_factor",
+                "risk_channel",
+                "sub_scenario",
+                "time_period",
+                "date",
+            )
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    report_id: UUID
+    position: int
+    time_period: str
+    date: str
+    company: str
+    sector: str
+    industry: str
+    country: str
+    ticker: str
+    document_id: str
+    headline: str
+    quote: str
+    motivation: str
+    sub_scenario: str
+    risk_channel: str
+    risk_factor: str
+    highlights: list[str] = Field(sa_column=Column(JSON))
+
+    @staticmethod
+    def rows_from_content(report_id: UUID, content: LabeledContent) -> list[dict]:
+        """Rows of the evidence of a report, to be bulk inserted."""
+        return [
+            {"report_id": report_id, "position": position, **chunk.model_dump()}
+            for position, chunk in enumerate(content.root)
+        ]
+
+
+class SQLReportScore(SQLModel, table=True):
+    """Index of the scores of the completed reports, one row per company and risk plus one
+    row per company with its composite score (`risk` is None), so scores can be queried
+    across reports without loading them."""
+
+    __table_args__ = (
+        Index("ix_sqlreportscore_report_id", "report_id"),
+        Index("ix_sqlreportscore_risk_created_at", "risk", "created_at"),
+        # Scores are filtered by company, ticker or sector and risk, over time
+        *(
+            Index(
+                f"ix_sqlreportscore_{column}_risk_created_at",
+                column,
+                "risk",
+                "created_at",
+            )
+            for column in ("company", "ticker", "sector")
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    report_id: UUID
+    created_at: datetime
+    # Day the report was created, scores are aggregated over time by day
+    created_date: date
+    theme: str
+    company: str
+    ticker: str
+    sector: str
+    industry: str
+    risk: str | None = None
+    score: int
+    composite_score: int
+
+    @staticmethod
+    def rows_from_report(
+        sql_report: SQLRiskAnalyzerReport, risk_scoring: RiskScoring
+    ) -> list[dict]:
+        """Rows of the scores of a report, to be bulk inserted."""
+        report = {
+            "report_id": sql_report.id,
+            "created_at": sql_report.created_at,
+            "created_date": sql_report.created_at.date(),
+            "theme": sql_report.theme,
+        }
+        rows = []
+        for company, scoring in risk_scoring.root.items():
+            company_row = {
+                **report,
+                "company": company,
+                "ticker": scoring.ticker,
+                "sector": scoring.sector,
+                "industry": scoring.industry,
+                "composite_score": scoring.composite_score,
+            }
+            rows.append({**company_row, "risk": None, "score": scoring.composite_score})
+            rows.extend(
+                {**company_row, "risk": risk, "score": score}
+                for risk, score in scoring.risks.root.items()
+            )
+        return rows
+
+
+class SQLCachedEntity(SQLModel, table=True):
+    """Persistent entries of the entity cache, a company or the items of a watchlist."""
+
+    kind: str = Field(primary_key=True)
+    entity_id: str = Field(primary_key=True)
+    data: dict | list | None = Field(default=None, sa_column=Column(JSON))
+    expires_at: datetime = Field(index=True)
+
+
+class SQLTaxonomy(SQLModel, table=True):
+    """Risk taxonomies generated by the workflows, so later analyses can reuse them."""
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    # Hash of the main theme, focus and LLM model the taxonomy was generated from
+    taxonomy_hash: str = Field(index=True)
+    main_theme: str
+    focus: str | None = None
+    llm_model: str
+    # Tree of the taxonomy, as gzip compressed `RiskTaxonomy` JSON
+    taxonomy: bytes = Field(sa_column=Column(LargeBinary))
@@ -1,126 +1,1222 @@
-from datetime import datetime
-from threading import Lock
+import asyncio
+from datetime import date, datetime, timedelta
+from threading import Lock, Timer
+from typing import Any, AsyncIterator, Callable, Iterator
 from uuid import UUID
 
-from sqlmodel import Session, select
+from sqlalchemy import Engine, Select, insert
+from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, and_, col, delete, func, or_, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from bigdata_risk_analyzer.api.events import EventHub
 from bigdata_risk_analyzer.api.models import (
+    BatchRequestStatus,
+    LogLevel,
+    ReportContentFacets,
+    ReportContentFilters,
+    ReportContentPage,
+    ReportListFilters,
+    ReportScore,
+    ReportScorePage,
+    ReportSummary,
+    ReportSummaryPage,
+    RiskAnalysisBatchStatusResponse,
     RiskAnalysisRequest,
     RiskAnalyzerStatusResponse,
+    ScoreAggregate,
+    ScoreFilters,
+    ScoreGroupBy,
+    ScoreInterval,
     WorkflowStatus,
 )
 from bigdata_risk_analyzer.api.sql_models import (
+    SQLBatch,
+    SQLCachedEntity,
+    SQLJob,
+    SQLReportChunk,
+    SQLReportScore,
     SQLRiskAnalyzerReport,
+    SQLTaxonomy,
+    SQLWorkflowLog,
     SQLWorkflowStatus,
 )
-from bigdata_risk_analyzer.models import RiskAnalysisResponse
+from bigdata_risk_analyzer.api.utils import compress_json, decompress_json
+from bigdata_risk_analyzer.metrics import timed_db_operation
+from bigdata_risk_analyzer.models import (
+    LabeledChunk,
+    RiskAnalysisResponse,
+    RiskTaxonomy,
+)
 
 
-class StorageManager:
-    def __init__(self, db_session: Session):
-        self.db_session = db_session
-        self.lock = Lock()
+class BufferedLogWriter:
+    """Buffers log entries and writes them in batches, either when `max_size` entries are
+    pending or `flush_interval` seconds after the first pending entry was added."""
+
+    def __init__(
+        self,
+        write_batch: Callable[[list[SQLWorkflowLog]], None],
+        max_size: int = 50,
+        flush_interval: float = 1.0,
+    ):
+        self.write_batch = write_batch
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._buffer: list[SQLWorkflowLog] = []
+        self._timer: Timer | None = None
+        self._lock = Lock()
+
+    def append(self, entry: SQLWorkflowLog):
+        with self._lock:
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.max_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self.write_batch(batch)
+
+
+UNFINISHED_STATUSES = [WorkflowStatus.QUEUED, WorkflowStatus.IN_PROGRESS]
+
+
+# Queries shared by the sync and async storage managers
+
+
+def _select_workflow_status(request_id: UUID):
+    return select(SQLWorkflowStatus).where(SQLWorkflowStatus.id == request_id)
+
+
+def _select_workflow_report(request_id: UUID):
+    return select(SQLRiskAnalyzerReport).where(SQLRiskAnalyzerReport.id == request_id)
+
+
+def _select_report_version(request_id: UUID):
+    return select(SQLRiskAnalyzerReport.created_at).where(
+        SQLRiskAnalyzerReport.id == request_id
+    )
+
+
+def _select_logs(request_id: UUID, since: int):
+    return (
+        select(SQLWorkflowLog)
+        .where(SQLWorkflowLog.request_id == request_id, SQLWorkflowLog.seq >= since)
+        .order_by(col(SQLWorkflowLog.seq))
+    )
+
+
+def _select_chunks(report_id: UUID):
+    return (
+        select(*(getattr(SQLReportChunk, name) for name in LabeledChunk.model_fields))
+        .where(SQLReportChunk.report_id == report_id)
+        .order_by(SQLReportChunk.position)
+    )
+
+
+def _to_chunks(rows) -> list[LabeledChunk]:
+    return [
+        LabeledChunk(**{name: row._mapping[name] for name in LabeledChunk.model_fields})
+        for row in rows
+    ]
+
+
+def _content_conditions(report_id: UUID, filters: ReportContentFilters) -> list:
+    conditions = [SQLReportChunk.report_id == report_id]
+    for name in (
+        "company",
+        "ticker",
+        "risk_factor",
+        "risk_channel",
+        "sub_scenario",
+        "time_period",
+    ):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(getattr(SQLReportChunk, name) == value)
+    # Dates are stored as ISO strings, so they sort chronologically
+    if filters.start_date is not None:
+        conditions.append(SQLReportChunk.date >= filters.start_date.isoformat())
+    if filters.end_date is not None:
+        conditions.append(
+            SQLReportChunk.date < (filters.end_date + timedelta(days=1)).isoformat()
+        )
+    if filters.search:
+        conditions.append(
+            or_(
+                col(SQLReportChunk.headline).icontains(filters.search, autoescape=True),
+                col(SQLReportChunk.quote).icontains(filters.search, autoescape=True),
+                col(SQLReportChunk.motivation).icontains(
+                    filters.search, autoescape=True
+                ),
+            )
+        )
+    return conditions
+
+
+def _select_content_page(conditions: list, cursor: int | None, limit: int):
+    if cursor is not None:
+        conditions = [*conditions, SQLReportChunk.position > cursor]
+    # One more row than requested to know whether there is a next page
+    return (
+        select(
+            SQLReportChunk.position,
+            *(getattr(SQLReportChunk, name) for name in LabeledChunk.model_fields),
+        )
+        .where(*conditions)
+        .order_by(SQLReportChunk.position)
+        .limit(limit + 1)
+    )
+
+
+def _to_content_page(rows, total: int, limit: int) -> ReportContentPage:
+    rows = list(rows)
+    return ReportContentPage(
+        items=_to_chunks(rows[:limit]),
+        total=total,
+        next_cursor=rows[limit - 1].position if len(rows) > limit else None,
+    )
+
+
+def _score_conditions(filters: ScoreFilters) -> list:
+    conditions = [
+        SQLReportScore.risk == filters.risk
+        if filters.risk is not None
+        else col(SQLReportScore.risk).is_(None)
+    ]
+    for name in ("company", "ticker", "sector"):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(getattr(SQLReportScore, name) == value)
+    if filters.theme:
+        conditions.append(
+            col(SQLReportScore.theme).icontains(filters.theme, autoescape=True)
+        )
+    if filters.start_date is not None:
+        conditions.append(
+            SQLReportScore.created_at
+            >= datetime.combine(filters.start_date, datetime.min.time())
+        )
+    if filters.end_date is not None:
+        conditions.append(
+            SQLReportScore.created_at
+            < datetime.combine(
+                filters.end_date + timedelta(days=1), datetime.min.time()
+            )
+        )
+    return conditions
+
+
+def _select_score_page(conditions: list, cursor: int | None, limit: int):
+    if cursor is not None:
+        conditions = [*conditions, col(SQLReportScore.id) < cursor]
+    # Most recent reports first, one more row than requested to know whether there is a
+    # next page
+    return (
+        select(SQLReportScore)
+        .where(*conditions)
+        .order_by(col(SQLReportScore.id).desc())
+        .limit(limit + 1)
+    )
 
-    def _get_workflow_status(self, request_id: UUID) -> SQLWorkflowStatus | None:
-        return self.db_session.exec(
-            select(SQLWorkflowStatus).where(SQLWorkflowStatus.id == request_id)
-        ).first()
 
-    def _get_workflow_report(self, request_id: UUID) -> SQLRiskAnalyzerReport | None:
-        return self.db_session.exec(
-            select(SQLRiskAnalyzerReport).where(SQLRiskAnalyzerReport.id == request_id)
-        ).first()
+def _to_score_page(rows, limit: int) -> ReportScorePage:
+    rows = list(rows)
+    return ReportScorePage(
+        items=[ReportScore.model_validate(row.model_dump()) for row in rows[:limit]],
+        next_cursor=rows[limit - 1].id if len(rows) > limit else None,
+    )
 
-    def _create_workflow_status(
-        self, request_id: UUID, status: WorkflowStatus
-    ) -> SQLWorkflowStatus:
-        return SQLWorkflowStatus(
-            id=request_id, status=status, last_updated=datetime.now()
+
+def _select_daily_scores(filters: ScoreFilters, group_by: ScoreGroupBy):
+    group = getattr(SQLReportScore, group_by.value)
+    return (
+        select(
+            group.label("group"),
+            col(SQLReportScore.created_date),
+            func.count(col(SQLReportScore.report_id).distinct()).label("reports"),
+            func.count().label("count"),
+        )
+        .add_columns(
+            func.sum(SQLReportScore.score).label("total"),
+            func.min(SQLReportScore.score).label("min_score"),
+            func.max(SQLReportScore.score).label("max_score"),
         )
+        .where(*_score_conditions(filters))
+        .group_by(group, col(SQLReportScore.created_date))
+    )
+
+
+def _period_start(day: date, interval: ScoreInterval) -> date | None:
+    if interval == ScoreInterval.ALL:
+        return None
+    if interval == ScoreInterval.WEEK:
+        return day - timedelta(days=day.weekday())
+    if interval == ScoreInterval.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _to_score_aggregates(rows, interval: ScoreInterval) -> list[ScoreAggregate]:
+    """Merge the daily aggregates of the scores into periods of `interval`. A report is
+    created on a single day, so its scores are never counted in two daily rows."""
+    periods = {}
+    for row in rows:
+        key = (row.group, _period_start(row.created_date, interval))
+        period = periods.get(key)
+        if period is None:
+            periods[key] = dict(row._mapping)
+            continue
+        period["reports"] += row.reports
+        period["count"] += row.count
+        period["total"] += row.total
+        period["min_score"] = min(period["min_score"], row.min_score)
+        period["max_score"] = max(period["max_score"], row.max_score)
+    return [
+        ScoreAggregate(
+            group=group,
+            period=start,
+            reports=period["reports"],
+            count=period["count"],
+            mean_score=round(period["total"] / period["count"], 2),
+            min_score=period["min_score"],
+            max_score=period["max_score"],
+        )
+        for (group, start), period in sorted(
+            periods.items(), key=lambda item: (item[0][0], item[0][1] or date.min)
+        )
+    ]
+
 
+def _report_list_conditions(filters: ReportListFilters) -> list:
+    conditions = []
+    for name, column in (
+        ("theme", SQLJob.theme),
+        ("llm_model", SQLJob.llm_model),
+        ("watchlist", SQLJob.watchlist_id),
+        ("status", SQLWorkflowStatus.status),
+    ):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(column == value)
+    if filters.created_after is not None:
+        conditions.append(
+            SQLJob.created_at
+            >= datetime.combine(filters.created_after, datetime.min.time())
+        )
+    if filters.created_before is not None:
+        conditions.append(
+            SQLJob.created_at
+            < datetime.combine(
+                filters.created_before + timedelta(days=1), datetime.min.time()
+            )
+        )
+    # The analysis window overlaps the requested one, ISO dates compare as strings
+    if filters.start_date is not None:
+        conditions.append(col(SQLJob.end_date) >= filters.start_date.isoformat())
+    if filters.end_date is not None:
+        conditions.append(col(SQLJob.start_date) <= filters.end_date.isoformat())
+    return conditions
+
+
+def _select_report_list_page(conditions: list, cursor: UUID | None, limit: int):
+    if cursor is not None:
+        # Keyset on (created_at, id), from the analysis the previous page ended with
+        cursor_created_at = (
+            select(SQLJob.created_at).where(col(SQLJob.id) == cursor).scalar_subquery()
+        )
+        conditions = [
+            *conditions,
+            or_(
+                col(SQLJob.created_at) < cursor_created_at,
+                and_(
+                    col(SQLJob.created_at) == cursor_created_at,
+                    col(SQLJob.id) < cursor,
+                ),
+            ),
+        ]
+    # Only the metadata columns, the reports themselves are not loaded. Most recent
+    # analyses first, one more row than requested to know whether there is a next page
+    return (
+        select(
+            col(SQLJob.id).label("request_id"),
+            col(SQLWorkflowStatus.status),
+            col(SQLJob.created_at),
+            col(SQLWorkflowStatus.last_updated),
+        )
+        .add_columns(
+            col(SQLJob.theme),
+            col(SQLJob.focus),
+            col(SQLJob.llm_model),
+            col(SQLJob.start_date),
+            col(SQLJob.end_date),
+            col(SQLJob.watchlist_id),
+            col(SQLRiskAnalyzerReport.content_size),
+            col(SQLRiskAnalyzerReport.taxonomy_id),
+        )
+        .join(SQLWorkflowStatus, col(SQLWorkflowStatus.id) == SQLJob.id)
+        .outerjoin(SQLRiskAnalyzerReport, col(SQLRiskAnalyzerReport.id) == SQLJob.id)
+        .where(*conditions)
+        .order_by(col(SQLJob.created_at).desc(), col(SQLJob.id).desc())
+        .limit(limit + 1)
+    )
+
+
+def _to_report_list_page(rows, limit: int) -> ReportSummaryPage:
+    rows = list(rows)
+    return ReportSummaryPage(
+        items=[
+            ReportSummary.model_validate(dict(row._mapping)) for row in rows[:limit]
+        ],
+        next_cursor=rows[limit - 1].request_id if len(rows) > limit else None,
+    )
+
+
+def _select_inflight_job(request_hash: str):
+    return (
+        select(SQLJob.id)
+        .join(SQLWorkflowStatus, col(SQLWorkflowStatus.id) == SQLJob.id)
+        .where(
+            SQLJob.request_hash == request_hash,
+            col(SQLWorkflowStatus.status).in_(UNFINISHED_STATUSES),
+        )
+        .order_by(col(SQLJob.created_at))
+    )
+
+
+def _select_cached_report(request_hash: str, max_age: timedelta):
+    return (
+        select(SQLRiskAnalyzerReport.id)
+        .where(
+            SQLRiskAnalyzerReport.request_hash == request_hash,
+            SQLRiskAnalyzerReport.created_at >= datetime.now() - max_age,
+        )
+        .order_by(col(SQLRiskAnalyzerReport.created_at).desc())
+    )
+
+
+def _create_workflow_status(
+    request_id: UUID, status: WorkflowStatus
+) -> SQLWorkflowStatus:
+    return SQLWorkflowStatus(id=request_id, status=status, last_updated=datetime.now())
+
+
+def _to_status_response(
+    workflow_status: SQLWorkflowStatus,
+    logs: list[SQLWorkflowLog],
+    report: RiskAnalysisResponse | None,
+    since: int,
+) -> RiskAnalyzerStatusResponse:
+    return RiskAnalyzerStatusResponse(
+        request_id=str(workflow_status.id),
+        last_updated=workflow_status.last_updated,
+        status=workflow_status.status,
+        logs=[log.message for log in logs],
+        log_cursor=logs[-1].seq + 1 if logs else since,
+        report=report,
+    )
+
+
+def _to_batch_status_response(
+    batch: SQLBatch, statuses: dict[str, WorkflowStatus]
+) -> RiskAnalysisBatchStatusResponse:
+    requests = [
+        BatchRequestStatus(request_id=request_id, status=statuses[request_id])
+        for request_id in batch.request_ids
+        if request_id in statuses
+    ]
+    counts = {status: 0 for status in WorkflowStatus}
+    for status in statuses.values():
+        counts[status] += 1
+    if counts[WorkflowStatus.COMPLETED] == len(statuses):
+        status = WorkflowStatus.COMPLETED
+    elif counts[WorkflowStatus.QUEUED] == len(statuses):
+        status = WorkflowStatus.QUEUED
+    elif counts[WorkflowStatus.QUEUED] + counts[WorkflowStatus.IN_PROGRESS] == 0:
+        status = WorkflowStatus.FAILED
+    else:
+        status = WorkflowStatus.IN_PROGRESS
+    return RiskAnalysisBatchStatusResponse(
+        batch_id=str(batch.id), status=status, counts=counts, requests=requests
+    )
+
+
+class StorageManager:
+    """Access to the workflow statuses, logs and reports.
+
+    Every operation runs on its own short-lived session from the engine connection pool, so
+    a single manager can be shared between threads (API requests and job workers) and reads
+    never wait for the writes of other threads.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        log_flush_size: int = 50,
+        log_flush_interval: float = 1.0,
+        event_hub: EventHub | None = None,
+    ):
+        self.engine = engine
+        # Hub notified of log messages and status changes, as they happen
+        self.event_hub = event_hub
+        self.log_writer = BufferedLogWriter(
+            self._write_logs,
+            max_size=log_flush_size,
+            flush_interval=log_flush_interval,
+        )
+        # Next log sequence number of each workflow logged through this manager
+        self._next_log_seq: dict[UUID, int] = {}
+        self._log_seq_lock = Lock()
+
+    def _session(self) -> Session:
+        # Objects stay usable once the session is closed
+        return Session(self.engine, expire_on_commit=False)
+
+    @timed_db_operation
     def update_status(self, request_id: UUID, status: WorkflowStatus):
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
+        # Logs written before a status change are visible with the new status
+        self.log_writer.flush()
+        with self._session() as session:
+            workflow_status = session.exec(_select_workflow_status(request_id)).first()
 
             if workflow_status is None:
-                workflow_status = self._create_workflow_status(request_id, status)
+                workflow_status = _create_workflow_status(request_id, status)
             else:
                 workflow_status.status = status
                 workflow_status.last_updated = datetime.now()
 
-            self.db_session.add(workflow_status)
-            self.db_session.commit()
-            self.db_session.refresh(workflow_status)
+            session.add(workflow_status)
+            session.commit()
+
+        if self.event_hub is not None:
+            self.event_hub.publish_status(request_id, status)
+
+    @timed_db_operation
+    def enqueue_job(self, request_id: UUID, request: RiskAnalysisRequest):
+        """Persist a new job in the QUEUED state so it can be picked up by a worker, even
+        after a restart."""
+        with self._session() as session:
+            session.add(_create_workflow_status(request_id, WorkflowStatus.QUEUED))
+            session.add(SQLJob.from_request(request_id, request))
+            session.commit()
+
+    @timed_db_operation
+    def get_job_request(self, request_id: UUID) -> RiskAnalysisRequest | None:
+        with self._session() as session:
+            job = session.exec(select(SQLJob).where(SQLJob.id == request_id)).first()
+            if job is None:
+                return None
+            return RiskAnalysisRequest(**job.request)
+
+    @timed_db_operation
+    def get_unfinished_jobs(self) -> list[UUID]:
+        """Request IDs of the jobs that are queued or were interrupted while running,
+        in submission order."""
+        with self._session() as session:
+            return list(
+                session.exec(
+                    select(SQLJob.id)
+                    .join(SQLWorkflowStatus, col(SQLWorkflowStatus.id) == SQLJob.id)
+                    .where(col(SQLWorkflowStatus.status).in_(UNFINISHED_STATUSES))
+                    .order_by(col(SQLJob.created_at))
+                ).all()
+            )
 
+    @timed_db_operation
+    def find_inflight_job(self, request_hash: str) -> UUID | None:
+        """Request ID of a queued or running job for an identical request, if any."""
+        with self._session() as session:
+            return session.exec(_select_inflight_job(request_hash)).first()
+
+    @timed_db_operation
+    def find_cached_report(self, request_hash: str, max_age: timedelta) -> UUID | None:
+        """Request ID of the most recent report for an identical request created within
+        `max_age`, if any."""
+        with self._session() as session:
+            return session.exec(_select_cached_report(request_hash, max_age)).first()
+
+    @timed_db_operation
     def get_status(self, request_id: UUID) -> WorkflowStatus | None:
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
+        with self._session() as session:
+            workflow_status = session.exec(_select_workflow_status(request_id)).first()
             if workflow_status is None:
                 return None
             return workflow_status.status
 
-    def log_message(self, request_id: UUID, message: str):
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
-            if workflow_status is None:
-                raise ValueError(
-                    f"Request ID {request_id} not found in status storage."
+    def log_message(
+        self, request_id: UUID, message: str, level: LogLevel = LogLevel.INFO
+    ):
+        """Append a message to the workflow logs. Messages are buffered and written in
+        batches, call `flush_logs` to write them immediately."""
+        with self._log_seq_lock:
+            seq = self._next_log_seq.get(request_id)
+            if seq is None:
+                with self._session() as session:
+                    if (
+                        session.exec(_select_workflow_status(request_id)).first()
+                        is None
+                    ):
+                        raise ValueError(
+                            f"Request ID {request_id} not found in status storage."
+                        )
+                    last_seq = session.exec(
+                        select(func.max(SQLWorkflowLog.seq)).where(
+                            SQLWorkflowLog.request_id == request_id
+                        )
+                    ).one()
+                seq = 0 if last_seq is None else last_seq + 1
+            self._next_log_seq[request_id] = seq + 1
+
+        if self.event_hub is not None:
+            self.event_hub.publish_log(request_id, seq, message, level)
+        self.log_writer.append(
+            SQLWorkflowLog(
+                request_id=request_id,
+                seq=seq,
+                timestamp=datetime.now(),
+                level=level,
+                message=message,
+            )
+        )
+
+    def flush_logs(self):
+        self.log_writer.flush()
+
+    @timed_db_operation
+    def _write_logs(self, entries: list[SQLWorkflowLog]):
+        with self._session() as session:
+            session.add_all(entries)
+            session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    col(SQLWorkflowStatus.id).in_(
+                        {entry.request_id for entry in entries}
+                    )
                 )
-            workflow_status.logs.append(message)
-            workflow_status.last_updated = datetime.now()
-            self.db_session.add(workflow_status)
-            self.db_session.commit()
-            self.db_session.refresh(workflow_status)
+                .values(last_updated=datetime.now())
+            )
+            session.commit()
 
-    def get_logs(self, request_id: UUID) -> list[str] | None:
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
-            if workflow_status is None:
+    @timed_db_operation
+    def get_logs(self, request_id: UUID, since: int = 0) -> list[str] | None:
+        """Log messages of a workflow, starting at the `since` sequence number."""
+        with self._session() as session:
+            if session.exec(_select_workflow_status(request_id)).first() is None:
                 return None
-            return workflow_status.logs
+            return [
+                log.message for log in session.exec(_select_logs(request_id, since))
+            ]
 
+    @timed_db_operation
     def mark_workflow_as_completed(
         self,
         request_id: UUID,
         request: RiskAnalysisRequest,
         report: RiskAnalysisResponse,
     ):
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
+        self.log_writer.flush()
+        with self._session() as session:
+            workflow_status = session.exec(_select_workflow_status(request_id)).first()
             if workflow_status is None:
                 raise ValueError(
                     f"Request ID {request_id} not found in status storage."
                 )
             workflow_status.status = WorkflowStatus.COMPLETED
+            workflow_status.last_updated = datetime.now()
             sql_report = SQLRiskAnalyzerReport.from_risk_analyzer_response(
                 request_id, request, report
             )
 
-            self.db_session.add(workflow_status)
-            self.db_session.add(sql_report)
-            self.db_session.commit()
-            self.db_session.refresh(workflow_status)
-            self.db_session.refresh(sql_report)
+            session.add(workflow_status)
+            session.add(sql_report)
+            if report.risk_scoring.root:
+                session.exec(
+                    insert(SQLReportScore),
+                    params=SQLReportScore.rows_from_report(
+                        sql_report, report.risk_scoring
+                    ),
+                )
+            if report.content is not None and report.content.root:
+                session.exec(
+                    insert(SQLReportChunk),
+                    params=SQLReportChunk.rows_from_content(request_id, report.content),
+                )
+            session.commit()
+
+        if self.event_hub is not None:
+            self.event_hub.publish_status(request_id, WorkflowStatus.COMPLETED)
+
+    @timed_db_operation
+    def save_taxonomy(
+        self, request: RiskAnalysisRequest, risk_taxonomy: RiskTaxonomy
+    ) -> UUID:
+        """Store the taxonomy generated by a workflow so later requests can reuse it,
+        returns its ID."""
+        sql_taxonomy = SQLTaxonomy(
+            taxonomy_hash=request.taxonomy_hash(),
+            main_theme=request.main_theme,
+            focus=request.focus,
+            llm_model=request.llm_model,
+            taxonomy=compress_json(risk_taxonomy.model_dump_json()),
+        )
+        with self._session() as session:
+            session.add(sql_taxonomy)
+            session.commit()
+        return sql_taxonomy.id
+
+    @timed_db_operation
+    def get_taxonomy(self, taxonomy_id: UUID) -> RiskTaxonomy | None:
+        with self._session() as session:
+            taxonomy = session.exec(
+                select(SQLTaxonomy.taxonomy).where(col(SQLTaxonomy.id) == taxonomy_id)
+            ).first()
+        if taxonomy is None:
+            return None
+        return RiskTaxonomy.model_validate_json(decompress_json(taxonomy))
+
+    @timed_db_operation
+    def find_taxonomy(self, taxonomy_hash: str) -> tuple[UUID, RiskTaxonomy] | None:
+        """ID and value of the latest taxonomy stored for the given taxonomy hash."""
+        with self._session() as session:
+            row = session.exec(
+                select(SQLTaxonomy.id, SQLTaxonomy.taxonomy)
+                .where(col(SQLTaxonomy.taxonomy_hash) == taxonomy_hash)
+                .order_by(col(SQLTaxonomy.created_at).desc())
+            ).first()
+        if row is None:
+            return None
+        taxonomy_id, taxonomy = row
+        return taxonomy_id, RiskTaxonomy.model_validate_json(decompress_json(taxonomy))
+
+    @timed_db_operation
+    def get_report(
+        self, request_id: UUID, since: int = 0, include_report: bool = True
+    ) -> RiskAnalyzerStatusResponse | None:
+        """Status of a workflow with its logs starting at the `since` sequence number and,
+        if `include_report` is set and the workflow is completed, the report."""
+        with self._session() as session:
+            workflow_status = session.exec(_select_workflow_status(request_id)).first()
+            if workflow_status is None:
+                return None
+            logs = list(session.exec(_select_logs(request_id, since)).all())
+            report = self._load_report(session, request_id) if include_report else None
+        return _to_status_response(workflow_status, logs, report, since)
+
+    @timed_db_operation
+    def get_report_version(self, request_id: UUID) -> datetime | None:
+        """Creation time of a completed report, used to validate cached copies without
+        loading the report."""
+        with self._session() as session:
+            return session.exec(_select_report_version(request_id)).first()
+
+    def _load_report(
+        self, session: Session, request_id: UUID, include_content: bool = True
+    ) -> RiskAnalysisResponse | None:
+        sql_report = session.exec(_select_workflow_report(request_id)).first()
+        if sql_report is None:
+            return None
+        chunks = None
+        if include_content and sql_report.content_size is not None:
+            chunks = (
+                _to_chunks(session.exec(_select_chunks(request_id)))
+                if sql_report.content_size
+                else []
+            )
+        return sql_report.to_risk_analyzer_response(chunks)
+
+    @timed_db_operation
+    def get_analysis_report(
+        self, request_id: UUID, include_content: bool = True
+    ) -> RiskAnalysisResponse | None:
+        """Report of a completed workflow. Without `include_content` the evidence is not
+        loaded and the content of the report is not set."""
+        with self._session() as session:
+            return self._load_report(session, request_id, include_content)
+
+    @timed_db_operation
+    def get_expired_workflows(
+        self, status: WorkflowStatus, before: datetime, limit: int = 100
+    ) -> list[UUID]:
+        """Request IDs of the workflows in `status` last updated before `before`, oldest
+        first."""
+        with self._session() as session:
+            return list(
+                session.exec(
+                    select(SQLWorkflowStatus.id)
+                    .where(
+                        col(SQLWorkflowStatus.status) == status,
+                        col(SQLWorkflowStatus.last_updated) < before,
+                    )
+                    .order_by(col(SQLWorkflowStatus.last_updated))
+                    .limit(limit)
+                ).all()
+            )
+
+    @timed_db_operation
+    def delete_expired_workflows(
+        self, request_ids: list[UUID], status: WorkflowStatus, before: datetime
+    ) -> list[UUID]:
+        """Delete the workflows, with their job, logs and report, that are still in
+        `status` and were last updated before `before`, so a workflow resumed in the
+        meantime is kept. Returns the request IDs of the deleted workflows."""
+        with self._session() as session:
+            expired = list(
+                session.exec(
+                    select(SQLWorkflowStatus.id).where(
+                        col(SQLWorkflowStatus.id).in_(request_ids),
+                        col(SQLWorkflowStatus.status) == status,
+                        col(SQLWorkflowStatus.last_updated) < before,
+                    )
+                ).all()
+            )
+            if not expired:
+                return []
+            for table, column in (
+                (SQLWorkflowLog, SQLWorkflowLog.request_id),
+                (SQLReportChunk, SQLReportChunk.report_id),
+                (SQLReportScore, SQLReportScore.report_id),
+                (SQLRiskAnalyzerReport, SQLRiskAnalyzerReport.id),
+                (SQLJob, SQLJob.id),
+                (SQLWorkflowStatus, SQLWorkflowStatus.id),
+            ):
+                session.exec(delete(table).where(col(column).in_(expired)))
+            session.commit()
+
+        with self._log_seq_lock:
+            for request_id in expired:
+                self._next_log_seq.pop(request_id, None)
+        return expired
+
+    @timed_db_operation
+    def delete_expired_entities(self) -> int:
+        """Delete the expired entries of the persistent entity cache, returns how many."""
+        with self._session() as session:
+            result = session.exec(
+                delete(SQLCachedEntity).where(
+                    col(SQLCachedEntity.expires_at) <= datetime.now()
+                )
+            )
+            session.commit()
+            return result.rowcount
+
+    @timed_db_operation
+    def delete_orphaned_batches(
+        self, after: UUID | None = None, limit: int = 100
+    ) -> tuple[int, UUID | None]:
+        """Delete the batches whose analyses were all deleted, among the `limit` batches
+        that follow `after` by ID. Returns how many were deleted and the ID to continue
+        from, None once every batch was checked."""
+        with self._session() as session:
+            query = select(SQLBatch.id, SQLBatch.request_ids)
+            if after is not None:
+                query = query.where(col(SQLBatch.id) > after)
+            batches = session.exec(query.order_by(col(SQLBatch.id)).limit(limit)).all()
+            request_ids = {UUID(request_id) for _, ids in batches for request_id in ids}
+            existing = {
+                str(request_id)
+                for request_id in session.exec(
+                    select(SQLWorkflowStatus.id).where(
+                        col(SQLWorkflowStatus.id).in_(request_ids)
+                    )
+                )
+            }
+            orphaned = [
+                batch_id for batch_id, ids in batches if existing.isdisjoint(ids)
+            ]
+            if orphaned:
+                session.exec(delete(SQLBatch).where(col(SQLBatch.id).in_(orphaned)))
+                session.commit()
+        next_after = batches[-1][0] if len(batches) == limit else None
+        return len(orphaned), next_after
+
+    @timed_db_operation
+    def delete_unreferenced_taxonomies(self, before: datetime) -> int:
+        """Delete the taxonomies stored before `before` that no report references, once
+        the reports generated with them were deleted. Returns how many."""
+        with self._session() as session:
+            result = session.exec(
+                delete(SQLTaxonomy).where(
+                    col(SQLTaxonomy.created_at) < before,
+                    ~select(SQLRiskAnalyzerReport.id)
+                    .where(col(SQLRiskAnalyzerReport.taxonomy_id) == SQLTaxonomy.id)
+                    .exists(),
+                )
+            )
+            session.commit()
+            return result.rowcount
+
+
+class _BufferedResult:
+    def __init__(self, rows: list[Any]):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def all(self) -> list[Any]:
+        return self.rows
+
+    def first(self) -> Any:
+        return self.rows[0] if self.rows else None
+
+    def one(self) -> Any:
+        if len(self.rows) != 1:
+            raise NoResultFound() if not self.rows else MultipleResultsFound()
+        return self.rows[0]
+
+
+class _StreamedResult:
+    def __init__(self, result: Any):
+        self._partitions: Iterator[list[Any]] = result.partitions()
+
+    def _next_partition(self) -> list[Any]:
+        return next(self._partitions, [])
+
+    async def partitions(self) -> AsyncIterator[list[Any]]:
+        while partition := await asyncio.to_thread(self._next_partition):
+            yield partition
+
+
+class ThreadedSession:
+    """The subset of `AsyncSession` used by `AsyncStorageManager`, over a sync session
+    whose calls run in a worker thread. Used for databases without an async driver."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def __aenter__(self) -> "ThreadedSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.to_thread(self.session.close)
+
+    def add(self, instance: Any):
+        self.session.add(instance)
+
+    async def commit(self):
+        await asyncio.to_thread(self.session.commit)
+
+    async def exec(self, statement: Any) -> Any:
+        def run():
+            result = self.session.exec(statement)
+            # Rows are fetched in the worker thread too
+            return (
+                _BufferedResult(result.all())
+                if isinstance(statement, Select)
+                else result
+            )
+
+        return await asyncio.to_thread(run)
+
+    async def stream(self, statement: Any) -> _StreamedResult:
+        return _StreamedResult(await asyncio.to_thread(self.session.exec, statement))
+
+
+class AsyncStorageManager:
+    """Async access to the workflow statuses and reports for the API endpoints, so waiting
+    for the database does not hold a worker thread. Workflows keep writing their progress
+    with the sync `StorageManager`, as they run on worker threads or processes.
+
+    With a sync `engine`, for databases without an async driver, the queries run in a
+    worker thread instead."""
+
+    def __init__(self, engine: AsyncEngine | Engine):
+        self.engine = engine
+
+    def _session(self) -> AsyncSession | ThreadedSession:
+        if isinstance(self.engine, Engine):
+            return ThreadedSession(Session(self.engine, expire_on_commit=False))
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    @timed_db_operation
+    async def enqueue_job(self, request_id: UUID, request: RiskAnalysisRequest):
+        """Persist a new job in the QUEUED state so it can be picked up by a worker, even
+        after a restart."""
+        async with self._session() as session:
+            session.add(_create_workflow_status(request_id, WorkflowStatus.QUEUED))
+            session.add(SQLJob.from_request(request_id, request))
+            await session.commit()
+
+    @timed_db_operation
+    async def enqueue_batch(
+        self,
+        batch_id: UUID,
+        jobs: list[tuple[UUID, RiskAnalysisRequest]],
+        request_ids: list[UUID],
+    ):
+        """Persist the new jobs of a batch in the QUEUED state and the batch with all its
+        request IDs, including the ones answered by existing jobs, in one transaction."""
+        async with self._session() as session:
+            for request_id, request in jobs:
+                session.add(_create_workflow_status(request_id, WorkflowStatus.QUEUED))
+                session.add(SQLJob.from_request(request_id, request))
+            session.add(
+                SQLBatch(
+                    id=batch_id,
+                    request_ids=[str(request_id) for request_id in request_ids],
+                )
+            )
+            await session.commit()
+
+    @timed_db_operation
+    async def get_batch_status(
+        self, batch_id: UUID
+    ) -> RiskAnalysisBatchStatusResponse | None:
+        async with self._session() as session:
+            batch = (
+                await session.exec(select(SQLBatch).where(SQLBatch.id == batch_id))
+            ).first()
+            if batch is None:
+                return None
+            rows = await session.exec(
+                select(SQLWorkflowStatus.id, SQLWorkflowStatus.status).where(
+                    col(SQLWorkflowStatus.id).in_(
+                        [UUID(request_id) for request_id in batch.request_ids]
+                    )
+                )
+            )
+            statuses = {
+                str(request_id): WorkflowStatus(status) for request_id, status in rows
+            }
+        return _to_batch_status_response(batch, statuses)
+
+    @timed_db_operation
+    async def get_job_request(self, request_id: UUID) -> RiskAnalysisRequest | None:
+        async with self._session() as session:
+            job = (
+                await session.exec(select(SQLJob).where(SQLJob.id == request_id))
+            ).first()
+            if job is None:
+                return None
+            return RiskAnalysisRequest(**job.request)
+
+    @timed_db_operation
+    async def requeue_failed_job(self, request_id: UUID) -> bool:
+        """Put a failed job back in the QUEUED state so it can be run again. False if the
+        job does not exist or did not fail."""
+        async with self._session() as session:
+            result = await session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    col(SQLWorkflowStatus.id) == request_id,
+                    col(SQLWorkflowStatus.status) == WorkflowStatus.FAILED,
+                    select(SQLJob.id).where(SQLJob.id == request_id).exists(),
+                )
+                .values(status=WorkflowStatus.QUEUED, last_updated=datetime.now())
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    @timed_db_operation
+    async def find_inflight_job(self, request_hash: str) -> UUID | None:
+        """Request ID of a queued or running job for an identical request, if any."""
+        async with self._session() as session:
+            return (await session.exec(_select_inflight_job(request_hash))).first()
+
+    @timed_db_operation
+    async def find_cached_report(
+        self, request_hash: str, max_age: timedelta
+    ) -> UUID | None:
+        """Request ID of the most recent report for an identical request created within
+        `max_age`, if any."""
+        async with self._session() as session:
+            return (
+                await session.exec(_select_cached_report(request_hash, max_age))
+            ).first()
+
+    @timed_db_operation
+    async def get_status(self, request_id: UUID) -> WorkflowStatus | None:
+        async with self._session() as session:
+            workflow_status = (
+                await session.exec(_select_workflow_status(request_id))
+            ).first()
+            if workflow_status is None:
+                return None
+            return workflow_status.status
 
-    def get_report(self, request_id: UUID) -> RiskAnalyzerStatusResponse | None:
-        with self.lock:
-            workflow_status = self._get_workflow_status(request_id)
+    @timed_db_operation
+    async def get_report(
+        self, request_id: UUID, since: int = 0, include_report: bool = True
+    ) -> RiskAnalyzerStatusResponse | None:
+        """Status of a workflow with its logs starting at the `since` sequence number and,
+        if `include_report` is set and the workflow is completed, the report."""
+        async with self._session() as session:
+            workflow_status = (
+                await session.exec(_select_workflow_status(request_id))
+            ).first()
             if workflow_status is None:
                 return None
-            sql_report = self._get_workflow_report(request_id)
-            if sql_report is None:
-                return RiskAnalyzerStatusResponse(
-                    request_id=str(request_id),
-                    last_updated=workflow_status.last_updated,
-                    status=workflow_status.status,
-                    logs=workflow_status.logs,
-                    report=None,
+            logs = list((await session.exec(_select_logs(request_id, since))).all())
+            report = (
+                await self._load_report(session, request_id) if include_report else None
+            )
+        return _to_status_response(workflow_status, logs, report, since)
+
+    @timed_db_operation
+    async def taxonomy_exists(self, taxonomy_id: UUID) -> bool:
+        async with self._session() as session:
+            return (
+                await session.exec(
+                    select(SQLTaxonomy.id).where(SQLTaxonomy.id == taxonomy_id)
                 )
+            ).first() is not None
 
-            return RiskAnalyzerStatusResponse(
-                request_id=str(request_id),
-                last_updated=workflow_status.last_updated,
-                status=workflow_status.status,
-                logs=workflow_status.logs,
-                report=RiskAnalysisResponse(**sql_report.screener_report),  # ty: ignore[missing-argument]
+    @timed_db_operation
+    async def get_report_version(self, request_id: UUID) -> datetime | None:
+        """Creation time of a completed report, used to validate cached copies without
+        loading the report."""
+        async with self._session() as session:
+            return (await session.exec(_select_report_version(request_id))).first()
+
+    async def _load_report(
+        self,
+        session: AsyncSession | ThreadedSession,
+        request_id: UUID,
+        include_content: bool = True,
+    ) -> RiskAnalysisResponse | None:
+        sql_report = (await session.exec(_select_workflow_report(request_id))).first()
+        if sql_report is None:
+            return None
+        chunks = None
+        if include_content and sql_report.content_size is not None:
+            chunks = (
+                _to_chunks(await session.exec(_select_chunks(request_id)))
+                if sql_report.content_size
+                else []
             )
+        return sql_report.to_risk_analyzer_response(chunks)
+
+    @timed_db_operation
+    async def get_analysis_report(
+        self, request_id: UUID, include_content: bool = True
+    ) -> RiskAnalysisResponse | None:
+        """Report of a completed workflow. Without `include_content` the evidence is not
+        loaded and the content of the report is not set."""
+        async with self._session() as session:
+            return await self._load_report(session, request_id, include_content)
+
+    async def stream_report_content(
+        self, request_id: UUID, batch_size: int = 500
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Evidence of a report in batches of up to `batch_size` chunks, as dictionaries with
+        the fields of `LabeledChunk`. Rows are fetched from the database as they are
+        consumed, so the whole evidence is never held in memory."""
+        async with self._session() as session:
+            result = await session.stream(
+                _select_chunks(request_id).execution_options(yield_per=batch_size)
+            )
+            async for rows in result.partitions():
+                yield [dict(row._mapping) for row in rows]
+
+    @timed_db_operation
+    async def get_report_content(
+        self,
+        request_id: UUID,
+        filters: ReportContentFilters,
+        cursor: int | None = None,
+        limit: int = 50,
+    ) -> ReportContentPage | None:
+        """A page of the evidence of a report matching the filters, starting after the
+        `cursor` returned with the previous page. None if the report does not exist."""
+        async with self._session() as session:
+            if (await session.exec(_select_report_version(request_id))).first() is None:
+                return None
+            conditions = _content_conditions(request_id, filters)
+            total = (
+                await session.exec(
+                    select(func.count()).select_from(SQLReportChunk).where(*conditions)
+                )
+            ).one()
+            rows = await session.exec(_select_content_page(conditions, cursor, limit))
+            return _to_content_page(rows, total, limit)
+
+    @timed_db_operation
+    async def get_report_content_facets(
+        self, request_id: UUID
+    ) -> ReportContentFacets | None:
+        """Number of evidence chunks of a report and the distinct values of the columns it
+        can be filtered by. None if the report does not exist."""
+        async with self._session() as session:
+            report = (
+                await session.exec(
+                    select(
+                        SQLRiskAnalyzerReport.id, SQLRiskAnalyzerReport.content_size
+                    ).where(SQLRiskAnalyzerReport.id == request_id)
+                )
+            ).first()
+            if report is None:
+                return None
+
+            facets = {}
+            for name, column in (
+                ("companies", SQLReportChunk.company),
+                ("tickers", SQLReportChunk.ticker),
+                ("risk_factors", SQLReportChunk.risk_factor),
+                ("risk_channels", SQLReportChunk.risk_channel),
+                ("sub_scenarios", SQLReportChunk.sub_scenario),
+                ("time_periods", SQLReportChunk.time_period),
+            ):
+                facets[name] = list(
+                    (
+                        await session.exec(
+                            select(column)
+                            .where(SQLReportChunk.report_id == request_id)
+                            .distinct()
+                            .order_by(column)
+                        )
+                    ).all()
+                )
+            return ReportContentFacets(total=report.content_size or 0, **facets)
+
+    @timed_db_operation
+    async def list_reports(
+        self, filters: ReportListFilters, cursor: UUID | None = None, limit: int = 50
+    ) -> ReportSummaryPage:
+        """A page of the summaries of the analyses matching the filters, most recent
+        first, starting after the `cursor` returned with the previous page."""
+        async with self._session() as session:
+            rows = await session.exec(
+                _select_report_list_page(
+                    _report_list_conditions(filters), cursor, limit
+                )
+            )
+            return _to_report_list_page(rows, limit)
+
+    @timed_db_operation
+    async def get_scores(
+        self, filters: ScoreFilters, cursor: int | None = None, limit: int = 100
+    ) -> ReportScorePage:
+        """A page of the scores of all the reports matching the filters, most recent
+        reports first, starting after the `cursor` returned with the previous page."""
+        async with self._session() as session:
+            rows = await session.exec(
+                _select_score_page(_score_conditions(filters), cursor, limit)
+            )
+            return _to_score_page(rows, limit)
+
+    @timed_db_operation
+    async def get_score_aggregates(
+        self,
+        filters: ScoreFilters,
+        group_by: ScoreGroupBy,
+        interval: ScoreInterval = ScoreInterval.ALL,
+    ) -> list[ScoreAggregate]:
+        """Number, mean, minimum and maximum of the scores matching the filters, by
+        company, sector or theme and by period."""
+        async with self._session() as session:
+            rows = await session.exec(_select_daily_scores(filters, group_by))
+            return _to_score_aggregates(rows, interval)
@@ -1,4 +1,8 @@
+import gzip
+import hashlib
+from datetime import datetime
 from typing import Type
+from uuid import UUID
 
 from pydantic import BaseModel
 
@@ -24,3 +28,38 @@ def get_example_values_from_schema(schema_model: Type[BaseModel]) -> dict:
         else:
             example_values[field_name] = field.default
     return example_values
+
+
+def get_report_etag(request_id: UUID, version: datetime) -> str:
+    """Weak ETag of a stored report, reports only change when they are stored again. It is
+    weak because the same report is sent with different content encodings."""
+    return f'W/"{request_id.hex}-{int(version.timestamp() * 1_000_000)}"'
+
+
+def get_content_etag(content: str | bytes) -> str:
+    """Weak ETag of a response body, from the hash of its content. It is weak because the
+    body is sent with different content encodings."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return f'W/"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Check an ETag against the value of an If-None-Match header, which may hold several
+    comma separated (and possibly weak) ETags or `*`."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def compress_json(json_data: str) -> bytes:
+    """Compress a JSON document for storage. The gzip header has no timestamp, so the same
+    document is always stored as the same bytes."""
+    return gzip.compress(json_data.encode("utf-8"), compresslevel=6, mtime=0)
+
+
+def decompress_json(data: bytes) -> bytes:
+    """Decompress a JSON document stored with `compress_json`, the result can be passed to
+    `model_validate_json`."""
+    return gzip.decompress(data)
@@ -0,0 +1,229 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from enum import StrEnum
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pandas as pd
+from bigdata_client import Bigdata
+from bigdata_research_tools.utils.observer import Observable, Observer
+from bigdata_research_tools.workflows.risk_analyzer import RiskAnalyzer
+
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+
+
+class BackendMode(StrEnum):
+    LIVE = "live"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class RecordingNotFoundError(LookupError):
+    """Raised when a replayed call was not recorded."""
+
+    def __init__(self, recording: str, name: str):
+        super().__init__(
+            f"No recorded '{name}' in recording {recording}. Record the analysis first, with the same request and settings."
+        )
+
+
+def frame_key(df: pd.DataFrame) -> str:
+    """Short hash of the content of a dataframe, to find the recorded output of a call
+    made with it."""
+    if df.empty:
+        return "empty"
+    hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return hashlib.sha256(hashes.values.tobytes()).hexdigest()[:16]
+
+
+class RecordedCalls:
+    """Recorded output of the calls of a recording, stored by name. With `live`, calls
+    are made and their output saved, without it the saved output is returned after
+    `latency_seconds`."""
+
+    def __init__(
+        self,
+        store: CheckpointStore,
+        recording: str,
+        live: bool,
+        latency_seconds: float = 0.0,
+    ):
+        self.store = store
+        self.recording = recording
+        self.live = live
+        self.latency_seconds = latency_seconds
+
+    def call(self, name: str, fn: Callable[[], Any]) -> Any:
+        if self.live:
+            value = fn()
+            self.store.save(self.recording, name, value)
+            return value
+        return self.replay(name)
+
+    def replay(self, name: str) -> Any:
+        """Recorded output of a call, without making it."""
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        value = self.store.load(self.recording, name)
+        if value is None:
+            raise RecordingNotFoundError(self.recording, name)
+        return value
+
+
+class RecordedBigdata:
+    """Stand-in for the Bigdata client with the calls used to resolve the companies of an
+    analysis. With a live `bigdata` client the watchlists and entities are recorded,
+    without it they are replayed. Shared by all the recordings."""
+
+    def __init__(
+        self,
+        store: CheckpointStore,
+        bigdata: Bigdata | None = None,
+        latency_seconds: float = 0.0,
+    ):
+        self.bigdata = bigdata
+        self.latency_seconds = latency_seconds
+        self.watchlist_calls = RecordedCalls(
+            store, "watchlists", bigdata is not None, latency_seconds
+        )
+        # Entities are recorded one by one but fetched in a single call
+        self.entity_calls = RecordedCalls(store, "entities", bigdata is not None)
+        self.watchlists = SimpleNamespace(get=self.get_watchlist)
+        self.knowledge_graph = SimpleNamespace(get_entities=self.get_entities)
+
+    def get_watchlist(self, watchlist_id: str):
+        bigdata = self.bigdata
+        if bigdata is None:
+            items = self.watchlist_calls.replay(watchlist_id)
+        else:
+            items = self.watchlist_calls.call(
+                watchlist_id, lambda: list(bigdata.watchlists.get(watchlist_id).items)
+            )
+        return SimpleNamespace(items=items)
+
+    def get_entities(self, entity_ids: list[str]) -> list:
+        if self.bigdata is not None:
+            entities = self.bigdata.knowledge_graph.get_entities(entity_ids)
+            for entity_id, entity in zip(entity_ids, entities):
+                self.entity_calls.call(entity_id, lambda: entity)
+            return entities
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        return [self.entity_calls.replay(entity_id) for entity_id in entity_ids]
+
+
+class RecordedAnalyzer(Observable):
+    """Stand-in for `RiskAnalyzer` with the stages run by the workflows. With a live
+    `analyzer` the output of every stage is recorded, without it the recorded output is
+    replayed. Calls are found by the content of their input, so a replayed analysis must
+    split the work the same way as the recorded one (same `LABELING_BATCH_SIZE` and
+    `parallelism`)."""
+
+    def __init__(
+        self,
+        calls: RecordedCalls,
+        companies: list,
+        analyzer: RiskAnalyzer | None = None,
+    ):
+        super().__init__()
+        self.calls = calls
+        self.companies = companies
+        self.analyzer = analyzer
+
+    def register_observer(self, observer: Observer):
+        super().register_observer(observer)
+        if self.analyzer is not None:
+            self.analyzer.register_observer(observer)
+
+    def _call(self, name: str, fn: Callable[[RiskAnalyzer], Any]) -> Any:
+        """Output of a stage, run on the live analyzer when recording."""
+        analyzer = self.analyzer
+        if analyzer is None:
+            return self.calls.replay(name)
+        return self.calls.call(name, lambda: fn(analyzer))
+
+    def create_taxonomy(self):
+        return self._call("taxonomy", lambda analyzer: analyzer.create_taxonomy())
+
+    def retrieve_results(self, sentences, frequency, document_limit, batch_size):
+        companies = ",".join(sorted(company.id for company in self.companies))
+        companies_key = hashlib.sha256(companies.encode("utf-8")).hexdigest()[:16]
+        return self._call(
+            f"search-{companies_key}",
+            lambda analyzer: analyzer.retrieve_results(
+                sentences, frequency, document_limit, batch_size
+            ),
+        )
+
+    def label_search_results(
+        self, df_sentences, terminal_labels, risk_tree, additional_prompt_fields=None
+    ):
+        return self._call(
+            f"labels-{frame_key(df_sentences)}",
+            lambda analyzer: analyzer.label_search_results(
+                df_sentences=df_sentences,
+                terminal_labels=terminal_labels,
+                risk_tree=risk_tree,
+                additional_prompt_fields=additional_prompt_fields,
+            ),
+        )
+
+    def generate_results(self, df_labeled):
+        return self._call(
+            f"results-{frame_key(df_labeled)}",
+            lambda analyzer: analyzer.generate_results(df_labeled),
+        )
+
+
+# Analyzer the workflows run on, live or recorded
+Analyzer = RiskAnalyzer | RecordedAnalyzer
+
+
+@dataclass
+class Backend:
+    """Where the Bigdata.com and LLM calls of the analyses go: the live services, the live
+    services with every call recorded in `recordings_dir`, or the recorded calls replayed
+    from `recordings_dir` without network access, each after `latency_seconds`.
+
+    Analyses are recorded by request hash, identical requests replay the same recording.
+    """
+
+    mode: BackendMode = BackendMode.LIVE
+    recordings_dir: str | None = None
+    latency_seconds: float = 0.0
+
+    def __post_init__(self):
+        self.mode = BackendMode(self.mode)
+        if self.mode != BackendMode.LIVE and not self.recordings_dir:
+            raise ValueError(f"A recordings directory is needed to {self.mode}")
+
+    @property
+    def store(self) -> CheckpointStore:
+        if not self.recordings_dir:
+            raise ValueError(f"A recordings directory is needed to {self.mode}")
+        return CheckpointStore(self.recordings_dir)
+
+    def bigdata_client(self, api_key: str) -> Bigdata | RecordedBigdata:
+        if self.mode == BackendMode.LIVE:
+            return Bigdata(api_key=api_key)
+        if self.mode == BackendMode.RECORD:
+            return RecordedBigdata(self.store, bigdata=Bigdata(api_key=api_key))
+        return RecordedBigdata(self.store, latency_seconds=self.latency_seconds)
+
+    def analyzer(
+        self,
+        recording: str,
+        companies: list,
+        create: Callable[[], RiskAnalyzer],
+    ) -> Analyzer:
+        if self.mode == BackendMode.LIVE:
+            return create()
+        live = self.mode == BackendMode.RECORD
+        calls = RecordedCalls(self.store, recording, live, self.latency_seconds)
+        return RecordedAnalyzer(calls, companies, create() if live else None)
+
+    def record_request(self, recording: str, request: dict):
+        """Save the request of a recording, so it can be submitted again to replay it."""
+        if self.mode == BackendMode.RECORD:
+            self.store.save(recording, "request", request)
@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+import numpy as np
+import pandas as pd
+from bigdata_client.models import entities
+from bigdata_research_tools.tree import SemanticTree
+from pydantic import BaseModel
+
+
+def _entity_class(name: str) -> type[BaseModel] | None:
+    """Class of a Bigdata entity (company, place, etc.) by name."""
+    entity_class = getattr(entities, name, None)
+    if isinstance(entity_class, type) and issubclass(entity_class, BaseModel):
+        return entity_class
+    return None
+
+
+def _encode(value: Any) -> Any:
+    """JSON-compatible form of a checkpointed value. Only the types of the workflow
+    outputs are supported, each tagged with its type so it can be rebuilt."""
+    if value is None or isinstance(value, bool | int | float | str):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NaT:
+        return {"__type__": "nat"}
+    if value is pd.NA:
+        return {"__type__": "na"}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {"__type__": "tuple", "items": [_encode(item) for item in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError("Only dicts with string keys can be checkpointed")
+        return {
+            "__type__": "dict",
+            "items": {key: _encode(item) for key, item in value.items()},
+        }
+    if isinstance(value, UUID):
+        return {"__type__": "uuid", "value": str(value)}
+    if isinstance(value, datetime):
+        return {"__type__": "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {"__type__": "date", "value": value.isoformat()}
+    if isinstance(value, pd.DataFrame):
+        return {
+            "__type__": "frame",
+            "columns": [_encode(column) for column in value.columns],
+            "dtypes": [str(dtype) for dtype in value.dtypes],
+            "index": _encode(value.index.tolist()),
+            "index_dtype": str(value.index.dtype),
+            "data": [_encode(value.iloc[:, i].tolist()) for i in range(value.shape[1])],
+        }
+    if isinstance(value, SemanticTree):
+        return {"__type__": "tree", "value": value._to_dict()}
+    entity_class = type(value)
+    if _entity_class(entity_class.__name__) is entity_class:
+        return {
+            "__type__": "entity",
+            "class": entity_class.__name__,
+            "value": value.model_dump(mode="json"),
+        }
+    raise TypeError(f"Values of type {entity_class.__name__} can not be checkpointed")
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    match value["__type__"]:
+        case "nat":
+            return pd.NaT
+        case "na":
+            return pd.NA
+        case "tuple":
+            return tuple(_decode(item) for item in value["items"])
+        case "dict":
+            return {key: _decode(item) for key, item in value["items"].items()}
+        case "uuid":
+            return UUID(value["value"])
+        case "datetime":
+            return pd.Timestamp(value["value"])
+        case "date":
+            return date.fromisoformat(value["value"])
+        case "frame":
+            index = pd.Index(_decode(value["index"]), dtype=value["index_dtype"])
+            df = pd.DataFrame(
+                {
+                    i: pd.Series(_decode(data), index=index, dtype=dtype)
+                    for i, (data, dtype) in enumerate(
+                        zip(value["data"], value["dtypes"])
+                    )
+                },
+                index=index,
+            )
+            df.columns = pd.Index(_decode(value["columns"]), dtype=object)
+            return df
+        case "tree":
+            return SemanticTree.from_dict(value["value"])
+        case "entity":
+            entity_class = _entity_class(value["class"])
+            if entity_class is None:
+                raise ValueError(f"Unknown entity type {value['class']}")
+            return entity_class(**value["value"])
+    raise ValueError(f"Unknown checkpoint type {value['__type__']}")
+
+
+class CheckpointStore:
+    """Intermediate results of the workflows, stored on the local disk by request ID, so a
+    failed workflow can be resumed from the last completed stage.
+
+    Each checkpoint is a JSON file in the directory of its workflow, with the dataframes,
+    taxonomy trees and entities of the workflow outputs tagged with their type, so loading
+    a checkpoint never runs code. Files are written to a temporary name first and then
+    renamed, so an interrupted write never leaves a partial checkpoint behind.
+    """
+
+    suffix = ".json"
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    def _workflow_dir(self, request_id: UUID | str) -> Path:
+        return self.directory / str(request_id)
+
+    def _path(self, request_id: UUID | str, name: str) -> Path:
+        return self._workflow_dir(request_id) / f"{name}{self.suffix}"
+
+    def save(self, request_id: UUID | str, name: str, value: Any):
+        path = self._path(request_id, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_encode(value), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, request_id: UUID | str, name: str) -> Any | None:
+        """Value of a checkpoint, None if it was not saved."""
+        path = self._path(request_id, name)
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return _decode(json.load(f))
+
+    def names(self, request_id: UUID | str) -> list[str]:
+        """Names of the checkpoints saved for a workflow, sorted."""
+        workflow_dir = self._workflow_dir(request_id)
+        if not workflow_dir.exists():
+            return []
+        return sorted(path.stem for path in workflow_dir.glob(f"*{self.suffix}"))
+
+    def delete(self, request_id: UUID | str):
+        shutil.rmtree(self._workflow_dir(request_id), ignore_errors=True)
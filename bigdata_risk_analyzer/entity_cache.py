@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from enum import StrEnum
+from threading import Lock
+from typing import Any, Callable
+
+from bigdata_client.models.entities import Company
+from sqlalchemy import Engine
+from sqlmodel import Session, col, delete, select
+
+from bigdata_risk_analyzer.api.sql_models import SQLCachedEntity
+
+
+class EntityKind(StrEnum):
+    COMPANY = "company"
+    WATCHLIST = "watchlist"
+
+
+class EntityCache:
+    """Cache of resolved companies, by entity ID, and of watchlist items, by watchlist ID.
+
+    Companies expire after `ttl_seconds` and watchlists, which users can edit, after the
+    shorter `watchlist_ttl_seconds` (0 to always fetch them). The least recently used
+    entries are evicted once there are more than `max_size` entries in memory. With an `engine` entries are also stored in
+    the database, so they survive restarts and are shared with process workers. IDs that do
+    not resolve to a company are cached too (as None), so they are not fetched again.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 86400,
+        watchlist_ttl_seconds: int = 300,
+        max_size: int = 10000,
+        engine: Engine | None = None,
+    ):
+        self.ttls = {
+            EntityKind.COMPANY: timedelta(seconds=ttl_seconds),
+            EntityKind.WATCHLIST: timedelta(seconds=watchlist_ttl_seconds),
+        }
+        self.max_size = max_size
+        self.engine = engine
+        self._entries: OrderedDict[tuple[EntityKind, str], tuple[datetime, Any]] = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+        self.hits = {EntityKind.COMPANY: 0, EntityKind.WATCHLIST: 0}
+        self.misses = {EntityKind.COMPANY: 0, EntityKind.WATCHLIST: 0}
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                **{f"{kind}_hits": count for kind, count in self.hits.items()},
+                **{f"{kind}_misses": count for kind, count in self.misses.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.engine is not None:
+            with Session(self.engine) as session:
+                session.exec(delete(SQLCachedEntity))
+                session.commit()
+
+    def _get_from_memory(self, kind: EntityKind, ids: list[str]) -> dict[str, Any]:
+        now = datetime.now()
+        found = {}
+        with self._lock:
+            for entity_id in ids:
+                entry = self._entries.get((kind, entity_id))
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[(kind, entity_id)]
+                    continue
+                self._entries.move_to_end((kind, entity_id))
+                found[entity_id] = value
+        return found
+
+    def _put_in_memory(
+        self, kind: EntityKind, values: dict[str, Any], expires_at: datetime
+    ):
+        with self._lock:
+            for entity_id, value in values.items():
+                self._entries[(kind, entity_id)] = (expires_at, value)
+                self._entries.move_to_end((kind, entity_id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_from_db(
+        self, kind: EntityKind, ids: list[str]
+    ) -> dict[str, tuple[datetime, Any]]:
+        if self.engine is None or not ids:
+            return {}
+        now = datetime.now()
+        with Session(self.engine) as session:
+            # Entries stored with a longer TTL than the current one are fetched again
+            rows = session.exec(
+                select(SQLCachedEntity).where(
+                    SQLCachedEntity.kind == kind,
+                    col(SQLCachedEntity.entity_id).in_(ids),
+                    SQLCachedEntity.expires_at > now,
+                    SQLCachedEntity.expires_at <= now + self.ttls[kind],
+                )
+            ).all()
+            return {row.entity_id: (row.expires_at, row.data) for row in rows}
+
+    def _put_in_db(
+        self, kind: EntityKind, values: dict[str, Any], expires_at: datetime
+    ):
+        if self.engine is None or not values:
+            return
+        with Session(self.engine) as session:
+            for entity_id, data in values.items():
+                session.merge(
+                    SQLCachedEntity(
+                        kind=kind, entity_id=entity_id, data=data, expires_at=expires_at
+                    )
+                )
+            session.commit()
+
+    def _get(
+        self,
+        kind: EntityKind,
+        ids: list[str],
+        fetch: Callable[[list[str]], dict[str, Any]],
+        to_data: Callable[[Any], Any],
+        from_data: Callable[[Any], Any],
+    ) -> dict[str, Any]:
+        """Look up the IDs in memory, then in the database, and fetch the remaining ones
+        in a single call."""
+        found = self._get_from_memory(kind, ids)
+        missing = [entity_id for entity_id in ids if entity_id not in found]
+
+        stored = self._get_from_db(kind, missing)
+        for entity_id, (expires_at, data) in stored.items():
+            value = from_data(data)
+            self._put_in_memory(kind, {entity_id: value}, expires_at)
+            found[entity_id] = value
+        missing = [entity_id for entity_id in missing if entity_id not in stored]
+
+        with self._lock:
+            self.hits[kind] += len(ids) - len(missing)
+            self.misses[kind] += len(missing)
+
+        if missing:
+            fetched = fetch(missing)
+            expires_at = datetime.now() + self.ttls[kind]
+            self._put_in_memory(kind, fetched, expires_at)
+            self._put_in_db(
+                kind,
+                {entity_id: to_data(value) for entity_id, value in fetched.items()},
+                expires_at,
+            )
+            found.update(fetched)
+        return found
+
+    def get_companies(
+        self,
+        ids: list[str],
+        fetch: Callable[[list[str]], dict[str, Company | None]],
+    ) -> dict[str, Company | None]:
+        """Companies by entity ID, None for IDs that are not companies. `fetch` is called
+        with the IDs that are not cached and must return a value for each of them."""
+        return self._get(
+            EntityKind.COMPANY,
+            list(dict.fromkeys(ids)),
+            fetch,
+            to_data=lambda company: (
+                company.model_dump(mode="json") if company is not None else None
+            ),
+            from_data=lambda data: Company(**data) if data is not None else None,
+        )
+
+    def get_watchlist_items(
+        self, watchlist_id: str, fetch: Callable[[str], list[str]]
+    ) -> list[str]:
+        """Entity IDs of a watchlist, `fetch` is called if the watchlist is not cached."""
+        if not self.ttls[EntityKind.WATCHLIST]:
+            return fetch(watchlist_id)
+        return self._get(
+            EntityKind.WATCHLIST,
+            [watchlist_id],
+            lambda ids: {ids[0]: fetch(ids[0])},
+            to_data=list,
+            from_data=list,
+        )[watchlist_id]
@@ -0,0 +1,167 @@
+import os
+import time
+from contextlib import contextmanager
+from enum import StrEnum
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Workflow stages take from milliseconds (build_response) to tens of minutes (labeling)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+WORKFLOW_STAGE_SECONDS = Histogram(
+    "risk_analyzer_workflow_stage_seconds",
+    "Duration of the stages of the risk analysis workflows",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "risk_analyzer_queue_wait_seconds",
+    "Time the analyses wait in the job queue before a worker picks them up",
+    buckets=STAGE_BUCKETS,
+)
+JOBS_IN_PROGRESS = Gauge(
+    "risk_analyzer_jobs_in_progress",
+    "Analyses being run by the job workers",
+    multiprocess_mode="livesum",
+)
+JOBS_QUEUED = Gauge(
+    "risk_analyzer_jobs_queued",
+    "Analyses waiting in the job queue",
+    multiprocess_mode="livesum",
+)
+DB_OPERATION_SECONDS = Histogram(
+    "risk_analyzer_db_operation_seconds",
+    "Duration of the storage manager operations",
+    ["operation"],
+)
+DB_SIZE_BYTES = Gauge(
+    "risk_analyzer_db_size_bytes",
+    "Size of the database, measured by the database maintenance",
+    multiprocess_mode="mostrecent",
+)
+PRUNED_WORKFLOWS = Counter(
+    "risk_analyzer_pruned_workflows",
+    "Analyses deleted by the database maintenance once past their retention",
+    ["status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "risk_analyzer_http_request_seconds",
+    "Duration of the HTTP requests until the response is sent, by endpoint",
+    ["method", "endpoint", "status"],
+)
+
+
+class WorkflowStage(StrEnum):
+    COMPANY_RESOLUTION = "company_resolution"
+    TAXONOMY = "taxonomy"
+    SEARCH = "search"
+    LABELING = "labeling"
+    SCORING = "scoring"
+    BUILD_RESPONSE = "build_response"
+    PERSIST = "persist"
+
+
+class StageTimer:
+    """Time spent in each stage of a workflow, in seconds. Stages that run several times
+    (labeling batches, shards of the companies) add up."""
+
+    def __init__(self):
+        self.timings: dict[WorkflowStage, float] = {}
+
+    @contextmanager
+    def stage(self, stage: WorkflowStage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: WorkflowStage, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def rounded(self) -> dict[str, float]:
+        return {
+            str(stage): round(seconds, 3) for stage, seconds in self.timings.items()
+        }
+
+    def observe(self):
+        """Add the timings of the workflow to the stage histograms."""
+        for stage, seconds in self.timings.items():
+            WORKFLOW_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def timed_db_operation(fn):
+    """Observe the duration of a storage manager method, sync or async, in
+    `DB_OPERATION_SECONDS` labeled with its name."""
+    histogram = DB_OPERATION_SECONDS.labels(operation=fn.__name__.lstrip("_"))
+
+    if iscoroutinefunction(fn):
+
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with histogram.time():
+                return await fn(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with histogram.time():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class RequestMetricsMiddleware:
+    """Observe the duration of every HTTP request in `HTTP_REQUEST_SECONDS`, until the
+    last byte of the response is sent so streamed responses are fully accounted for.
+    Requests are labeled with the path template of their route, not the requested path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router sets the matched route in the scope, mounts only their root path
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or scope.get("root_path") or "other"
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"], endpoint=endpoint, status=str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Metrics in the Prometheus text format, with its content type. With
+    `PROMETHEUS_MULTIPROC_DIR` set, the metrics of all the processes sharing the directory
+    (process job workers and shards) are aggregated."""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
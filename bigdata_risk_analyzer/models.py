@@ -1,3 +1,5 @@
+from uuid import UUID
+
 from pydantic import BaseModel, RootModel
 
 
@@ -52,3 +54,7 @@ class RiskAnalysisResponse(BaseModel):
     risk_scoring: RiskScoring
     risk_taxonomy: RiskTaxonomy
     content: LabeledContent | None = None
+    # Pass it as `taxonomy_id` in a new request to reuse the same taxonomy
+    taxonomy_id: UUID | None = None
+    # Seconds spent in each stage of the workflow that generated the report
+    stage_timings: dict[str, float] | None = None
@@ -1,23 +1,33 @@
-import math
-from datetime import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 from importlib.metadata import version
 from uuid import UUID
 
+import numpy as np
 import pandas as pd
 from bigdata_client import Bigdata
 from bigdata_client.models.entities import Company
 from bigdata_research_tools.tree import SemanticTree
 from bigdata_research_tools.utils.observer import OberserverNotification, Observer
 from bigdata_research_tools.workflows.risk_analyzer import RiskAnalyzer
+from bigdata_research_tools.workflows.utils import get_scored_df
 
-from bigdata_risk_analyzer.api.models import RiskAnalysisRequest, WorkflowStatus
+from bigdata_risk_analyzer import logger
+from bigdata_risk_analyzer.api.models import (
+    LogLevel,
+    RiskAnalysisRequest,
+    WorkflowStatus,
+)
 from bigdata_risk_analyzer.api.storage import StorageManager
+from bigdata_risk_analyzer.backends import Analyzer, Backend, RecordedBigdata
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+from bigdata_risk_analyzer.entity_cache import EntityCache
+from bigdata_risk_analyzer.metrics import StageTimer, WorkflowStage
 from bigdata_risk_analyzer.models import (
-    CompanyScoring,
-    LabeledChunk,
     LabeledContent,
     RiskAnalysisResponse,
-    RiskScore,
     RiskScoring,
     RiskTaxonomy,
 )
@@ -36,38 +46,94 @@ class WorkflowObserver(Observer):
         )
 
 
+def _to_company(entity) -> Company | None:
+    if entity is None or entity.entity_type != "COMP":
+        return None
+    return Company(**entity.model_dump())  # ty: ignore[missing-argument]
+
+
 def prepare_companies(
     companies: list[str] | str,
-    bigdata: Bigdata,
+    bigdata: Bigdata | RecordedBigdata,
+    entity_cache: EntityCache | None = None,
 ) -> list[Company]:
     """Prepare the list of companies for analysis. Ensure at least one of the forms of providing
-    the companies is present and ensures all elements are companies."""
+    the companies is present and ensures all elements are companies. With an `entity_cache`,
+    only the watchlists and entities that are not cached are fetched."""
     if isinstance(companies, list):
-        entities = bigdata.knowledge_graph.get_entities(companies)
+        entity_ids = companies
     elif isinstance(companies, str):
-        entities = bigdata.knowledge_graph.get_entities(
-            bigdata.watchlists.get(companies).items
-        )
+        if entity_cache is None:
+            entity_ids = bigdata.watchlists.get(companies).items
+        else:
+            entity_ids = entity_cache.get_watchlist_items(
+                companies,
+                lambda watchlist_id: bigdata.watchlists.get(watchlist_id).items,
+            )
     else:
         raise ValueError(
             "Companies must be either a list of RP entity IDs or a string representing a watchlist ID."
         )
 
     # Ensure there is entities, there is no duplicates and all entities are companies
-    if len(entities) == 0:
+    if len(entity_ids) == 0:
         raise ValueError("No entities found in the provided universe or watchlist.")
 
-    companies = [
-        Company(**e.model_dump())  # ty: ignore[missing-argument]
-        for e in entities
-        if e is not None and e.entity_type == "COMP"
-    ]
+    def fetch_companies(ids: list[str]) -> dict[str, Company | None]:
+        entities = bigdata.knowledge_graph.get_entities(ids)
+        return {
+            entity_id: _to_company(entity) for entity_id, entity in zip(ids, entities)
+        }
 
-    dedupped_companies = {c.id: c for c in companies}
+    if entity_cache is None:
+        resolved = fetch_companies(entity_ids)
+    else:
+        resolved = entity_cache.get_companies(entity_ids, fetch_companies)
+        logger.debug("Resolved companies", **entity_cache.stats())
+
+    dedupped_companies = {
+        company.id: company
+        for company in (resolved[entity_id] for entity_id in entity_ids)
+        if company is not None
+    }
 
     return list(dedupped_companies.values())
 
 
+# Columns of the labeled dataframe returned by the workflow, by LabeledChunk field
+LABELED_CHUNK_COLUMNS = {
+    "Time Period": "time_period",
+    "Date": "date",
+    "Company": "company",
+    "Sector": "sector",
+    "Industry": "industry",
+    "Country": "country",
+    "Ticker": "ticker",
+    "Document ID": "document_id",
+    "Headline": "headline",
+    "Quote": "quote",
+    "Motivation": "motivation",
+    "Sub-Scenario": "sub_scenario",
+    "Risk Channel": "risk_channel",
+    "Risk Factor": "risk_factor",
+    "Highlights": "highlights",
+}
+
+# Columns of the company dataframe that are not risk scores
+COMPANY_COLUMNS = ["Company", "Ticker", "Sector", "Industry", "Composite Score"]
+
+
+def empty_results() -> dict:
+    """Results of a workflow that found no relevant chunks, an empty report. The results
+    of `RiskAnalyzer.generate_results` can not be used, it returns a different tuple
+    without chunks."""
+    return {
+        "df_labeled": pd.DataFrame(columns=pd.Index(LABELED_CHUNK_COLUMNS)),
+        "df_company": pd.DataFrame(columns=pd.Index(COMPANY_COLUMNS)),
+        "df_motivation": pd.DataFrame(columns=pd.Index(["Company", "Motivation"])),
+    }
+
+
 def build_response(
     df_company: pd.DataFrame,
     df_motivation: pd.DataFrame,
@@ -76,63 +142,567 @@ def build_response(
 ) -> RiskAnalysisResponse:
     """
     Build the response for the output of the risk analysis workflow.
+
+    The dataframes are converted column-wise and validated in bulk, the motivation of
+    each company is looked up with an index instead of scanning `df_motivation` per row.
     """
-    risk_scoring = {}
-    for record in df_company.to_dict(orient="records"):
-        company = record.pop("Company")
-        ticker = record.pop("Ticker")
-        sector = record.pop("Sector")
-        industry = record.pop("Industry")
-        motivation = df_motivation.loc[df_motivation["Company"] == company][
-            "Motivation"
-        ].values[0]
-        composite_score = record.pop("Composite Score")
-        risk_scoring[company] = CompanyScoring(
-            ticker=ticker,
-            sector=sector,
-            industry=industry,
-            motivation=motivation,
-            composite_score=composite_score,
-            risks=RiskScore(
-                root={k: v for k, v in record.items() if not math.isnan(v)}
-            ),
+    motivations = (
+        df_motivation.drop_duplicates("Company")
+        .set_index("Company")["Motivation"]
+        .reindex(df_company["Company"])
+        .astype(object)
+    )
+    motivations = motivations.where(motivations.notna(), None).tolist()
+
+    risk_columns = [
+        column for column in df_company.columns if column not in COMPANY_COLUMNS
+    ]
+    scores = df_company[risk_columns].to_numpy(dtype=float)
+    exposed = ~np.isnan(scores)
+
+    risk_scoring = {
+        company: {
+            "ticker": ticker,
+            "sector": sector,
+            "industry": industry,
+            "motivation": motivation,
+            "composite_score": composite_score,
+            "risks": {
+                risk_columns[i]: value
+                for i, value in zip(np.flatnonzero(mask), row[mask].tolist())
+            },
+        }
+        for company, ticker, sector, industry, composite_score, motivation, row, mask in zip(
+            df_company["Company"].tolist(),
+            df_company["Ticker"].tolist(),
+            df_company["Sector"].tolist(),
+            df_company["Industry"].tolist(),
+            df_company["Composite Score"].tolist(),
+            motivations,
+            scores,
+            exposed,
         )
+    }
+
+    # Zipping the columns is much faster than `DataFrame.to_dict(orient="records")`
+    columns = [df_labeled[column].tolist() for column in LABELED_CHUNK_COLUMNS]
+    fields = list(LABELED_CHUNK_COLUMNS.values())
+    content = [dict(zip(fields, values)) for values in zip(*columns)]
 
     # Return results
     return RiskAnalysisResponse(
         risk_taxonomy=RiskTaxonomy(**risk_tree._to_dict()),  # ty: ignore[missing-argument]
-        risk_scoring=RiskScoring(root=risk_scoring),
-        content=LabeledContent(
-            root=[
-                LabeledChunk(
-                    time_period=record["Time Period"],
-                    date=record["Date"],
-                    company=record["Company"],
-                    sector=record["Sector"],
-                    industry=record["Industry"],
-                    country=record["Country"],
-                    ticker=record["Ticker"],
-                    document_id=record["Document ID"],
-                    headline=record["Headline"],
-                    quote=record["Quote"],
-                    motivation=record["Motivation"],
-                    sub_scenario=record["Sub-Scenario"],
-                    risk_channel=record["Risk Channel"],
-                    risk_factor=record["Risk Factor"],
-                    highlights=record["Highlights"],
+        risk_scoring=RiskScoring.model_validate(risk_scoring),
+        content=LabeledContent.model_validate(content),
+    )
+
+
+def tree_taxonomy(risk_taxonomy: RiskTaxonomy) -> tuple:
+    """Tree, risk summaries and terminal labels of a stored risk taxonomy, as returned by
+    `RiskAnalyzer.create_taxonomy`."""
+    risk_tree = SemanticTree.from_dict(risk_taxonomy.model_dump())
+    return (
+        risk_tree,
+        risk_tree.get_terminal_summaries(),
+        risk_tree.get_terminal_labels(),
+    )
+
+
+def find_taxonomy(
+    request: RiskAnalysisRequest, storage_manager: StorageManager
+) -> tuple[UUID | None, tuple | None]:
+    """Stored taxonomy to use for a request, with its ID: the one given by `taxonomy_id`
+    or, with `reuse_taxonomy`, the latest one generated for the same inputs. (None, None)
+    if a new taxonomy has to be generated."""
+    if request.taxonomy_id is not None:
+        risk_taxonomy = storage_manager.get_taxonomy(request.taxonomy_id)
+        if risk_taxonomy is None:
+            raise ValueError(f"Risk taxonomy {request.taxonomy_id} not found.")
+        return request.taxonomy_id, tree_taxonomy(risk_taxonomy)
+    if request.reuse_taxonomy:
+        found = storage_manager.find_taxonomy(request.taxonomy_hash())
+        if found is not None:
+            taxonomy_id, risk_taxonomy = found
+            return taxonomy_id, tree_taxonomy(risk_taxonomy)
+    return None, None
+
+
+def create_analyzer(
+    request: RiskAnalysisRequest,
+    companies: list[Company],
+    start_date: str | None = None,
+    backend: Backend | None = None,
+) -> Analyzer:
+    def create() -> RiskAnalyzer:
+        return RiskAnalyzer(
+            llm_model=request.llm_model,
+            main_theme=request.main_theme,
+            companies=companies,
+            start_date=start_date or request.start_date,
+            end_date=request.end_date,
+            keywords=request.keywords,
+            document_type=request.document_type,
+            fiscal_year=request.fiscal_year,
+            control_entities=request.control_entities,
+            rerank_threshold=request.rerank_threshold,
+            focus=request.focus,
+        )
+
+    if backend is None:
+        return create()
+    return backend.analyzer(request.request_hash(), companies, create)
+
+
+def label_chunks(
+    analyzer: Analyzer,
+    df_sentences: pd.DataFrame,
+    risk_tree: SemanticTree,
+    terminal_labels: list[str],
+) -> pd.DataFrame:
+    # Labels are matched with the chunks by position
+    _, df_labeled = analyzer.label_search_results(
+        df_sentences=df_sentences.reset_index(drop=True),
+        terminal_labels=terminal_labels,
+        risk_tree=risk_tree,
+        additional_prompt_fields=["entity_sector", "entity_industry", "headline"],
+    )
+    return df_labeled
+
+
+def sort_labeled_chunks(df_labeled: pd.DataFrame) -> pd.DataFrame:
+    return df_labeled.sort_values(
+        ["Company", "Date", "Sub-Scenario"], kind="stable", ignore_index=True
+    )
+
+
+def run_shard(
+    request: RiskAnalysisRequest,
+    companies: list[Company],
+    taxonomy: tuple,
+    backend: Backend | None = None,
+) -> dict:
+    """Search, label and generate the motivations for a shard of the companies of a
+    request. Run in the worker processes of `run_shards`."""
+    risk_tree, risk_summaries, terminal_labels = taxonomy
+    analyzer = create_analyzer(request, companies, backend=backend)
+    timer = StageTimer()
+    with timer.stage(WorkflowStage.SEARCH):
+        df_sentences = analyzer.retrieve_results(
+            risk_summaries,
+            request.frequency,
+            request.document_limit,
+            request.batch_size,
+        )
+    with timer.stage(WorkflowStage.LABELING):
+        df_labeled = (
+            label_chunks(analyzer, df_sentences, risk_tree, terminal_labels)
+            if not df_sentences.empty
+            else pd.DataFrame()
+        )
+    with timer.stage(WorkflowStage.SCORING):
+        df_motivation = (
+            analyzer.generate_results(df_labeled)[2]
+            if not df_labeled.empty
+            else pd.DataFrame(columns=pd.Index(["Company", "Motivation"]))
+        )
+    return {
+        "chunks": len(df_sentences),
+        "df_labeled": df_labeled,
+        "df_motivation": df_motivation,
+        "timings": timer.timings,
+    }
+
+
+def run_shards(
+    analyzer: Analyzer,
+    request: RiskAnalysisRequest,
+    request_id: UUID,
+    taxonomy: tuple,
+    parallelism: int,
+    checkpoints: CheckpointStore | None = None,
+    backend: Backend | None = None,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    Split the companies of the analyzer in `parallelism` shards and run the search, the
+    labeling and the motivations of each shard in its own worker process (at most one per
+    CPU), with the same taxonomy. The companies are scored once the shards are merged, so the results are
+    the same as for the whole universe at once. With a checkpoint store, each completed
+    shard is saved and not run again when the workflow is resumed.
+
+    The stage timings of the shards run are added to `timer`, so they are the total time
+    spent in each stage by all the workers.
+    """
+    timer = timer if timer is not None else StageTimer()
+    companies = analyzer.companies
+    n_shards = min(parallelism, len(companies))
+    shards = [
+        companies[i * len(companies) // n_shards : (i + 1) * len(companies) // n_shards]
+        for i in range(n_shards)
+    ]
+    names = [f"shard-{i:04d}-of-{n_shards:04d}" for i in range(n_shards)]
+    shard_results = {}
+    if checkpoints is not None:
+        for name in names:
+            checkpoint = checkpoints.load(request_id, name)
+            if checkpoint is not None:
+                shard_results[name] = checkpoint
+    pending = [i for i, name in enumerate(names) if name not in shard_results]
+    analyzer.notify_observers(
+        f"Searching and labelling {len(companies)} companies in {n_shards} shards, {len(pending)} to run"
+    )
+
+    errors = []
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=min(len(pending), os.cpu_count() or 1)
+        ) as executor:
+            futures = {
+                executor.submit(run_shard, request, shards[i], taxonomy, backend): i
+                for i in pending
+            }
+            # The other shards keep running and are saved if one fails
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    analyzer.notify_observers(
+                        f"Shard {i + 1} of {n_shards} failed: {e}"
+                    )
+                    errors.append(e)
+                    continue
+                shard_results[names[i]] = result
+                for stage, seconds in result["timings"].items():
+                    timer.add(stage, seconds)
+                if checkpoints is not None:
+                    checkpoints.save(request_id, names[i], result)
+                analyzer.notify_observers(
+                    f"Shard {i + 1} of {n_shards} completed. {result['chunks']} chunks found, {len(result['df_labeled'])} labeled for {len(shards[i])} companies."
                 )
-                for record in df_labeled.to_dict(orient="records")
-            ]
+
+    if errors:
+        raise errors[0]
+
+    results = [shard_results[name] for name in names]
+    labeled = [r["df_labeled"] for r in results if not r["df_labeled"].empty]
+    if not labeled:
+        analyzer.notify_observers("No relevant chunks found for any shard.")
+        return empty_results()
+    df_labeled = sort_labeled_chunks(pd.concat(labeled, ignore_index=True))
+    analyzer.notify_observers(
+        f"Labeling completed. {len(df_labeled)} chunks labeled with risk factors."
+    )
+    with timer.stage(WorkflowStage.SCORING):
+        df_company = get_scored_df(
+            df_labeled,
+            index_columns=["Company", "Ticker", "Sector", "Industry"],
+            pivot_column="Sub-Scenario",
+        )
+    return {
+        "df_labeled": df_labeled,
+        "df_company": df_company,
+        "df_motivation": pd.concat(
+            [r["df_motivation"] for r in results], ignore_index=True
         ),
+    }
+
+
+def run_workflow_stages(
+    analyzer: Analyzer,
+    request: RiskAnalysisRequest,
+    request_id: UUID,
+    checkpoints: CheckpointStore | None = None,
+    labeling_batch_size: int = 500,
+    taxonomy: tuple | None = None,
+    taxonomy_id: UUID | None = None,
+    parallelism: int = 1,
+    backend: Backend | None = None,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    Run the stages of `RiskAnalyzer.screen_companies` one at a time: taxonomy, search,
+    labeling and results. With a checkpoint store the output of each stage is saved, and
+    the chunks are labeled and saved in batches of `labeling_batch_size`, so running a
+    failed workflow again resumes from the last completed stage or batch.
+
+    A stored `taxonomy` (with its `taxonomy_id`) is used instead of generating one. The
+    returned `taxonomy_id` is None when the taxonomy was generated by this workflow.
+
+    With a `parallelism` above 1, the stages after the taxonomy run in shards of the
+    companies on worker processes, see `run_shards`.
+
+    The time spent in each stage is added to `timer`, stages loaded from a checkpoint are
+    not timed.
+    """
+    timer = timer if timer is not None else StageTimer()
+
+    def load(name: str):
+        return checkpoints.load(request_id, name) if checkpoints else None
+
+    def save(name: str, value):
+        if checkpoints:
+            checkpoints.save(request_id, name, value)
+
+    checkpoint = load("taxonomy")
+    if checkpoint is not None:
+        analyzer.notify_observers("Risk taxonomy loaded from checkpoint")
+        taxonomy_id, taxonomy = checkpoint
+    elif taxonomy is not None:
+        analyzer.notify_observers(f"Reusing risk taxonomy {taxonomy_id}")
+        save("taxonomy", (taxonomy_id, taxonomy))
+    else:
+        analyzer.notify_observers("Generating risk taxonomy")
+        with timer.stage(WorkflowStage.TAXONOMY):
+            taxonomy = analyzer.create_taxonomy()
+        save("taxonomy", (None, taxonomy))
+    risk_tree, risk_summaries, terminal_labels = taxonomy
+    analyzer.notify_observers(
+        f"Risk taxonomy generated with {len(terminal_labels)} leafs"
     )
+    analyzer.notify_observers(risk_tree.as_string())
+    workflow = {
+        "risk_tree": risk_tree,
+        "taxonomy": taxonomy,
+        "taxonomy_id": taxonomy_id,
+    }
+
+    if parallelism > 1 and len(analyzer.companies) > 1:
+        results = load("results")
+        if results is None:
+            results = run_shards(
+                analyzer,
+                request,
+                request_id,
+                taxonomy,
+                parallelism,
+                checkpoints,
+                backend,
+                timer,
+            )
+            save("results", results)
+        else:
+            analyzer.notify_observers("Results loaded from checkpoint")
+        return {**results, **workflow}
+
+    df_sentences = load("search")
+    if df_sentences is None:
+        analyzer.notify_observers("Searching companies for risk exposure")
+        with timer.stage(WorkflowStage.SEARCH):
+            df_sentences = analyzer.retrieve_results(
+                risk_summaries,
+                request.frequency,
+                request.document_limit,
+                request.batch_size,
+            )
+        save("search", df_sentences)
+    else:
+        analyzer.notify_observers("Search results loaded from checkpoint")
+    analyzer.notify_observers(
+        f"Search completed. {len(df_sentences)} chunks found for {len(analyzer.companies)} companies."
+    )
+
+    results = load("results")
+    if results is None:
+        analyzer.notify_observers(
+            f"Labelling {len(df_sentences)} chunks with {len(terminal_labels)} risks"
+        )
+        labeled_batches = []
+        for start in range(0, len(df_sentences), labeling_batch_size):
+            name = f"labels-{start:08d}"
+            df_batch_labeled = load(name)
+            if df_batch_labeled is None:
+                with timer.stage(WorkflowStage.LABELING):
+                    df_batch_labeled = label_chunks(
+                        analyzer,
+                        df_sentences.iloc[start : start + labeling_batch_size],
+                        risk_tree,
+                        terminal_labels,
+                    )
+                save(name, df_batch_labeled)
+            labeled_batches.append(df_batch_labeled)
+            analyzer.notify_observers(
+                f"Labelled {min(start + labeling_batch_size, len(df_sentences))} of {len(df_sentences)} chunks"
+            )
+        # Batches without relevant chunks are left as returned by the labeler
+        labeled_batches = [df for df in labeled_batches if not df.empty]
+        df_labeled = (
+            pd.concat(labeled_batches, ignore_index=True)
+            if labeled_batches
+            else pd.DataFrame()
+        )
+        if len(labeled_batches) > 1:
+            # Each batch is sorted by company, date and risk, keep that order overall
+            df_labeled = sort_labeled_chunks(df_labeled)
+        analyzer.notify_observers(
+            f"Labeling completed. {len(df_labeled)} chunks labeled with risk factors."
+        )
+
+        analyzer.notify_observers("Post-processing results")
+        if not df_labeled.empty:
+            with timer.stage(WorkflowStage.SCORING):
+                df_company, _, df_motivation = analyzer.generate_results(df_labeled)
+            results = {
+                "df_labeled": df_labeled,
+                "df_company": df_company,
+                "df_motivation": df_motivation,
+            }
+        else:
+            analyzer.notify_observers("No relevant chunks found.")
+            results = empty_results()
+        save("results", results)
+        analyzer.notify_observers("Results post-processed")
+    else:
+        analyzer.notify_observers("Results loaded from checkpoint")
+
+    return {**results, **workflow}
+
+
+@dataclass
+class ExtensionBase:
+    """Report extended by a request, with the request and the taxonomy it was generated
+    with. `taxonomy_id` is None if the taxonomy was not stored, then it is rebuilt from the
+    taxonomy of the report."""
+
+    request: RiskAnalysisRequest
+    report: RiskAnalysisResponse
+    taxonomy_id: UUID | None
+    taxonomy: tuple
+
+
+def load_extension_base(
+    request: RiskAnalysisRequest, storage_manager: StorageManager
+) -> ExtensionBase:
+    base_id = request.extends_report_id
+    base_request = storage_manager.get_job_request(base_id)
+    base_report = storage_manager.get_analysis_report(base_id)
+    if base_request is None or base_report is None:
+        raise ValueError(f"Report {base_id} to extend not found.")
+    taxonomy_id = base_report.taxonomy_id
+    risk_taxonomy = (
+        storage_manager.get_taxonomy(taxonomy_id) if taxonomy_id is not None else None
+    )
+    if risk_taxonomy is None:
+        # Reports of previous versions have no stored taxonomy, the one of the report has
+        # the same tree
+        taxonomy_id, risk_taxonomy = None, base_report.risk_taxonomy
+    if request.end_date <= base_request.end_date:
+        raise ValueError(
+            f"The end date must be after the end date of the extended report ({base_request.end_date})."
+        )
+    return ExtensionBase(
+        request=base_request,
+        report=base_report,
+        taxonomy_id=taxonomy_id,
+        taxonomy=tree_taxonomy(risk_taxonomy),
+    )
+
+
+def run_extension_stages(
+    analyzer: Analyzer,
+    request: RiskAnalysisRequest,
+    base: ExtensionBase,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    Extend a report to a later end date. Only the dates added to the window are searched
+    (the analyzer must start the day after the end of the report) and labeled with the
+    taxonomy of the report, then the new chunks are merged with its evidence. The scores
+    are recomputed from all the chunks, the motivations only for the companies with new
+    chunks. The time spent in each stage is added to `timer`.
+    """
+    timer = timer if timer is not None else StageTimer()
+    risk_tree, risk_summaries, terminal_labels = base.taxonomy
+    analyzer.notify_observers(
+        f"Extending report {request.extends_report_id} from {base.request.end_date} to {request.end_date}"
+    )
+
+    analyzer.notify_observers("Searching companies for risk exposure in the new dates")
+    with timer.stage(WorkflowStage.SEARCH):
+        df_sentences = analyzer.retrieve_results(
+            risk_summaries,
+            request.frequency,
+            request.document_limit,
+            request.batch_size,
+        )
+    analyzer.notify_observers(
+        f"Search completed. {len(df_sentences)} chunks found for {len(analyzer.companies)} companies."
+    )
+
+    df_new = pd.DataFrame(columns=pd.Index(LABELED_CHUNK_COLUMNS))
+    if not df_sentences.empty:
+        analyzer.notify_observers(
+            f"Labelling {len(df_sentences)} chunks with {len(terminal_labels)} risks"
+        )
+        with timer.stage(WorkflowStage.LABELING):
+            df_new_labeled = label_chunks(
+                analyzer, df_sentences, risk_tree, terminal_labels
+            )
+        if not df_new_labeled.empty:
+            df_new = df_new_labeled[list(LABELED_CHUNK_COLUMNS)]
+
+    chunks = base.report.content.root if base.report.content is not None else []
+    df_base = pd.DataFrame(
+        [chunk.model_dump() for chunk in chunks],
+        columns=pd.Index(LABELED_CHUNK_COLUMNS.values()),
+    ).rename(columns={field: column for column, field in LABELED_CHUNK_COLUMNS.items()})
+    df_labeled = sort_labeled_chunks(pd.concat([df_base, df_new], ignore_index=True))
+    analyzer.notify_observers(
+        f"Labeling completed. {len(df_new)} new chunks, {len(df_labeled)} chunks in the extended report."
+    )
+
+    analyzer.notify_observers("Post-processing results")
+    with timer.stage(WorkflowStage.SCORING):
+        df_company = (
+            get_scored_df(
+                df_labeled,
+                index_columns=["Company", "Ticker", "Sector", "Industry"],
+                pivot_column="Sub-Scenario",
+            )
+            if not df_labeled.empty
+            else empty_results()["df_company"]
+        )
+        changed = set(df_new["Company"])
+        motivations = {
+            company: scoring.motivation
+            for company, scoring in base.report.risk_scoring.root.items()
+            if company not in changed
+        }
+        df_changed = df_labeled[df_labeled["Company"].isin(changed)]
+        if not df_changed.empty:
+            _, _, df_new_motivation = analyzer.generate_results(df_changed)
+            motivations.update(
+                zip(df_new_motivation["Company"], df_new_motivation["Motivation"])
+            )
+    analyzer.notify_observers("Results post-processed")
+
+    return {
+        "df_labeled": df_labeled,
+        "df_company": df_company,
+        "df_motivation": pd.DataFrame(
+            {"Company": list(motivations), "Motivation": list(motivations.values())}
+        ),
+        "risk_tree": risk_tree,
+        "taxonomy": base.taxonomy,
+        "taxonomy_id": base.taxonomy_id,
+    }
 
 
 def process_request(
     request: RiskAnalysisRequest,
-    bigdata: Bigdata | None,
+    bigdata: Bigdata | RecordedBigdata | None,
     request_id: UUID,
     storage_manager: StorageManager,
+    entity_cache: EntityCache | None = None,
+    checkpoints: CheckpointStore | None = None,
+    labeling_batch_size: int = 500,
+    max_parallelism: int = 1,
+    backend: Backend | None = None,
 ):
+    """Run a queued risk analysis and store its report. The time spent in each stage is
+    stored with the report (except the storage of the report itself) and observed in the
+    stage metrics, also when the workflow fails."""
+    timer = StageTimer()
     try:
         storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
         if not bigdata:
@@ -140,31 +710,51 @@ def process_request(
 
         workflow_execution_start = datetime.now()
 
-        resolved_companies = prepare_companies(request.companies, bigdata)
+        with timer.stage(WorkflowStage.COMPANY_RESOLUTION):
+            resolved_companies = prepare_companies(
+                request.companies, bigdata, entity_cache=entity_cache
+            )
 
-        analyzer = RiskAnalyzer(
-            llm_model=request.llm_model,
-            main_theme=request.main_theme,
-            companies=resolved_companies,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            keywords=request.keywords,
-            document_type=request.document_type,
-            fiscal_year=request.fiscal_year,
-            control_entities=request.control_entities,
-            rerank_threshold=request.rerank_threshold,
-            focus=request.focus,
-        )
+        extension_base = None
+        start_date = request.start_date
+        if request.extends_report_id is not None:
+            extension_base = load_extension_base(request, storage_manager)
+            # Only the dates after the end of the extended report are analyzed
+            start_date = (
+                date.fromisoformat(extension_base.request.end_date) + timedelta(days=1)
+            ).isoformat()
+
+        if backend is not None:
+            backend.record_request(
+                request.request_hash(), request.model_dump(mode="json")
+            )
+        analyzer = create_analyzer(request, resolved_companies, start_date, backend)
 
         analyzer.register_observer(
             WorkflowObserver(request_id=request_id, storage_manager=storage_manager)
         )
 
-        results = analyzer.screen_companies(
-            document_limit=request.document_limit,
-            batch_size=request.batch_size,
-            frequency=request.frequency,
-        )
+        if extension_base is not None:
+            results = run_extension_stages(analyzer, request, extension_base, timer)
+        else:
+            if checkpoints is not None and checkpoints.names(request_id):
+                storage_manager.log_message(
+                    request_id=request_id,
+                    message="Resuming the workflow from the last completed stage",
+                )
+            taxonomy_id, taxonomy = find_taxonomy(request, storage_manager)
+            results = run_workflow_stages(
+                analyzer,
+                request,
+                request_id,
+                checkpoints=checkpoints,
+                labeling_batch_size=labeling_batch_size,
+                taxonomy=taxonomy,
+                taxonomy_id=taxonomy_id,
+                parallelism=min(request.parallelism, max_parallelism),
+                backend=backend,
+                timer=timer,
+            )
 
         df_labeled = results["df_labeled"]
         df_company = results["df_company"]
@@ -187,20 +777,31 @@ def process_request(
             },
         )
 
-        response = build_response(
-            df_company=df_company,
-            df_motivation=df_motivation,
-            df_labeled=df_labeled,
-            risk_tree=risk_tree,
-        )
+        with timer.stage(WorkflowStage.BUILD_RESPONSE):
+            response = build_response(
+                df_company=df_company,
+                df_motivation=df_motivation,
+                df_labeled=df_labeled,
+                risk_tree=risk_tree,
+            )
+        response.stage_timings = timer.rounded()
 
-        storage_manager.mark_workflow_as_completed(request_id, request, response)
+        with timer.stage(WorkflowStage.PERSIST):
+            response.taxonomy_id = results["taxonomy_id"] or (
+                storage_manager.save_taxonomy(request, response.risk_taxonomy)
+            )
+            storage_manager.mark_workflow_as_completed(request_id, request, response)
+        if checkpoints is not None:
+            checkpoints.delete(request_id)
         return response
 
     except Exception as e:
         storage_manager.log_message(
             request_id=request_id,
             message=f"Workflow failed with error: {str(e)}",
+            level=LogLevel.ERROR,
         )
         storage_manager.update_status(request_id, WorkflowStatus.FAILED)
         raise e
+    finally:
+        timer.observe()
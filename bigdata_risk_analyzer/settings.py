@@ -1,9 +1,12 @@
+import os
 from pathlib import Path
 
 from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
 from bigdata_risk_analyzer import logger
+from bigdata_risk_analyzer.api.scheduler import WorkerType
+from bigdata_risk_analyzer.backends import BackendMode
 
 PROJECT_DIRECTORY = Path(__file__).parent.parent
 
@@ -24,9 +27,79 @@ class Settings(BaseSettings):
 
     # Static dir configuration
     STATIC_DIR: str = str(PROJECT_DIRECTORY / "bigdata_risk_analyzer" / "static")
+    # Compressed variants of the static files, built on startup if they are missing
+    STATIC_BUILD_DIR: str = str(PROJECT_DIRECTORY / "static_build")
 
     # Data storage configuration
     DB_STRING: str = "sqlite:///risk_analyzer.db"
+    # Connection pool shared by the API and the job workers, SQLite databases use WAL mode
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+
+    # Job scheduler configuration
+    # Number of analyses that can run at the same time and whether they run on threads or processes
+    JOB_WORKERS: int = 2
+    JOB_WORKER_TYPE: WorkerType = WorkerType.THREAD
+    # Maximum number of queued analyses, new submissions are rejected with a 429 when full
+    JOB_QUEUE_MAX_SIZE: int = 100
+
+    # Identical requests are answered with the existing report if it is younger than this,
+    # set to 0 to disable the result cache
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+
+    # Workflow logs are written in batches, when this many messages are pending or after
+    # this many seconds
+    LOG_FLUSH_SIZE: int = 50
+    LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+
+    # Intermediate results of the analyses are stored in this directory, so a failed
+    # analysis can be resumed from the last completed stage. Leave empty to disable
+    CHECKPOINT_DIR: str = str(PROJECT_DIRECTORY / "checkpoints")
+    # Labeled chunks are checkpointed in batches of this size
+    LABELING_BATCH_SIZE: int = 500
+    # Maximum number of worker processes a single analysis can be sharded across, requests
+    # ask for up to this many with `parallelism`. The CPUs are also split between the
+    # JOB_WORKERS, and analyses on process workers are never sharded
+    ANALYSIS_MAX_PARALLELISM: int = os.cpu_count() or 1
+
+    # Where the Bigdata.com and LLM calls go: `live`, `record` (live, and every call is
+    # recorded in RECORDINGS_DIR) or `replay` (the recorded calls are replayed without
+    # network access, each one after REPLAY_LATENCY_SECONDS)
+    BACKEND: BackendMode = BackendMode.LIVE
+    RECORDINGS_DIR: str = str(PROJECT_DIRECTORY / "recordings")
+    REPLAY_LATENCY_SECONDS: float = 0.0
+
+    # Resolved companies are cached for this long, set to 0 to disable the cache. Watchlists
+    # can be edited, so their items are only cached for ENTITY_CACHE_WATCHLIST_TTL_SECONDS
+    # (0 to always fetch them). With ENTITY_CACHE_PERSIST the cache is also stored in the
+    # database
+    ENTITY_CACHE_TTL_SECONDS: int = 86400
+    ENTITY_CACHE_WATCHLIST_TTL_SECONDS: int = 300
+    ENTITY_CACHE_MAX_SIZE: int = 10000
+    ENTITY_CACHE_PERSIST: bool = True
+
+    # Database maintenance, run every DB_MAINTENANCE_INTERVAL_SECONDS (set to 0 to disable
+    # it). Analyses completed or failed more than their retention ago are deleted (0 keeps
+    # them forever), after archiving them in ARCHIVE_DIR as compressed JSON (leave empty to
+    # delete them without archiving). SQLite databases are vacuumed once this fraction of
+    # their pages is free
+    DB_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    COMPLETED_RETENTION_DAYS: int = 0
+    FAILED_RETENTION_DAYS: int = 30
+    ARCHIVE_DIR: str = str(PROJECT_DIRECTORY / "archive")
+    DB_VACUUM_FREE_RATIO: float = 0.2
+
+    # Progress streams check the database when no event was received for this many seconds
+    STREAM_POLL_INTERVAL_SECONDS: float = 5.0
+
+    # Responses larger than this are brotli or gzip compressed for clients that accept
+    # it, set the gzip level to 0 to disable compression
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1000
+    RESPONSE_COMPRESSION_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+    # Reports are streamed with this many evidence chunks per batch
+    REPORT_STREAM_BATCH_SIZE: int = 500
 
     @classmethod
     def load_from_env(cls) -> "Settings":
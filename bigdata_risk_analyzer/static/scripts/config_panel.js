@@ -52,7 +52,9 @@ function adaptRiskDataToThemeFormat(riskData) {
     const adapted = {
         theme_scoring: {},
         theme_taxonomy: riskData.risk_taxonomy || {},
-        content: riskData.content || []
+        content: riskData.content || [],
+        // Set when the evidence is loaded from the server instead of being part of the report
+        content_source: riskData.content_source || null
     };
     
     // Transform each company's risk data to theme format
@@ -109,7 +111,7 @@ function loadQuickStartTemplate(type) {
         const spinner = document.getElementById('spinner');
         if (spinner) spinner.classList.remove('hidden');
         
-        fetch(template.file)
+        fetch((window.demoReportUrls && window.demoReportUrls[type]) || template.file)
             .then(res => res.json())
             .then(riskData => {
                 if (spinner) spinner.classList.add('hidden');
@@ -119,6 +121,7 @@ function loadQuickStartTemplate(type) {
                 
                 // Store the report globally
                 window.lastReport = data;
+                window.lastReportUrl = null;
                 
                 // Update config badge with demo info
                 if (window.updateConfigBadge) {
@@ -25,7 +25,9 @@ function renderDashboardCards(data) {
     });
     
     // Count total supporting evidences
-    const totalEvidences = (data.content || []).length;
+    const totalEvidences = data.content_source
+        ? data.content_source.total
+        : (data.content || []).length;
     
     // Get current date/time
     const runDate = new Date().toLocaleString();
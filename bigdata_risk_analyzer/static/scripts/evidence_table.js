@@ -1,22 +1,39 @@
 // Evidence Table with Filters
 let allEvidenceData = [];
 let filteredEvidenceData = [];
+// Set when the evidence is loaded page by page from the server: { requestId, total, companies, themes }
+let evidenceSource = null;
+// Cursor of each loaded page and number of items matching the filters, in server mode
+let evidenceCursors = [null];
+let filteredEvidenceTotal = 0;
+let evidenceSearchTimer = null;
 
-function renderEvidenceTable(content) {
+// content: evidence already loaded in the browser (demos), or null with a source to load it from the server
+function renderEvidenceTable(content, source = null) {
     const container = document.querySelector('[data-tab-content="evidence"] .tab-actual-content');
     if (!container) return;
 
-    if (!content || !Array.isArray(content) || content.length === 0) {
+    evidenceSource = source && source.total > 0 ? source : null;
+    if (!evidenceSource && (!content || !Array.isArray(content) || content.length === 0)) {
         container.innerHTML = '<p class="text-zinc-400">No evidence data available</p>';
         return;
     }
 
-    allEvidenceData = content;
-    filteredEvidenceData = [...content];
-
-    // Extract unique companies and risk factors for filters
-    const companies = [...new Set(content.map(item => item.company))].sort();
-    const themes = [...new Set(content.map(item => item.sub_scenario || item.risk_factor || item.theme))].filter(Boolean).sort();
+    let companies, themes, totalItems;
+    if (evidenceSource) {
+        allEvidenceData = [];
+        filteredEvidenceData = [];
+        companies = evidenceSource.companies;
+        themes = evidenceSource.themes;
+        totalItems = evidenceSource.total;
+    } else {
+        allEvidenceData = content;
+        filteredEvidenceData = [...content];
+        // Extract unique companies and risk factors for filters
+        companies = [...new Set(content.map(item => item.company))].sort();
+        themes = [...new Set(content.map(item => item.sub_scenario || item.risk_factor || item.theme))].filter(Boolean).sort();
+        totalItems = content.length;
+    }
 
     let html = `
         <div class="mb-6">
@@ -70,13 +87,13 @@ function renderEvidenceTable(content) {
                     <div>
                         <label class="block text-sm font-medium text-zinc-300 mb-2">Search</label>
                         <input type="text" id="searchEvidence" placeholder="Search quotes, headlines..." 
-                            onkeyup="applyEvidenceFilters()"
+                            onkeyup="onEvidenceSearch()"
                             class="w-full px-3 py-2 bg-zinc-900 border border-zinc-600 rounded-lg text-zinc-200 text-sm focus:ring-2 focus:ring-blue-500 focus:border-blue-500 outline-none">
                     </div>
                 </div>
                 <div class="mt-3 flex justify-between items-center">
                     <div class="text-sm text-zinc-400">
-                        Showing <span id="evidenceCount" class="font-bold text-blue-400">${content.length}</span> of ${content.length} items
+                        Showing <span id="evidenceCount" class="font-bold text-blue-400">${totalItems}</span> of ${totalItems} items
                     </div>
                     <button onclick="clearEvidenceFilters()" 
                         class="text-sm text-blue-400 hover:text-blue-300 font-medium">
@@ -124,7 +141,53 @@ function renderEvidenceTable(content) {
     `;
 
     container.innerHTML = html;
-    renderEvidenceTableRows(1);
+    if (evidenceSource) {
+        evidenceCursors = [null];
+        filteredEvidenceTotal = evidenceSource.total;
+        loadEvidencePage(1);
+    } else {
+        renderEvidenceTableRows(1);
+    }
+}
+
+function evidenceQueryParams(cursor, limit) {
+    const params = new URLSearchParams({ limit: String(limit) });
+    const token = getUrlParam('token');
+    if (token) params.append('token', token);
+    if (cursor !== null && cursor !== undefined) params.append('cursor', String(cursor));
+
+    const company = document.getElementById('filterCompany')?.value;
+    const theme = document.getElementById('filterTheme')?.value;
+    const search = document.getElementById('searchEvidence')?.value.trim();
+    if (company) params.append('company', company);
+    if (theme) params.append('sub_scenario', theme);
+    if (search) params.append('search', search);
+    return params;
+}
+
+async function fetchEvidencePage(cursor, limit) {
+    const response = await fetch(`/reports/${evidenceSource.requestId}/content?${evidenceQueryParams(cursor, limit)}`);
+    if (!response.ok) {
+        throw new Error(`Evidence HTTP error ${response.status}`);
+    }
+    return response.json();
+}
+
+async function loadEvidencePage(page) {
+    const tbody = document.getElementById('evidenceTableBody');
+    try {
+        const data = await fetchEvidencePage(evidenceCursors[page - 1], ITEMS_PER_PAGE);
+        evidenceCursors[page] = data.next_cursor;
+        filteredEvidenceData = data.items;
+        filteredEvidenceTotal = data.total;
+        document.getElementById('evidenceCount').textContent = data.total;
+        renderEvidenceTableRows(page);
+    } catch (error) {
+        console.error('Error loading evidence:', error);
+        if (tbody) {
+            tbody.innerHTML = `<tr><td colspan="7" class="px-4 py-3 text-sm text-red-400">Could not load the evidence: ${escapeHtml(error.message)}</td></tr>`;
+        }
+    }
 }
 
 const ITEMS_PER_PAGE = 50;
@@ -135,7 +198,8 @@ function renderEvidenceTableRows(page = 1) {
     if (!tbody) return;
 
     currentPage = page;
-    const startIdx = (page - 1) * ITEMS_PER_PAGE;
+    // In server mode only the current page is loaded
+    const startIdx = evidenceSource ? 0 : (page - 1) * ITEMS_PER_PAGE;
     const endIdx = startIdx + ITEMS_PER_PAGE;
     const pageData = filteredEvidenceData.slice(startIdx, endIdx);
 
@@ -159,8 +223,12 @@ function renderEvidenceTableRows(page = 1) {
     updatePaginationControls();
 }
 
+function filteredEvidenceCount() {
+    return evidenceSource ? filteredEvidenceTotal : filteredEvidenceData.length;
+}
+
 function updatePaginationControls() {
-    const totalPages = Math.ceil(filteredEvidenceData.length / ITEMS_PER_PAGE);
+    const totalPages = Math.ceil(filteredEvidenceCount() / ITEMS_PER_PAGE);
     document.getElementById('currentPage').textContent = currentPage;
     document.getElementById('totalPages').textContent = totalPages;
     
@@ -172,15 +240,35 @@ function updatePaginationControls() {
 }
 
 function changeEvidencePage(delta) {
-    const totalPages = Math.ceil(filteredEvidenceData.length / ITEMS_PER_PAGE);
+    const totalPages = Math.ceil(filteredEvidenceCount() / ITEMS_PER_PAGE);
     const newPage = currentPage + delta;
     
     if (newPage >= 1 && newPage <= totalPages) {
-        renderEvidenceTableRows(newPage);
+        if (evidenceSource) {
+            loadEvidencePage(newPage);
+        } else {
+            renderEvidenceTableRows(newPage);
+        }
+    }
+}
+
+function onEvidenceSearch() {
+    if (!evidenceSource) {
+        applyEvidenceFilters();
+        return;
     }
+    // Wait for the user to stop typing before querying the server
+    clearTimeout(evidenceSearchTimer);
+    evidenceSearchTimer = setTimeout(applyEvidenceFilters, 300);
 }
 
 function applyEvidenceFilters() {
+    if (evidenceSource) {
+        evidenceCursors = [null];
+        loadEvidencePage(1);
+        return;
+    }
+
     const companyFilter = document.getElementById('filterCompany').value.toLowerCase();
     const themeFilter = document.getElementById('filterTheme').value.toLowerCase();
     const searchTerm = document.getElementById('searchEvidence').value.toLowerCase();
@@ -205,24 +293,50 @@ function clearEvidenceFilters() {
     document.getElementById('filterCompany').value = '';
     document.getElementById('filterTheme').value = '';
     document.getElementById('searchEvidence').value = '';
+    if (evidenceSource) {
+        applyEvidenceFilters();
+        return;
+    }
     filteredEvidenceData = [...allEvidenceData];
     document.getElementById('evidenceCount').textContent = filteredEvidenceData.length;
     renderEvidenceTableRows(1);
 }
 
-function exportEvidence(format) {
-    if (filteredEvidenceData.length === 0) {
+// All the evidence matching the filters, loaded from the server in server mode
+async function getEvidenceToExport() {
+    if (!evidenceSource) {
+        return filteredEvidenceData;
+    }
+    const items = [];
+    let cursor = null;
+    do {
+        const data = await fetchEvidencePage(cursor, 1000);
+        items.push(...data.items);
+        cursor = data.next_cursor;
+    } while (cursor !== null && cursor !== undefined);
+    return items;
+}
+
+async function exportEvidence(format) {
+    let exportData;
+    try {
+        exportData = await getEvidenceToExport();
+    } catch (error) {
+        alert(`Could not load the evidence: ${error.message}`);
+        return;
+    }
+    if (exportData.length === 0) {
         alert('No data to export');
         return;
     }
 
     if (format === 'json') {
-        const dataStr = JSON.stringify(filteredEvidenceData, null, 2);
+        const dataStr = JSON.stringify(exportData, null, 2);
         const blob = new Blob([dataStr], { type: 'application/json' });
         downloadFile(blob, 'evidence_export.json');
     } else if (format === 'csv') {
         const headers = ['Time Period', 'Date', 'Company', 'Ticker', 'Sector', 'Industry', 'Country', 'Document ID', 'Headline', 'Quote', 'Motivation', 'Theme'];
-        const rows = filteredEvidenceData.map(item => [
+        const rows = exportData.map(item => [
             item.time_period,
             item.date,
             item.company,
@@ -260,6 +374,7 @@ function downloadFile(blob, filename) {
 
 // Make functions globally accessible
 window.applyEvidenceFilters = applyEvidenceFilters;
+window.onEvidenceSearch = onEvidenceSearch;
 window.clearEvidenceFilters = clearEvidenceFilters;
 window.changeEvidencePage = changeEvidencePage;
 window.exportEvidence = exportEvidence;
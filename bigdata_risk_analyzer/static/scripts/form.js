@@ -11,6 +11,7 @@ document.getElementById('riskForm').onsubmit = async function (e) {
     
     showJsonBtn.style.display = 'none';
     lastReport = null;
+    lastReportUrl = null;
     
     // Reset frontend: hide results, show empty state, clear dashboard
     const emptyState = document.getElementById('emptyState');
@@ -160,76 +161,151 @@ document.getElementById('riskForm').onsubmit = async function (e) {
             throw new Error(`HTTP error ${response.status}`);
         }
         const data = await response.json();
-        // Start polling status endpoint every 5 seconds using request_id
+        // Follow the progress of the analysis through the status stream, falling back to
+        // polling the status endpoint every 5 seconds if streaming is not available. Only new
+        // log lines are transferred and the report is fetched once the analysis is completed
         if (data && data.request_id) {
             const requestId = data.request_id;
-            let polling = true;
+            let logCursor = 0;
+            let finished = false;
             const logViewer = document.getElementById('logViewer');
-            async function pollStatus() {
+            logViewer.innerHTML = '';
+            spinner.style.display = 'block';
+
+            function renderLogLine(line) {
+                let base = 'mb-1';
+                let color = '';
+                if (line.toLowerCase().includes('error')) color = 'text-red-400';
+                else if (line.toLowerCase().includes('success')) color = 'text-green-400';
+                else if (line.toLowerCase().includes('info')) color = 'text-sky-400';
+                return `<div class='${base} ${color}'>${line}</div>`;
+            }
+            function appendLogs(lines) {
+                if (!lines.length) return;
+                logViewer.querySelectorAll('[data-placeholder]').forEach(el => el.remove());
+                logViewer.insertAdjacentHTML('beforeend', lines.map(renderLogLine).join(''));
+                logViewer.scrollTop = logViewer.scrollHeight;
+            }
+            function showStatus(statusData) {
+                if (logCursor > 0) return;
+                const placeholder = statusData.queue_position
+                    ? `Queued, position ${statusData.queue_position} of ${statusData.queue_depth}.`
+                    : 'No logs yet.';
+                logViewer.innerHTML = `<div class='text-zinc-400' data-placeholder>${placeholder}</div>`;
+            }
+            function showError(message) {
+                logViewer.insertAdjacentHTML('beforeend', `<div class=\"log-line log-error\">❌ Status Error: ${message}</div>`);
+            }
+            async function finish(status) {
+                finished = true;
+                try {
+                    if (status === 'completed') {
+                        // The evidence is loaded page by page by the evidence table
+                        const reportParams = new URLSearchParams(params);
+                        reportParams.set('include_content', 'false');
+                        const [reportResp, facetsResp] = await Promise.all([
+                            fetch(`/report/${requestId}?${reportParams}`),
+                            fetch(`/reports/${requestId}/content/facets?${params}`),
+                        ]);
+                        if (!reportResp.ok) {
+                            throw new Error(`Report HTTP error ${reportResp.status}`);
+                        }
+                        if (!facetsResp.ok) {
+                            throw new Error(`Evidence HTTP error ${facetsResp.status}`);
+                        }
+                        const report = await reportResp.json();
+                        const facets = await facetsResp.json();
+                        report.content_source = {
+                            requestId: requestId,
+                            total: facets.total,
+                            companies: facets.companies,
+                            themes: facets.sub_scenarios,
+                        };
+
+                        // Update config badge BEFORE rendering so dashboard has access to it
+                        if (window.updateConfigBadge) {
+                            // Use exactly what the user typed for display
+                            const companiesText = document.getElementById('companies_text').value.trim();
+                            updateConfigBadge({
+                                main_theme: main_theme,
+                                companies: companiesText || 'Custom Universe',
+                                isDemo: false
+                            });
+                        }
+                        
+                        // Render the report using the new interface
+                        if (window.renderRiskReport) {
+                            renderRiskReport(report);
+                        }
+                        showJsonBtn.style.display = 'inline-block';
+                        
+                        // Show new analysis button
+                        const newAnalysisBtn = document.getElementById('newAnalysisBtn');
+                        if (newAnalysisBtn) newAnalysisBtn.style.display = 'inline-flex';
+                        
+                        // The complete report, with its evidence, is fetched when the JSON is shown
+                        lastReportUrl = `/report/${requestId}?${params}`;
+                    }
+                } catch (err) {
+                    showError(err.message);
+                }
+                spinner.style.display = 'none';
+                submitBtn.disabled = false;
+                submitBtn.textContent = 'Run Analysis';
+            }
 
+            async function pollStatus() {
                 try {
-                    const statusResp = await fetch(`/status/${requestId}?${params}`);
+                    const statusParams = new URLSearchParams(params);
+                    statusParams.append('since', logCursor);
+                    statusParams.append('include_report', 'false');
+                    const statusResp = await fetch(`/status/${requestId}?${statusParams}`);
                     if (!statusResp.ok) {
                         throw new Error(`Status HTTP error ${statusResp.status}`);
                     }
                     const statusData = await statusResp.json();
-                    spinner.style.display = 'block';
-                    // Render logs if available
-                    if (statusData.logs && Array.isArray(statusData.logs)) {
-                        logViewer.innerHTML = statusData.logs.map(line => {
-                            let base = 'mb-1';
-                            let color = '';
-                            if (line.toLowerCase().includes('error')) color = 'text-red-400';
-                            else if (line.toLowerCase().includes('success')) color = 'text-green-400';
-                            else if (line.toLowerCase().includes('info')) color = 'text-sky-400';
-                            return `<div class='${base} ${color}'>${line}</div>`;
-                        }).join('');
-                        logViewer.scrollTop = logViewer.scrollHeight;
-                    } else if (statusData.log) {
-                        logViewer.textContent = statusData.log;
-                    } else {
-                        logViewer.textContent = 'No logs yet.';
-                    }
+                    appendLogs(statusData.logs || []);
+                    logCursor = Math.max(logCursor, statusData.log_cursor || 0);
+                    showStatus(statusData);
                     // Stop polling if status is 'completed' or 'failed'
                     if (statusData.status === 'completed' || statusData.status === 'failed') {
-                        polling = false;
-                        if (statusData.status === 'completed') {
-                            // Update config badge BEFORE rendering so dashboard has access to it
-                            if (window.updateConfigBadge) {
-                                // Use exactly what the user typed for display
-                                const companiesText = document.getElementById('companies_text').value.trim();
-                                updateConfigBadge({
-                                    main_theme: main_theme,
-                                    companies: companiesText || 'Custom Universe',
-                                    isDemo: false
-                                });
-                            }
-                            
-                            // Render the report using the new interface
-                            if (window.renderRiskReport) {
-                                renderRiskReport(statusData.report);
-                            }
-                            showJsonBtn.style.display = 'inline-block';
-                            
-                            // Show new analysis button
-                            const newAnalysisBtn = document.getElementById('newAnalysisBtn');
-                            if (newAnalysisBtn) newAnalysisBtn.style.display = 'inline-flex';
-                            
-                            lastReport = statusData.report;
-                        }
-                        spinner.style.display = 'none';
-                        submitBtn.disabled = false;
-                        submitBtn.textContent = 'Run Analysis';
+                        await finish(statusData.status);
                         return;
                     }
                 } catch (err) {
-                    logViewer.innerHTML = `<div class=\"log-line log-error\">❌ Status Error: ${err.message}</div>`;
-                }
-                if (polling) {
-                    setTimeout(pollStatus, 5000);
+                    showError(err.message);
                 }
+                setTimeout(pollStatus, 5000);
+            }
+
+            function streamStatus() {
+                const streamParams = new URLSearchParams(params);
+                streamParams.append('since', logCursor);
+                const source = new EventSource(`/status/${requestId}/stream?${streamParams}`);
+                source.addEventListener('log', event => {
+                    const log = JSON.parse(event.data);
+                    if (log.seq < logCursor) return;
+                    appendLogs([log.message]);
+                    logCursor = log.seq + 1;
+                });
+                source.addEventListener('status', event => showStatus(JSON.parse(event.data)));
+                source.addEventListener('complete', event => {
+                    source.close();
+                    finish(JSON.parse(event.data).status);
+                });
+                source.onerror = () => {
+                    // The browser reconnects on its own unless the stream can not be opened
+                    if (source.readyState === EventSource.CLOSED && !finished) {
+                        pollStatus();
+                    }
+                };
+            }
+
+            if (window.EventSource) {
+                streamStatus();
+            } else {
+                pollStatus();
             }
-            pollStatus();
         }
     } catch (err) {
         alert(`❌ Error: ${err.message}`);
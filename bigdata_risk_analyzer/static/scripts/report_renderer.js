@@ -10,7 +10,9 @@ function adaptRiskDataToThemeFormat(riskData) {
     const adapted = {
         theme_scoring: {},
         theme_taxonomy: riskData.risk_taxonomy || {},
-        content: riskData.content || []
+        content: riskData.content || [],
+        // Set when the evidence is loaded from the server instead of being part of the report
+        content_source: riskData.content_source || null
     };
     
     // Transform each company's risk data to theme format
@@ -88,7 +90,10 @@ function renderScreenerReport(rawData) {
         }
 
         // Evidence tab - Filterable table
-        if (data.content) {
+        if (data.content_source) {
+            window.tabController.setLoadingState('evidence', false);
+            renderEvidenceTable(null, data.content_source);
+        } else if (data.content) {
             window.tabController.setLoadingState('evidence', false);
             renderEvidenceTable(data.content);
         }
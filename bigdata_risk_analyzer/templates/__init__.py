@@ -1,7 +1,12 @@
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 from bigdata_risk_analyzer.settings import settings
 
-loader = Environment(loader=FileSystemLoader(searchpath=Path(settings.TEMPLATES_DIR)))
+# Compiled templates are cached in the temporary directory, so they are only compiled
+# once across restarts and worker processes
+loader = Environment(
+    loader=FileSystemLoader(searchpath=Path(settings.TEMPLATES_DIR)),
+    bytecode_cache=FileSystemBytecodeCache(),
+)
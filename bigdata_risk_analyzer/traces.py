@@ -3,6 +3,8 @@ from enum import StrEnum
 from bigdata_client.tracking_services import TraceEvent
 from bigdata_client.tracking_services import send_trace as bigdata_send_trace
 
+from bigdata_risk_analyzer.backends import RecordedBigdata
+
 
 class TraceEventName(StrEnum):
     SERVICE_START = "onPremRiskAnalyzerServiceStart"
@@ -10,6 +12,11 @@ class TraceEventName(StrEnum):
 
 
 def send_trace(bigdata_client, event_name: TraceEventName, trace: dict):
+    if isinstance(bigdata_client, RecordedBigdata):
+        # Traces go to the live client when recording, none are sent when replaying
+        if bigdata_client.bigdata is None:
+            return
+        bigdata_client = bigdata_client.bigdata
     try:
         bigdata_send_trace(
             bigdata_client=bigdata_client,
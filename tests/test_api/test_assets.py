@@ -0,0 +1,130 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from bigdata_risk_analyzer.api.assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    StaticAssets,
+    build_assets,
+)
+
+REPORT = b'{"risk_scoring": {}, "content": []}' * 100
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    static_dir = tmp_path / "static"
+    (static_dir / "data").mkdir(parents=True)
+    (static_dir / "data" / "report.json").write_bytes(REPORT)
+    (static_dir / "small.js").write_bytes(b"console.log('small');")
+    (static_dir / "random.bin").write_bytes(os.urandom(4096))
+    return static_dir
+
+
+@pytest.fixture
+def client(static_dir, tmp_path):
+    app = FastAPI()
+    static_assets = StaticAssets(static_dir, tmp_path / "build")
+    app.mount("/static", static_assets, name="static")
+    return TestClient(app), static_assets
+
+
+def test_build_assets(static_dir, tmp_path):
+    build_dir = tmp_path / "build"
+    assets = build_assets(static_dir, build_dir)
+
+    report = assets["data/report.json"]
+    assert report.fingerprinted_path == f"data/report.{report.digest}.json"
+    assert gzip.decompress(report.variants["gzip"].read_bytes()) == REPORT
+    assert brotli.decompress(report.variants["br"].read_bytes()) == REPORT
+    # Small and incompressible files are served as they are
+    assert assets["small.js"].variants == {}
+    assert assets["random.bin"].variants == {}
+
+    # Variants of changed files are rebuilt, the old ones are only deleted when pruning,
+    # as other server processes may still serve them
+    (static_dir / "data" / "report.json").write_bytes(REPORT * 2)
+    rebuilt = build_assets(static_dir, build_dir)["data/report.json"]
+    assert rebuilt.digest != report.digest
+    assert report.variants["gzip"].exists()
+    assert gzip.decompress(rebuilt.variants["gzip"].read_bytes()) == REPORT * 2
+    build_assets(static_dir, build_dir, prune=True)
+    assert not report.variants["gzip"].exists()
+    assert rebuilt.variants["gzip"].exists()
+    # No temporary file is left behind
+    assert not list(build_dir.rglob(".*"))
+
+
+def test_concurrent_builds(static_dir, tmp_path):
+    # Every server process builds the missing variants on startup
+    build_dir = tmp_path / "build"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        builds = list(
+            executor.map(lambda _: build_assets(static_dir, build_dir), range(4))
+        )
+    for assets in builds:
+        variant = assets["data/report.json"].variants["gzip"]
+        assert gzip.decompress(variant.read_bytes()) == REPORT
+    assert not list(build_dir.rglob(".*"))
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,encoding",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip;q=0.5", "gzip"),
+        ("*", "br"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate(static_dir, tmp_path, accept_encoding, encoding):
+    asset = build_assets(static_dir, tmp_path / "build")["data/report.json"]
+    assert asset.negotiate(accept_encoding)[0] == encoding
+
+
+def test_fingerprinted_assets_are_immutable(client):
+    client, static_assets = client
+    url = static_assets.url("data/report.json")
+    assert url.startswith("/static/data/report.")
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == REPORT
+
+    not_modified = client.get(
+        url,
+        headers={
+            "Accept-Encoding": "gzip",
+            "If-None-Match": response.headers["etag"],
+        },
+    )
+    assert not_modified.status_code == 304
+    # Each variant has its own ETag
+    other_variant = client.get(
+        url,
+        headers={"Accept-Encoding": "br", "If-None-Match": response.headers["etag"]},
+    )
+    assert other_variant.status_code == 200
+    assert other_variant.headers["content-encoding"] == "br"
+
+
+def test_unversioned_assets_are_revalidated(client):
+    client, static_assets = client
+    response = client.get("/static/data/report.json")
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert response.content == REPORT
+
+    assert static_assets.url("missing.js") == "/static/missing.js"
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/small.0123456789ab.js").status_code == 404
@@ -0,0 +1,66 @@
+import asyncio
+from threading import Thread
+from uuid import uuid4
+
+from bigdata_risk_analyzer.api.events import EventHub, WorkflowEventType
+from bigdata_risk_analyzer.api.models import WorkflowStatus
+
+
+def test_publish_from_another_thread():
+    async def main():
+        hub = EventHub()
+        request_id = uuid4()
+        subscription = hub.subscribe(request_id)
+
+        def publisher():
+            hub.publish_log(request_id, 0, "message", "info")
+            hub.publish_status(request_id, WorkflowStatus.COMPLETED)
+
+        Thread(target=publisher).start()
+        events = [
+            await asyncio.wait_for(subscription.queue.get(), timeout=5)
+            for _ in range(3)
+        ]
+        hub.unsubscribe(subscription)
+        return events
+
+    events = asyncio.run(main())
+    assert [event.type for event in events] == [
+        WorkflowEventType.LOG,
+        WorkflowEventType.STATUS,
+        WorkflowEventType.COMPLETE,
+    ]
+    assert events[0].data == {"seq": 0, "message": "message", "level": "info"}
+
+
+def test_history_for_late_subscribers():
+    async def main():
+        hub = EventHub(history_size=2)
+        request_id = uuid4()
+        for seq in range(3):
+            hub.publish_log(request_id, seq, f"message {seq}", "info")
+        late = hub.subscribe(request_id)
+
+        hub.publish_status(request_id, WorkflowStatus.COMPLETED)
+        after_completion = hub.subscribe(request_id)
+        return late, after_completion
+
+    late, after_completion = asyncio.run(main())
+    assert [event.data["seq"] for event in late.history] == [1, 2]
+    assert after_completion.history == []
+
+
+def test_slow_subscriber_overflows():
+    async def main():
+        hub = EventHub(queue_size=1)
+        request_id = uuid4()
+        subscription = hub.subscribe(request_id)
+        hub.publish_log(request_id, 0, "first", "info")
+        hub.publish_log(request_id, 1, "second", "info")
+        # Let the event loop run the scheduled callbacks
+        await asyncio.sleep(0)
+        return subscription
+
+    subscription = asyncio.run(main())
+    assert subscription.overflowed
+    assert subscription.queue.qsize() == 1
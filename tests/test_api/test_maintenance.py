@@ -0,0 +1,215 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlmodel import SQLModel, col, select, update
+
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.api.maintenance import DatabaseMaintenance
+from bigdata_risk_analyzer.api.models import (
+    FrequencyEnum,
+    RiskAnalysisRequest,
+    WorkflowStatus,
+)
+from bigdata_risk_analyzer.api.sql_models import (
+    SQLBatch,
+    SQLTaxonomy,
+    SQLWorkflowStatus,
+)
+from bigdata_risk_analyzer.api.storage import StorageManager
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+from bigdata_risk_analyzer.models import (
+    CompanyScoring,
+    RiskAnalysisResponse,
+    RiskScore,
+    RiskScoring,
+    RiskTaxonomy,
+)
+
+
+@pytest.fixture
+def storage_manager(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    return StorageManager(engine)
+
+
+@pytest.fixture
+def request_model():
+    return RiskAnalysisRequest(
+        main_theme="US Import Tariffs against China",
+        focus="Taxonomy of risks for US companies",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        frequency=FrequencyEnum.monthly,
+    )
+
+
+@pytest.fixture
+def report():
+    return RiskAnalysisResponse(
+        risk_scoring=RiskScoring(
+            root={
+                "A": CompanyScoring(
+                    ticker="T1",
+                    sector="S1",
+                    industry="I1",
+                    composite_score=5,
+                    motivation="Growth",
+                    risks=RiskScore(root={"Risk1": 5}),
+                )
+            }
+        ),
+        risk_taxonomy=RiskTaxonomy(label="Root", node=1, summary="Root node"),
+    )
+
+
+def set_last_updated(storage_manager, request_id, last_updated):
+    with storage_manager._session() as session:
+        session.exec(
+            update(SQLWorkflowStatus)
+            .where(col(SQLWorkflowStatus.id) == request_id)
+            .values(last_updated=last_updated)
+        )
+        session.commit()
+
+
+def pruned_count(status: WorkflowStatus) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "risk_analyzer_pruned_workflows_total", {"status": status}
+        )
+        or 0
+    )
+
+
+def test_retention_and_archival(tmp_path, storage_manager, request_model, report):
+    old = datetime.now() - timedelta(days=40)
+    old_completed, old_failed, old_queued, recent_failed = (uuid4() for _ in range(4))
+    for request_id in (old_completed, old_failed, old_queued, recent_failed):
+        storage_manager.enqueue_job(request_id, request_model)
+        storage_manager.log_message(request_id, "Started")
+    storage_manager.mark_workflow_as_completed(old_completed, request_model, report)
+    for request_id in (old_failed, recent_failed):
+        storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+    for request_id in (old_completed, old_failed, old_queued):
+        set_last_updated(storage_manager, request_id, old)
+
+    checkpoints = CheckpointStore(tmp_path / "checkpoints")
+    checkpoints.save(old_failed, "taxonomy", {"label": "Root"})
+    maintenance = DatabaseMaintenance(
+        storage_manager,
+        retention_days={WorkflowStatus.COMPLETED: 30, WorkflowStatus.FAILED: 30},
+        archive_dir=tmp_path / "archive",
+        checkpoints=checkpoints,
+        batch_size=1,
+    )
+    pruned_failed = pruned_count(WorkflowStatus.FAILED)
+
+    assert maintenance.run() == {
+        WorkflowStatus.COMPLETED: 1,
+        WorkflowStatus.FAILED: 1,
+    }
+    assert pruned_count(WorkflowStatus.FAILED) == pruned_failed + 1
+    # Unfinished and recent workflows are kept
+    for request_id in (old_completed, old_failed):
+        assert storage_manager.get_status(request_id) is None
+        assert storage_manager.get_job_request(request_id) is None
+    assert storage_manager.get_analysis_report(old_completed) is None
+    assert storage_manager.get_status(old_queued) == WorkflowStatus.QUEUED
+    assert storage_manager.get_status(recent_failed) == WorkflowStatus.FAILED
+    assert checkpoints.names(old_failed) == []
+
+    archive = tmp_path / "archive" / f"{old:%Y-%m}" / f"{old_completed}.json.gz"
+    document = json.loads(gzip.decompress(archive.read_bytes()))
+    assert document["status"] == WorkflowStatus.COMPLETED
+    assert document["logs"] == ["Started"]
+    assert document["request"]["main_theme"] == request_model.main_theme
+    assert (
+        RiskAnalysisResponse.model_validate(document["report"]).risk_scoring
+        == report.risk_scoring
+    )
+    assert (tmp_path / "archive" / f"{old:%Y-%m}" / f"{old_failed}.json.gz").exists()
+
+    # Nothing left to prune
+    assert maintenance.run() == {
+        WorkflowStatus.COMPLETED: 0,
+        WorkflowStatus.FAILED: 0,
+    }
+
+
+def test_orphaned_batches_and_taxonomies(storage_manager, request_model, report):
+    old = datetime.now() - timedelta(days=40)
+    pruned_id, kept_id = uuid4(), uuid4()
+    taxonomy_ids = {}
+    for request_id in (pruned_id, kept_id):
+        taxonomy_ids[request_id] = storage_manager.save_taxonomy(
+            request_model, report.risk_taxonomy
+        )
+        storage_manager.enqueue_job(request_id, request_model)
+        storage_manager.mark_workflow_as_completed(
+            request_id,
+            request_model,
+            report.model_copy(update={"taxonomy_id": taxonomy_ids[request_id]}),
+        )
+    set_last_updated(storage_manager, pruned_id, old)
+    pruned_batch, kept_batch = uuid4(), uuid4()
+    with storage_manager._session() as session:
+        session.add(SQLBatch(id=pruned_batch, request_ids=[str(pruned_id)]))
+        session.add(SQLBatch(id=kept_batch, request_ids=[str(pruned_id), str(kept_id)]))
+        session.exec(update(SQLTaxonomy).values(created_at=old))
+        session.commit()
+    # Not referenced yet, the report generated with it may still be being stored
+    recent_taxonomy = storage_manager.save_taxonomy(request_model, report.risk_taxonomy)
+    maintenance = DatabaseMaintenance(
+        storage_manager,
+        retention_days={WorkflowStatus.COMPLETED: 30},
+        batch_size=1,
+    )
+
+    assert maintenance.run() == {WorkflowStatus.COMPLETED: 1}
+    with storage_manager._session() as session:
+        assert set(session.exec(select(SQLBatch.id)).all()) == {kept_batch}
+    assert storage_manager.get_taxonomy(taxonomy_ids[pruned_id]) is None
+    assert storage_manager.get_taxonomy(taxonomy_ids[kept_id]) is not None
+    assert storage_manager.get_taxonomy(recent_taxonomy) is not None
+
+
+def test_zero_retention_keeps_workflows(storage_manager, request_model, report):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+    set_last_updated(storage_manager, request_id, datetime(2020, 1, 1))
+    maintenance = DatabaseMaintenance(
+        storage_manager, retention_days={WorkflowStatus.COMPLETED: 0}
+    )
+
+    assert maintenance.run() == {}
+    assert storage_manager.get_status(request_id) == WorkflowStatus.COMPLETED
+    db_size = REGISTRY.get_sample_value("risk_analyzer_db_size_bytes")
+    assert db_size is not None and db_size > 0
+
+
+def test_retention_of_unfinished_workflows_is_rejected(storage_manager):
+    with pytest.raises(ValueError):
+        DatabaseMaintenance(storage_manager, retention_days={WorkflowStatus.QUEUED: 1})
+
+
+def test_resumed_workflows_are_not_deleted(storage_manager, request_model):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    before = datetime.now() + timedelta(seconds=1)
+    # Resumed between the lookup of the expired workflows and their deletion
+    storage_manager.update_status(request_id, WorkflowStatus.QUEUED)
+
+    assert (
+        storage_manager.delete_expired_workflows(
+            [request_id], WorkflowStatus.FAILED, before
+        )
+        == []
+    )
+    assert storage_manager.get_status(request_id) == WorkflowStatus.QUEUED
@@ -0,0 +1,312 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Uuid,
+    inspect,
+)
+from sqlmodel import Session, SQLModel, select
+
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.api.migrations import migrate
+from bigdata_risk_analyzer.api.models import (
+    FrequencyEnum,
+    ReportListFilters,
+    RiskAnalysisRequest,
+    WorkflowStatus,
+)
+from bigdata_risk_analyzer.api.sql_models import SQLReportScore
+from bigdata_risk_analyzer.api.storage import AsyncStorageManager, StorageManager
+from bigdata_risk_analyzer.models import (
+    CompanyScoring,
+    LabeledChunk,
+    LabeledContent,
+    RiskAnalysisResponse,
+    RiskScore,
+    RiskScoring,
+    RiskTaxonomy,
+)
+
+# Tables as created by the first versions of the service
+legacy_metadata = MetaData()
+legacy_status = Table(
+    "sqlworkflowstatus",
+    legacy_metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("last_updated", DateTime, nullable=False),
+    Column("status", String, nullable=False),
+    Column("logs", JSON),
+)
+legacy_report = Table(
+    "sqlriskanalyzerreport",
+    legacy_metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("companies", JSON),
+    Column("llm_model", String, nullable=False),
+    Column("theme", String, nullable=False),
+    Column("focus", String),
+    Column("start_date", DateTime, nullable=False),
+    Column("end_date", DateTime, nullable=False),
+    Column("document_type", String, nullable=False),
+    Column("fiscal_year", JSON),
+    Column("rerank_threshold", Float),
+    Column("frequency", String, nullable=False),
+    Column("document_limit", Integer, nullable=False),
+    Column("batch_size", Integer, nullable=False),
+    Column("screener_report", JSON),
+)
+
+legacy_job = Table(
+    "sqljob",
+    legacy_metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("request_hash", String, nullable=False),
+    Column("request", JSON),
+)
+
+
+@pytest.fixture
+def report():
+    return RiskAnalysisResponse(
+        risk_scoring=RiskScoring(
+            root={
+                "Acme": CompanyScoring(
+                    ticker="ACM",
+                    sector="S1",
+                    industry="I1",
+                    composite_score=3,
+                    motivation="Tariffs",
+                    risks=RiskScore(root={"Input Costs": 3}),
+                )
+            }
+        ),
+        risk_taxonomy=RiskTaxonomy(label="Root", node=1, summary="Root node"),
+        content=LabeledContent(
+            root=[
+                LabeledChunk(
+                    time_period="Jun 2025",
+                    date=f"2025-06-{day:02d}",
+                    company="Acme",
+                    sector="S1",
+                    industry="I1",
+                    country="US",
+                    ticker="ACM",
+                    document_id=f"DOC{day}",
+                    headline=f"Headline {day}",
+                    quote="Quote",
+                    motivation="Motivation",
+                    sub_scenario="Input Costs",
+                    risk_channel="Supply Chain Risk/Input Costs",
+                    risk_factor="Supply Chain Risk",
+                    highlights=[],
+                )
+                for day in (1, 2)
+            ]
+        ),
+    )
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+
+def upgrade(engine):
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)
+
+
+def test_migrate_legacy_logs(engine):
+    legacy_metadata.create_all(engine)
+    request_id, empty_id = uuid4(), uuid4()
+    with engine.begin() as connection:
+        connection.execute(
+            legacy_status.insert(),
+            [
+                {
+                    "id": request_id,
+                    "last_updated": datetime(2025, 6, 1),
+                    "status": WorkflowStatus.COMPLETED,
+                    "logs": ["first", "second"],
+                },
+                {
+                    "id": empty_id,
+                    "last_updated": datetime(2025, 6, 1),
+                    "status": WorkflowStatus.FAILED,
+                    "logs": [],
+                },
+            ],
+        )
+
+    upgrade(engine)
+    # Running it again is a no-op
+    upgrade(engine)
+
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("sqlworkflowstatus")}
+    assert "logs" not in columns
+    indexes = {index["name"] for index in inspector.get_indexes("sqlworkflowstatus")}
+    assert "ix_sqlworkflowstatus_status" in indexes
+
+    storage_manager = StorageManager(engine)
+    assert storage_manager.get_logs(request_id) == ["first", "second"]
+    assert storage_manager.get_logs(empty_id) == []
+    assert storage_manager.get_status(request_id) == WorkflowStatus.COMPLETED
+
+    # New messages are appended after the moved ones
+    storage_manager.log_message(request_id, "third")
+    storage_manager.flush_logs()
+    assert storage_manager.get_logs(request_id) == ["first", "second", "third"]
+
+
+def test_migrate_adds_missing_columns(engine):
+    legacy_metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE sqlcachedentity (kind VARCHAR NOT NULL, "
+            "entity_id VARCHAR NOT NULL, PRIMARY KEY (kind, entity_id))"
+        )
+
+    upgrade(engine)
+
+    columns = {
+        column["name"] for column in inspect(engine).get_columns("sqlcachedentity")
+    }
+    assert columns == {"kind", "entity_id", "data", "expires_at"}
+    indexes = {
+        index["name"] for index in inspect(engine).get_indexes("sqlcachedentity")
+    }
+    assert indexes == {"ix_sqlcachedentity_expires_at"}
+
+
+def insert_legacy_report(connection, request_id, report):
+    connection.execute(
+        legacy_report.insert(),
+        {
+            "id": request_id,
+            "created_at": datetime(2025, 6, 1),
+            "companies": "W1",
+            "llm_model": "openai::gpt-4o-mini",
+            "theme": "US Import Tariffs",
+            "start_date": datetime(2025, 3, 1),
+            "end_date": datetime(2025, 6, 1),
+            "document_type": "NEWS",
+            "frequency": "M",
+            "document_limit": 10,
+            "batch_size": 10,
+            "screener_report": report.model_dump(mode="json"),
+        },
+    )
+
+
+def test_migrate_legacy_reports(engine, report):
+    legacy_metadata.create_all(engine)
+    request_id = uuid4()
+    with engine.begin() as connection:
+        connection.execute(
+            legacy_status.insert(),
+            {
+                "id": request_id,
+                "last_updated": datetime(2025, 6, 1),
+                "status": WorkflowStatus.COMPLETED,
+                "logs": [],
+            },
+        )
+        insert_legacy_report(connection, request_id, report)
+
+    upgrade(engine)
+    upgrade(engine)
+
+    columns = {
+        column["name"]
+        for column in inspect(engine).get_columns("sqlriskanalyzerreport")
+    }
+    assert "screener_report" not in columns
+
+    storage_manager = StorageManager(engine)
+    assert storage_manager.get_analysis_report(request_id) == report
+    assert storage_manager.get_analysis_report(
+        request_id, include_content=False
+    ) == report.model_copy(update={"content": None})
+    with Session(engine) as session:
+        scores = session.exec(select(SQLReportScore.risk, SQLReportScore.score)).all()
+    assert set(scores) == {(None, 3), ("Input Costs", 3)}
+
+
+def test_migrate_legacy_jobs(engine, report):
+    legacy_metadata.create_all(engine)
+    queued_id, completed_id = uuid4(), uuid4()
+    request = RiskAnalysisRequest(
+        main_theme="Energy Transition",
+        focus="Focus",
+        companies=["4A6F00"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        frequency=FrequencyEnum.monthly,
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            legacy_status.insert(),
+            [
+                {
+                    "id": request_id,
+                    "last_updated": datetime(2025, 6, 1),
+                    "status": status,
+                    "logs": [],
+                }
+                for request_id, status in (
+                    (queued_id, WorkflowStatus.QUEUED),
+                    (completed_id, WorkflowStatus.COMPLETED),
+                )
+            ],
+        )
+        # Jobs were stored without their metadata columns, and not at all before
+        connection.execute(
+            legacy_job.insert(),
+            {
+                "id": queued_id,
+                "created_at": datetime(2025, 8, 2),
+                "request_hash": request.request_hash(),
+                "request": request.model_dump(mode="json"),
+            },
+        )
+        insert_legacy_report(connection, completed_id, report)
+
+    upgrade(engine)
+    upgrade(engine)
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("sqljob")}
+    assert "ix_sqljob_theme_created_at_id" in indexes
+
+    async_storage_manager = AsyncStorageManager(engine)
+    page = asyncio.run(async_storage_manager.list_reports(ReportListFilters()))
+    assert [summary.request_id for summary in page.items] == [queued_id, completed_id]
+    queued, completed = page.items
+    assert (queued.theme, queued.start_date, queued.watchlist_id) == (
+        "Energy Transition",
+        "2025-06-01",
+        None,
+    )
+    assert (completed.theme, completed.start_date, completed.watchlist_id) == (
+        "US Import Tariffs",
+        "2025-03-01",
+        "W1",
+    )
+    assert completed.content_size == 2
+
+    page = asyncio.run(
+        async_storage_manager.list_reports(ReportListFilters(watchlist="W1"))
+    )
+    assert [summary.request_id for summary in page.items] == [completed_id]
@@ -130,3 +130,57 @@ def test_risk_analysis_request_model(
         assert req.rerank_threshold == rerank_threshold
     if fiscal_year:
         assert req.fiscal_year == fiscal_year
+
+
+def test_request_hash():
+    base = dict(
+        main_theme="US Import Tariffs against China",
+        focus="Taxonomy of risks for US companies",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        frequency=FrequencyEnum.monthly,
+    )
+    request = RiskAnalysisRequest.model_validate(base)
+
+    # The order of the companies does not change the hash
+    reordered = RiskAnalysisRequest.model_validate(
+        {**base, "companies": ["D8442A", "4A6F00"]}
+    )
+    assert request.request_hash() == reordered.request_hash()
+    # Neither does the parallelism
+    sharded = RiskAnalysisRequest.model_validate({**base, "parallelism": 4})
+    assert request.request_hash() == sharded.request_hash()
+
+    # Any other parameter does
+    other_window = RiskAnalysisRequest.model_validate(
+        {**base, "end_date": "2025-09-01"}
+    )
+    assert request.request_hash() != other_window.request_hash()
+
+
+def test_taxonomy_hash():
+    base = dict(
+        main_theme="US Import Tariffs against China",
+        focus="Taxonomy of risks for US companies",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        frequency=FrequencyEnum.monthly,
+    )
+    request = RiskAnalysisRequest.model_validate(base)
+
+    # Only the theme, focus and model the taxonomy is generated from change the hash
+    other_universe = RiskAnalysisRequest.model_validate(
+        {**base, "companies": ["4A6F00"], "end_date": "2025-09-01"}
+    )
+    assert request.taxonomy_hash() == other_universe.taxonomy_hash()
+
+    other_focus = RiskAnalysisRequest.model_validate(
+        {**base, "focus": "Supply chain risks"}
+    )
+    assert request.taxonomy_hash() != other_focus.taxonomy_hash()
+    other_model = RiskAnalysisRequest.model_validate(
+        {**base, "llm_model": "openai::gpt-4o"}
+    )
+    assert request.taxonomy_hash() != other_model.taxonomy_hash()
@@ -0,0 +1,93 @@
+from threading import Event
+from uuid import uuid4
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bigdata_risk_analyzer.api.scheduler import JobScheduler, QueueFullError
+
+
+def test_submit_and_position():
+    scheduler = JobScheduler(job_fn=lambda request_id: None, max_queue_size=3)
+    ids = [uuid4() for _ in range(3)]
+    for i, request_id in enumerate(ids):
+        assert scheduler.submit(request_id) == i + 1
+
+    assert scheduler.queue_depth == 3
+    assert scheduler.position(ids[1]) == 2
+    assert scheduler.position(uuid4()) is None
+    # Submitting the same job twice does not queue it again
+    assert scheduler.submit(ids[0]) == 1
+    assert scheduler.queue_depth == 3
+
+
+def test_queue_full():
+    scheduler = JobScheduler(job_fn=lambda request_id: None, max_queue_size=1)
+    scheduler.submit(uuid4())
+    with pytest.raises(QueueFullError):
+        scheduler.submit(uuid4())
+    # Forced submissions bypass admission control
+    scheduler.submit(uuid4(), force=True)
+    assert scheduler.queue_depth == 2
+
+
+def test_workers_run_jobs():
+    done = {uuid4(): Event() for _ in range(4)}
+
+    def job_fn(request_id):
+        done[request_id].set()
+
+    scheduler = JobScheduler(job_fn=job_fn, max_workers=2)
+    scheduler.start()
+    try:
+        for request_id in done:
+            scheduler.submit(request_id)
+        for event in done.values():
+            assert event.wait(timeout=5)
+    finally:
+        scheduler.shutdown(wait=True)
+    assert scheduler.queue_depth == 0
+
+
+def test_failing_job_does_not_stop_worker():
+    finished = Event()
+    failing, succeeding = uuid4(), uuid4()
+
+    def job_fn(request_id):
+        if request_id == failing:
+            raise RuntimeError("boom")
+        finished.set()
+
+    scheduler = JobScheduler(job_fn=job_fn, max_workers=1)
+    scheduler.start()
+    try:
+        scheduler.submit(failing)
+        scheduler.submit(succeeding)
+        assert finished.wait(timeout=5)
+    finally:
+        scheduler.shutdown(wait=True)
+
+
+def test_queue_metrics():
+    started, release = Event(), Event()
+
+    def job_fn(request_id):
+        started.set()
+        release.wait(timeout=5)
+
+    def sample(name):
+        return REGISTRY.get_sample_value(name) or 0.0
+
+    waits = sample("risk_analyzer_queue_wait_seconds_count")
+    in_progress = sample("risk_analyzer_jobs_in_progress")
+    scheduler = JobScheduler(job_fn=job_fn, max_workers=1)
+    scheduler.start()
+    try:
+        scheduler.submit(uuid4())
+        assert started.wait(timeout=5)
+        assert sample("risk_analyzer_jobs_in_progress") == in_progress + 1
+        assert sample("risk_analyzer_queue_wait_seconds_count") == waits + 1
+    finally:
+        release.set()
+        scheduler.shutdown(wait=True)
+    assert sample("risk_analyzer_jobs_in_progress") == in_progress
@@ -0,0 +1,708 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlmodel import SQLModel
+
+from bigdata_risk_analyzer.api.db import create_async_db_engine, create_db_engine
+from bigdata_risk_analyzer.api.models import (
+    FrequencyEnum,
+    ReportContentFilters,
+    ReportListFilters,
+    RiskAnalysisRequest,
+    ScoreFilters,
+    ScoreGroupBy,
+    ScoreInterval,
+    WorkflowStatus,
+)
+from bigdata_risk_analyzer.api.sql_models import SQLWorkflowLog
+from bigdata_risk_analyzer.api.storage import (
+    AsyncStorageManager,
+    BufferedLogWriter,
+    StorageManager,
+)
+from bigdata_risk_analyzer.models import (
+    CompanyScoring,
+    LabeledChunk,
+    LabeledContent,
+    RiskAnalysisResponse,
+    RiskScore,
+    RiskScoring,
+    RiskTaxonomy,
+)
+
+
+@pytest.fixture
+def storage_manager():
+    engine = create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return StorageManager(engine, log_flush_interval=60)
+
+
+@pytest.fixture
+def request_model():
+    return RiskAnalysisRequest(
+        main_theme="US Import Tariffs against China",
+        focus="Taxonomy of risks for US companies",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        frequency=FrequencyEnum.monthly,
+    )
+
+
+@pytest.fixture
+def report():
+    return RiskAnalysisResponse(
+        risk_scoring=RiskScoring(
+            root={
+                "A": CompanyScoring(
+                    ticker="T1",
+                    sector="S1",
+                    industry="I1",
+                    composite_score=5,
+                    motivation="Growth",
+                    risks=RiskScore(root={"Risk1": 5}),
+                )
+            }
+        ),
+        risk_taxonomy=RiskTaxonomy(label="Root", node=1, summary="Root node"),
+    )
+
+
+def test_enqueue_job(storage_manager, request_model):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+
+    assert storage_manager.get_status(request_id) == WorkflowStatus.QUEUED
+    assert storage_manager.get_job_request(request_id) == request_model
+    assert storage_manager.get_job_request(uuid4()) is None
+
+
+def test_get_unfinished_jobs(storage_manager, request_model):
+    queued, running, completed = uuid4(), uuid4(), uuid4()
+    for request_id in (queued, running, completed):
+        storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.update_status(running, WorkflowStatus.IN_PROGRESS)
+    storage_manager.update_status(completed, WorkflowStatus.COMPLETED)
+
+    assert storage_manager.get_unfinished_jobs() == [queued, running]
+
+
+def test_find_inflight_job(storage_manager, request_model):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    request_hash = request_model.request_hash()
+
+    assert storage_manager.find_inflight_job(request_hash) == request_id
+    assert storage_manager.find_inflight_job("other-hash") is None
+
+    storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+    assert storage_manager.find_inflight_job(request_hash) is None
+
+
+def test_find_cached_report(storage_manager, request_model, report):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    request_hash = request_model.request_hash()
+    assert storage_manager.find_cached_report(request_hash, timedelta(hours=1)) is None
+
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+    assert (
+        storage_manager.find_cached_report(request_hash, timedelta(hours=1))
+        == request_id
+    )
+    assert storage_manager.find_cached_report(request_hash, timedelta(0)) is None
+
+
+def log_entry(seq: int) -> SQLWorkflowLog:
+    return SQLWorkflowLog(
+        request_id=uuid4(),
+        seq=seq,
+        timestamp=datetime.now(),
+        level="INFO",
+        message=f"Message {seq}",
+    )
+
+
+def test_buffered_log_writer_flushes_on_size():
+    batches = []
+    writer = BufferedLogWriter(batches.append, max_size=2, flush_interval=60)
+    first, second = log_entry(0), log_entry(1)
+    writer.append(first)
+    assert batches == []
+    writer.append(second)
+    assert batches == [[first, second]]
+
+
+def test_buffered_log_writer_flushes_on_interval():
+    batches = []
+    writer = BufferedLogWriter(batches.append, max_size=100, flush_interval=0.05)
+    entry = log_entry(0)
+    writer.append(entry)
+    time.sleep(0.5)
+    assert batches == [[entry]]
+
+
+def test_log_message(storage_manager, request_model):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.log_message(request_id, "first")
+    storage_manager.log_message(request_id, "second")
+    # Messages are buffered until flushed
+    assert storage_manager.get_logs(request_id) == []
+
+    storage_manager.flush_logs()
+    assert storage_manager.get_logs(request_id) == ["first", "second"]
+
+    # Status changes flush the pending messages
+    storage_manager.log_message(request_id, "third")
+    storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+    assert storage_manager.get_report(request_id).logs == ["first", "second", "third"]
+
+
+def test_log_message_unknown_request(storage_manager):
+    with pytest.raises(ValueError):
+        storage_manager.log_message(uuid4(), "message")
+
+
+def test_get_report_since_cursor(storage_manager, request_model, report):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    for message in ("first", "second", "third"):
+        storage_manager.log_message(request_id, message)
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+
+    status = storage_manager.get_report(request_id, include_report=False)
+    assert status.logs == ["first", "second", "third"]
+    assert status.log_cursor == 3
+    assert status.report is None
+
+    status = storage_manager.get_report(request_id, since=2)
+    assert status.logs == ["third"]
+    assert status.report == report
+
+    status = storage_manager.get_report(request_id, since=3)
+    assert status.logs == []
+    assert status.log_cursor == 3
+
+    assert storage_manager.get_analysis_report(request_id) == report
+    assert storage_manager.get_report_version(request_id) is not None
+    assert storage_manager.get_report_version(uuid4()) is None
+
+
+def test_logs_flushed_from_another_thread(storage_manager, request_model):
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.log_writer.flush_interval = 0.05
+    storage_manager.log_message(request_id, "first")
+    time.sleep(0.5)
+
+    assert storage_manager.get_logs(request_id) == ["first"]
+
+
+def test_async_storage_manager(tmp_path, request_model, report):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            request_id = uuid4()
+            await async_storage_manager.enqueue_job(request_id, request_model)
+            assert await async_storage_manager.get_status(request_id) == (
+                WorkflowStatus.QUEUED
+            )
+            request_hash = request_model.request_hash()
+            assert await async_storage_manager.find_inflight_job(request_hash) == (
+                request_id
+            )
+
+            # Progress is written by the workflow with the sync storage manager
+            storage_manager.log_message(request_id, "first")
+            storage_manager.mark_workflow_as_completed(
+                request_id, request_model, report
+            )
+
+            status = await async_storage_manager.get_report(request_id)
+            assert status.status == WorkflowStatus.COMPLETED
+            assert status.logs == ["first"]
+            assert status.log_cursor == 1
+            assert status.report == report
+            assert await async_storage_manager.get_analysis_report(request_id) == report
+            assert await async_storage_manager.get_report_version(request_id) == (
+                storage_manager.get_report_version(request_id)
+            )
+            assert (
+                await async_storage_manager.find_cached_report(
+                    request_hash, timedelta(hours=1)
+                )
+                == request_id
+            )
+            assert await async_storage_manager.get_report(uuid4()) is None
+
+            taxonomy_id = storage_manager.save_taxonomy(
+                request_model, RiskTaxonomy(label="Root", node=1, summary=None)
+            )
+            assert await async_storage_manager.taxonomy_exists(taxonomy_id)
+            assert not await async_storage_manager.taxonomy_exists(uuid4())
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_async_storage_manager_with_sync_engine(tmp_path, request_model, report):
+    # Databases without an async driver are queried with the sync engine from threads
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    async_storage_manager = AsyncStorageManager(engine)
+    chunks = [
+        LabeledChunk(
+            time_period="Jun 2025",
+            date=f"2025-06-{day:02d}",
+            company="Acme",
+            sector="S1",
+            industry="I1",
+            country="US",
+            ticker="ACM",
+            document_id=f"DOC{day}",
+            headline=f"Headline {day}",
+            quote="Quote",
+            motivation="Motivation",
+            sub_scenario="Input Costs",
+            risk_channel="Supply Chain Risk/Input Costs",
+            risk_factor="Supply Chain Risk",
+            highlights=[],
+        )
+        for day in (1, 2)
+    ]
+    report.content = LabeledContent(root=chunks)
+
+    async def run():
+        request_id = uuid4()
+        await async_storage_manager.enqueue_job(request_id, request_model)
+        assert await async_storage_manager.get_status(request_id) == (
+            WorkflowStatus.QUEUED
+        )
+        storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+        assert await async_storage_manager.requeue_failed_job(request_id)
+        assert not await async_storage_manager.requeue_failed_job(request_id)
+
+        storage_manager.log_message(request_id, "first")
+        storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+        status = await async_storage_manager.get_report(request_id)
+        assert status.status == WorkflowStatus.COMPLETED
+        assert status.logs == ["first"]
+        assert status.report == report
+        assert await async_storage_manager.get_report(uuid4()) is None
+
+        page = await async_storage_manager.get_report_content(
+            request_id, ReportContentFilters(), limit=1
+        )
+        assert page.items == chunks[:1]
+        assert page.total == 2
+        batches = [
+            batch
+            async for batch in async_storage_manager.stream_report_content(
+                request_id, batch_size=1
+            )
+        ]
+        assert [len(batch) for batch in batches] == [1, 1]
+        assert [LabeledChunk(**chunk) for batch in batches for chunk in batch] == (
+            chunks
+        )
+
+    asyncio.run(run())
+
+
+def test_requeue_failed_job(tmp_path, request_model):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            request_id = uuid4()
+            await async_storage_manager.enqueue_job(request_id, request_model)
+            assert not await async_storage_manager.requeue_failed_job(request_id)
+
+            storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+            assert await async_storage_manager.requeue_failed_job(request_id)
+            assert await async_storage_manager.get_status(request_id) == (
+                WorkflowStatus.QUEUED
+            )
+            assert storage_manager.get_unfinished_jobs() == [request_id]
+
+            # Failed workflows without a stored job can not be run again
+            other_id = uuid4()
+            storage_manager.update_status(other_id, WorkflowStatus.FAILED)
+            assert not await async_storage_manager.requeue_failed_job(other_id)
+            assert not await async_storage_manager.requeue_failed_job(uuid4())
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_batch_status(tmp_path, request_model, report):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            first_id, second_id, batch_id = uuid4(), uuid4(), uuid4()
+            other_theme = request_model.model_copy(update={"main_theme": "Other"})
+            # The second request is repeated in the batch and shares its job
+            await async_storage_manager.enqueue_batch(
+                batch_id,
+                [(first_id, request_model), (second_id, other_theme)],
+                [first_id, second_id, second_id],
+            )
+            assert storage_manager.get_unfinished_jobs() == [first_id, second_id]
+
+            status = await async_storage_manager.get_batch_status(batch_id)
+            assert status.status == WorkflowStatus.QUEUED
+            assert [r.request_id for r in status.requests] == [
+                str(first_id),
+                str(second_id),
+                str(second_id),
+            ]
+            assert status.counts[WorkflowStatus.QUEUED] == 2
+
+            storage_manager.update_status(first_id, WorkflowStatus.FAILED)
+            status = await async_storage_manager.get_batch_status(batch_id)
+            assert status.status == WorkflowStatus.IN_PROGRESS
+
+            storage_manager.mark_workflow_as_completed(second_id, other_theme, report)
+            status = await async_storage_manager.get_batch_status(batch_id)
+            assert status.status == WorkflowStatus.FAILED
+            assert status.counts[WorkflowStatus.COMPLETED] == 1
+            assert status.counts[WorkflowStatus.FAILED] == 1
+
+            storage_manager.mark_workflow_as_completed(first_id, request_model, report)
+            status = await async_storage_manager.get_batch_status(batch_id)
+            assert status.status == WorkflowStatus.COMPLETED
+
+            assert await async_storage_manager.get_batch_status(uuid4()) is None
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_taxonomies(storage_manager, request_model, report):
+    taxonomy = RiskTaxonomy(
+        label="Root",
+        node=1,
+        summary=None,
+        children=[RiskTaxonomy(label="Risk1", node=2, summary="Summary")],
+    )
+    taxonomy_hash = request_model.taxonomy_hash()
+    assert storage_manager.find_taxonomy(taxonomy_hash) is None
+
+    first_id = storage_manager.save_taxonomy(request_model, taxonomy)
+    assert storage_manager.get_taxonomy(first_id) == taxonomy
+    assert storage_manager.get_taxonomy(uuid4()) is None
+    time.sleep(0.01)
+    newer = RiskTaxonomy(label="Root", node=1, summary="Other summary")
+    second_id = storage_manager.save_taxonomy(request_model, newer)
+    assert storage_manager.find_taxonomy(taxonomy_hash) == (second_id, newer)
+
+    # Reports keep the ID of the taxonomy they were generated with
+    report.taxonomy_id = first_id
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+    assert storage_manager.get_analysis_report(request_id).taxonomy_id == first_id
+
+
+def test_report_with_content(storage_manager, request_model, report):
+    chunk = LabeledChunk(
+        time_period="2025-06",
+        date="2025-06-15",
+        company="A",
+        sector="S1",
+        industry="I1",
+        country="US",
+        ticker="T1",
+        document_id="DOC1",
+        headline="Headline",
+        quote="Quote",
+        motivation="Motivation",
+        sub_scenario="Sub-scenario",
+        risk_channel="Channel",
+        risk_factor="Risk1",
+        highlights=["Quote"],
+    )
+    report.content = LabeledContent(
+        root=[chunk, chunk.model_copy(update={"document_id": "DOC2"})]
+    )
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+
+    assert storage_manager.get_analysis_report(request_id) == report
+    assert storage_manager.get_report(request_id).report == report
+
+    without_content = storage_manager.get_analysis_report(
+        request_id, include_content=False
+    )
+    assert without_content.risk_scoring == report.risk_scoring
+    assert without_content.risk_taxonomy == report.risk_taxonomy
+    assert without_content.content is None
+
+
+def test_report_content_pages(tmp_path, request_model, report):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+
+    chunks = [
+        LabeledChunk(
+            time_period="Jun 2025",
+            date=f"2025-06-{day:02d}",
+            company=company,
+            sector="S1",
+            industry="I1",
+            country="US",
+            ticker=company[:3].upper(),
+            document_id=f"DOC{day}",
+            headline=f"Headline {day}",
+            quote="Tariffs raised 100% of the costs" if day == 3 else "Quote",
+            motivation="Motivation",
+            sub_scenario="Input Costs" if day % 2 else "Disruptions",
+            risk_channel="Supply Chain Risk/Input Costs",
+            risk_factor="Supply Chain Risk",
+            highlights=[],
+        )
+        for day, company in enumerate(["Acme", "Beta", "Acme", "Beta", "Acme"], 1)
+    ]
+    report.content = LabeledContent(root=chunks)
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request_model)
+    storage_manager.mark_workflow_as_completed(request_id, request_model, report)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            no_filters = ReportContentFilters()
+            page = await async_storage_manager.get_report_content(
+                request_id, no_filters, limit=2
+            )
+            assert page.items == chunks[:2]
+            assert page.total == 5
+            page = await async_storage_manager.get_report_content(
+                request_id, no_filters, cursor=page.next_cursor, limit=2
+            )
+            assert page.items == chunks[2:4]
+            page = await async_storage_manager.get_report_content(
+                request_id, no_filters, cursor=page.next_cursor, limit=2
+            )
+            assert page.items == chunks[4:]
+            assert page.next_cursor is None
+
+            page = await async_storage_manager.get_report_content(
+                request_id,
+                ReportContentFilters(company="Acme", sub_scenario="Input Costs"),
+            )
+            assert page.items == [chunks[0], chunks[2], chunks[4]]
+            assert page.total == 3
+
+            page = await async_storage_manager.get_report_content(
+                request_id,
+                ReportContentFilters(start_date="2025-06-02", end_date="2025-06-03"),
+            )
+            assert page.items == chunks[1:3]
+
+            page = await async_storage_manager.get_report_content(
+                request_id, ReportContentFilters(search="100%")
+            )
+            assert page.items == [chunks[2]]
+
+            batches = [
+                batch
+                async for batch in async_storage_manager.stream_report_content(
+                    request_id, batch_size=2
+                )
+            ]
+            assert [len(batch) for batch in batches] == [2, 2, 1]
+            assert [LabeledChunk(**chunk) for batch in batches for chunk in batch] == (
+                chunks
+            )
+
+            facets = await async_storage_manager.get_report_content_facets(request_id)
+            assert facets.total == 5
+            assert facets.companies == ["Acme", "Beta"]
+            assert facets.sub_scenarios == ["Disruptions", "Input Costs"]
+
+            assert (
+                await async_storage_manager.get_report_content(uuid4(), no_filters)
+                is None
+            )
+            assert (
+                await async_storage_manager.get_report_content_facets(uuid4()) is None
+            )
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_report_scores(tmp_path, request_model, report):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    other_theme = request_model.model_copy(update={"main_theme": "Energy Costs"})
+    higher = report.model_copy(deep=True)
+    higher.risk_scoring.root["A"].composite_score = 9
+    higher.risk_scoring.root["B"] = CompanyScoring(
+        ticker="T2",
+        sector="S1",
+        industry="I2",
+        composite_score=1,
+        motivation=None,
+        risks=RiskScore(root={}),
+    )
+    report_ids = []
+    for request, scored_report in [
+        (request_model, report),
+        (other_theme, report),
+        (request_model, higher),
+    ]:
+        request_id = uuid4()
+        storage_manager.enqueue_job(request_id, request)
+        storage_manager.mark_workflow_as_completed(request_id, request, scored_report)
+        report_ids.append(request_id)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            # Composite scores of a company across reports, most recent first
+            page = await async_storage_manager.get_scores(
+                ScoreFilters(ticker="T1", theme="tariffs"), limit=1
+            )
+            assert [(s.report_id, s.risk, s.score) for s in page.items] == [
+                (report_ids[2], None, 9)
+            ]
+            page = await async_storage_manager.get_scores(
+                ScoreFilters(ticker="T1", theme="tariffs"), cursor=page.next_cursor
+            )
+            assert [s.report_id for s in page.items] == [report_ids[0]]
+            assert page.next_cursor is None
+
+            page = await async_storage_manager.get_scores(ScoreFilters(risk="Risk1"))
+            assert [s.score for s in page.items] == [5, 5, 5]
+            page = await async_storage_manager.get_scores(
+                ScoreFilters(end_date=date.today() - timedelta(days=1))
+            )
+            assert page.items == []
+
+            by_theme = await async_storage_manager.get_score_aggregates(
+                ScoreFilters(), ScoreGroupBy.THEME
+            )
+            assert [
+                (a.group, a.reports, a.count, a.mean_score, a.min_score, a.max_score)
+                for a in by_theme
+            ] == [
+                ("Energy Costs", 1, 1, 5.0, 5, 5),
+                ("US Import Tariffs against China", 2, 3, 5.0, 1, 9),
+            ]
+            by_sector = await async_storage_manager.get_score_aggregates(
+                ScoreFilters(risk="Risk1"), ScoreGroupBy.SECTOR, ScoreInterval.MONTH
+            )
+            assert [(a.group, a.period, a.count) for a in by_sector] == [
+                ("S1", date.today().replace(day=1), 3)
+            ]
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_list_reports(tmp_path, request_model, report):
+    db_string = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_db_engine(db_string)
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    watchlist = request_model.model_copy(
+        update={
+            "companies": "db8f3c2d-3d5a-4c4c-8f0e-5b6a5c2e8d1f",
+            "llm_model": "openai::gpt-4o",
+            "start_date": "2025-01-01",
+            "end_date": "2025-03-01",
+        }
+    )
+    completed_id, queued_id, watchlist_id = uuid4(), uuid4(), uuid4()
+    report = report.model_copy(update={"content": LabeledContent(root=[])})
+    storage_manager.enqueue_job(completed_id, request_model)
+    storage_manager.mark_workflow_as_completed(completed_id, request_model, report)
+    storage_manager.enqueue_job(queued_id, request_model)
+    storage_manager.enqueue_job(watchlist_id, watchlist)
+
+    async def run():
+        async_engine = create_async_db_engine(db_string)
+        async_storage_manager = AsyncStorageManager(async_engine)
+        try:
+            # Most recent first, one page at a time
+            request_ids = []
+            cursor = None
+            for _ in range(3):
+                page = await async_storage_manager.list_reports(
+                    ReportListFilters(), cursor=cursor, limit=1
+                )
+                request_ids += [summary.request_id for summary in page.items]
+                cursor = page.next_cursor
+            assert request_ids == [watchlist_id, queued_id, completed_id]
+            assert cursor is None
+
+            page = await async_storage_manager.list_reports(
+                ReportListFilters(status=WorkflowStatus.COMPLETED)
+            )
+            [summary] = page.items
+            assert summary.request_id == completed_id
+            assert summary.theme == request_model.main_theme
+            assert summary.content_size == 0
+            assert summary.watchlist_id is None
+
+            page = await async_storage_manager.list_reports(
+                ReportListFilters(watchlist=watchlist.companies)
+            )
+            assert [s.request_id for s in page.items] == [watchlist_id]
+            assert page.items[0].content_size is None
+            page = await async_storage_manager.list_reports(
+                ReportListFilters(llm_model=request_model.llm_model)
+            )
+            assert [s.request_id for s in page.items] == [queued_id, completed_id]
+            # Analysis windows overlapping April 2025
+            page = await async_storage_manager.list_reports(
+                ReportListFilters(
+                    start_date=date(2025, 2, 15), end_date=date(2025, 4, 30)
+                )
+            )
+            assert [s.request_id for s in page.items] == [watchlist_id]
+            page = await async_storage_manager.list_reports(
+                ReportListFilters(created_before=date.today() - timedelta(days=1))
+            )
+            assert page.items == []
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,50 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from bigdata_risk_analyzer.api.utils import (
+    compress_json,
+    decompress_json,
+    etag_matches,
+    get_content_etag,
+    get_report_etag,
+)
+
+
+def test_get_report_etag():
+    request_id = uuid4()
+    version = datetime(2025, 1, 1, 12, 0, 0)
+    etag = get_report_etag(request_id, version)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == get_report_etag(request_id, version)
+    assert etag != get_report_etag(request_id, datetime(2025, 1, 2))
+
+
+def test_get_content_etag():
+    etag = get_content_etag("<html></html>")
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == get_content_etag(b"<html></html>")
+    assert etag != get_content_etag("<html> </html>")
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected",
+    [
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ("*", True),
+        ('"xyz"', False),
+        ("", False),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches('"abc"', if_none_match) is expected
+
+
+def test_compress_json():
+    data = '{"a": [1, 2, 3]}'
+    compressed = compress_json(data)
+    assert compressed == compress_json(data)
+    assert decompress_json(compressed) == data.encode()
@@ -1,7 +1,38 @@
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+from uuid import UUID, uuid4
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import SQLModel
 
-from bigdata_risk_analyzer.api.app import app
+import bigdata_risk_analyzer.api.app as app_module
+from bigdata_risk_analyzer.api.app import (
+    app,
+    render_frontend,
+    stream_report_json,
+    stream_report_ndjson,
+    stream_status_json,
+)
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.api.models import (
+    RiskAnalysisRequest,
+    RiskAnalyzerStatusResponse,
+    WorkflowStatus,
+    example_analysis_window,
+)
+from bigdata_risk_analyzer.api.scheduler import JobScheduler, WorkerType
+from bigdata_risk_analyzer.api.storage import AsyncStorageManager, StorageManager
+from bigdata_risk_analyzer.models import (
+    CompanyScoring,
+    LabeledChunk,
+    LabeledContent,
+    RiskAnalysisResponse,
+    RiskScore,
+    RiskScoring,
+    RiskTaxonomy,
+)
 
 
 @pytest.fixture
@@ -9,6 +40,36 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The app on a temporary database, without running its lifespan. Its scheduler is
+    not started, so submitted jobs stay queued, and it takes at most 2 jobs."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(app_module, "storage_manager", StorageManager(engine))
+    # Every request of the test client runs in its own event loop, so the endpoints
+    # query the database with the sync engine from threads
+    monkeypatch.setattr(
+        app_module, "async_storage_manager", AsyncStorageManager(engine)
+    )
+    monkeypatch.setattr(
+        app_module, "scheduler", JobScheduler(lambda request_id: None, max_queue_size=2)
+    )
+    return app_module
+
+
+@pytest.fixture
+def request_body():
+    return {
+        "main_theme": "US Import Tariffs against China",
+        "focus": "Taxonomy of risks for US companies",
+        "companies": ["4A6F00", "D8442A"],
+        "start_date": "2025-06-01",
+        "end_date": "2025-08-01",
+        "frequency": "M",
+    }
+
+
 def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
@@ -17,3 +78,596 @@ def test_health_check(client):
     assert data["status"] == "ok"
     assert "version" in data
     assert isinstance(data["version"], str)
+
+
+def test_metrics(client):
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'risk_analyzer_http_request_seconds_count{endpoint="/health",method="GET",status="200"}'
+        in response.text
+    )
+    assert "risk_analyzer_workflow_stage_seconds" in response.text
+
+
+def test_frontend(client):
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "/static/scripts/config_panel." in response.text
+    etag = response.headers["etag"]
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+    # The page is rendered once a day and settings, with the examples of the day
+    assert render_frontend(date.today(), False) is render_frontend(date.today(), False)
+    other_day, _ = render_frontend(date(2025, 1, 31), False)
+    assert 'value="2025-01-01"' in other_day
+    assert example_analysis_window(date(2025, 1, 31)) == ("2025-01-01", "2025-01-31")
+    assert (
+        render_frontend(date.today(), True)[1]
+        != render_frontend(date.today(), False)[1]
+    )
+
+
+@pytest.fixture
+def report():
+    return RiskAnalysisResponse(
+        risk_scoring=RiskScoring(
+            root={
+                "Acme": CompanyScoring(
+                    ticker="ACM",
+                    sector="S1",
+                    industry="I1",
+                    composite_score=3,
+                    motivation="Tariffs",
+                    risks=RiskScore(root={"Input Costs": 3}),
+                )
+            }
+        ),
+        risk_taxonomy=RiskTaxonomy(label="Root", node=1, summary="Root node"),
+        content=LabeledContent(
+            root=[
+                LabeledChunk(
+                    time_period="Jun 2025",
+                    date=f"2025-06-{day:02d}",
+                    company=company,
+                    sector="S1",
+                    industry="I1",
+                    country="US",
+                    ticker=company[:3].upper(),
+                    document_id=f"DOC{day}",
+                    headline=f"Headline {day}",
+                    quote="Quote",
+                    motivation="Motivation",
+                    sub_scenario="Input Costs" if day % 2 else "Disruptions",
+                    risk_channel="Supply Chain Risk/Input Costs",
+                    risk_factor="Supply Chain Risk",
+                    highlights=[],
+                )
+                for day, company in enumerate(["Acme", "Beta", "Acme"], 1)
+            ]
+        ),
+    )
+
+
+def complete(api, request_id, request_body, report):
+    """Complete a job as its workflow would."""
+    api.storage_manager.mark_workflow_as_completed(
+        request_id, RiskAnalysisRequest.model_validate(request_body), report
+    )
+
+
+def store_report(api, request_body, report) -> UUID:
+    """Store a completed analysis, without going through the queue."""
+    request_id = uuid4()
+    api.storage_manager.enqueue_job(
+        request_id, RiskAnalysisRequest.model_validate(request_body)
+    )
+    complete(api, request_id, request_body, report)
+    return request_id
+
+
+def test_queue_full(api, client, request_body):
+    for main_theme in ("First", "Second"):
+        response = client.post(
+            "/risk-analysis", json={**request_body, "main_theme": main_theme}
+        )
+        assert response.status_code == 202
+        assert response.json()["status"] == WorkflowStatus.QUEUED
+
+    response = client.post("/risk-analysis", json=request_body)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "60"
+    # Rejected requests are not stored
+    assert api.scheduler.queue_depth == 2
+    assert len(api.storage_manager.get_unfinished_jobs()) == 2
+
+
+def test_identical_requests_are_cached(api, client, request_body, report):
+    response = client.post("/risk-analysis", json=request_body)
+    assert response.status_code == 202
+    request_id = response.json()["request_id"]
+
+    # An identical request still queued is answered with its request_id
+    response = client.post("/risk-analysis", json=request_body)
+    assert response.status_code == 202
+    assert response.json() == {
+        "request_id": request_id,
+        "status": WorkflowStatus.QUEUED,
+        "cached": True,
+    }
+    assert api.scheduler.queue_depth == 1
+
+    complete(api, UUID(request_id), request_body, report)
+    response = client.post("/risk-analysis", json=request_body)
+    assert response.status_code == 200
+    assert response.json() == {
+        "request_id": request_id,
+        "status": WorkflowStatus.COMPLETED,
+        "cached": True,
+    }
+
+    response = client.post(
+        "/risk-analysis", json=request_body, params={"use_cache": False}
+    )
+    assert response.status_code == 202
+    assert response.json()["request_id"] != request_id
+    assert api.scheduler.queue_depth == 2
+
+
+def test_status_since(api, client, request_body, report):
+    request_id = client.post("/risk-analysis", json=request_body).json()["request_id"]
+    for message in ("first", "second", "third"):
+        api.storage_manager.log_message(UUID(request_id), message)
+    api.storage_manager.flush_logs()
+
+    status = client.get(f"/status/{request_id}").json()
+    assert status["status"] == WorkflowStatus.QUEUED
+    assert status["logs"] == ["first", "second", "third"]
+    assert status["log_cursor"] == 3
+    assert (status["queue_position"], status["queue_depth"]) == (1, 1)
+
+    # Only the messages after the cursor of the previous response
+    status = client.get(f"/status/{request_id}", params={"since": 2}).json()
+    assert (status["logs"], status["log_cursor"]) == (["third"], 3)
+    status = client.get(f"/status/{request_id}", params={"since": 3}).json()
+    assert (status["logs"], status["log_cursor"]) == ([], 3)
+
+    complete(api, UUID(request_id), request_body, report)
+    response = client.get(f"/status/{request_id}", params={"since": 3})
+    status = RiskAnalyzerStatusResponse.model_validate_json(response.content)
+    assert status.status == WorkflowStatus.COMPLETED
+    assert status.report == report
+    status = client.get(
+        f"/status/{request_id}", params={"include_report": False}
+    ).json()
+    assert status["report"] is None
+
+    assert client.get(f"/status/{uuid4()}").status_code == 404
+
+
+def read_events(response) -> list[tuple[str, dict]]:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_status(api, client, request_body):
+    request_id = uuid4()
+    api.storage_manager.enqueue_job(
+        request_id, RiskAnalysisRequest.model_validate(request_body)
+    )
+    api.storage_manager.log_message(request_id, "first")
+    api.storage_manager.log_message(request_id, "second")
+    api.storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+
+    response = client.get(f"/status/{request_id}/stream")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert read_events(response) == [
+        ("log", {"seq": 0, "message": "first"}),
+        ("log", {"seq": 1, "message": "second"}),
+        (
+            "status",
+            {"status": WorkflowStatus.FAILED, "queue_position": None, "queue_depth": 0},
+        ),
+        ("complete", {"status": WorkflowStatus.FAILED}),
+    ]
+    assert "id: 1\n" in response.text
+
+    # Reconnecting clients resume after the last log event they received
+    response = client.get(
+        f"/status/{request_id}/stream", headers={"Last-Event-ID": "0"}
+    )
+    assert [data for event, data in read_events(response) if event == "log"] == [
+        {"seq": 1, "message": "second"}
+    ]
+
+    assert client.get(f"/status/{uuid4()}/stream").status_code == 404
+
+
+def test_get_report(api, client, request_body, report):
+    request_id = store_report(api, request_body, report)
+    empty_id = store_report(
+        api,
+        {**request_body, "main_theme": "Energy Transition"},
+        report.model_copy(update={"content": LabeledContent(root=[])}),
+    )
+
+    response = client.get(f"/report/{request_id}")
+    assert RiskAnalysisResponse.model_validate_json(response.content) == report
+
+    # Evidence that is not loaded is not set, only reports without evidence are empty
+    response = client.get(f"/report/{request_id}", params={"include_content": False})
+    assert response.json()["content"] is None
+    assert RiskAnalysisResponse.model_validate_json(
+        response.content
+    ) == report.model_copy(update={"content": None})
+    assert client.get(f"/report/{empty_id}").json()["content"] == []
+    response = client.get(f"/report/{empty_id}", params={"include_content": False})
+    assert response.json()["content"] is None
+
+    response = client.get(
+        f"/report/{request_id}",
+        params={"include_content": False},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.text.count("\n") == 1
+    assert "content" not in json.loads(response.text)
+
+    assert client.get(f"/report/{uuid4()}").status_code == 404
+
+
+def test_report_etag(api, client, request_body, report):
+    request_id = store_report(api, request_body, report)
+
+    # The ETag is weak, it covers every content encoding of the report
+    response = client.get(f"/report/{request_id}", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    response = client.get(
+        f"/report/{request_id}", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == etag
+
+    for accept_encoding in ("br", "gzip", "identity"):
+        response = client.get(
+            f"/report/{request_id}",
+            headers={"If-None-Match": etag, "Accept-Encoding": accept_encoding},
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+
+
+def test_report_content(api, client, request_body, report):
+    request_id = store_report(api, request_body, report)
+    chunks = [chunk.model_dump(mode="json") for chunk in report.content.root]
+
+    page = client.get(f"/reports/{request_id}/content", params={"limit": 2}).json()
+    assert page["items"] == chunks[:2]
+    assert page["total"] == 3
+    page = client.get(
+        f"/reports/{request_id}/content",
+        params={"limit": 2, "cursor": page["next_cursor"]},
+    ).json()
+    assert page["items"] == chunks[2:]
+    assert page["next_cursor"] is None
+
+    page = client.get(
+        f"/reports/{request_id}/content",
+        params={"company": "Acme", "sub_scenario": "Input Costs"},
+    ).json()
+    assert page["items"] == [chunks[0], chunks[2]]
+    assert page["total"] == 2
+
+    facets = client.get(f"/reports/{request_id}/content/facets").json()
+    assert facets["total"] == 3
+    assert facets["companies"] == ["Acme", "Beta"]
+    assert facets["sub_scenarios"] == ["Disruptions", "Input Costs"]
+
+    assert client.get(f"/reports/{uuid4()}/content").status_code == 404
+    assert client.get(f"/reports/{uuid4()}/content/facets").status_code == 404
+    response = client.get(f"/reports/{request_id}/content", params={"limit": 0})
+    assert response.status_code == 422
+
+
+def test_resume(api, client, request_body):
+    request_id, other_id, orphan_id = uuid4(), uuid4(), uuid4()
+    for failed_id in (request_id, other_id):
+        api.storage_manager.enqueue_job(
+            failed_id, RiskAnalysisRequest.model_validate(request_body)
+        )
+        api.storage_manager.update_status(failed_id, WorkflowStatus.FAILED)
+
+    response = client.post(f"/risk-analysis/{request_id}/resume")
+    assert response.status_code == 202
+    assert response.json()["request_id"] == str(request_id)
+    assert api.storage_manager.get_status(request_id) == WorkflowStatus.QUEUED
+    assert api.scheduler.position(request_id) == 1
+
+    # Only failed analyses with a stored job can be resumed
+    assert client.post(f"/risk-analysis/{request_id}/resume").status_code == 409
+    api.storage_manager.update_status(orphan_id, WorkflowStatus.FAILED)
+    assert client.post(f"/risk-analysis/{orphan_id}/resume").status_code == 409
+    assert client.post(f"/risk-analysis/{uuid4()}/resume").status_code == 404
+
+    api.scheduler.submit(uuid4())
+    response = client.post(f"/risk-analysis/{other_id}/resume")
+    assert response.status_code == 429
+    assert api.storage_manager.get_status(other_id) == WorkflowStatus.FAILED
+
+
+def test_extend_report(api, client, request_body, report):
+    request_id = store_report(api, request_body, report)
+
+    response = client.post(
+        f"/report/{request_id}/extend", json={"end_date": "2025-09-01"}
+    )
+    assert response.status_code == 202
+    extension_id = UUID(response.json()["request_id"])
+    assert extension_id != request_id
+    extension = api.storage_manager.get_job_request(extension_id)
+    assert extension.extends_report_id == request_id
+    assert (extension.start_date, extension.end_date) == ("2025-06-01", "2025-09-01")
+    assert api.scheduler.position(extension_id) == 1
+    # The same extension still queued is not queued again
+    response = client.post(
+        f"/report/{request_id}/extend", json={"end_date": "2025-09-01"}
+    )
+    assert response.json()["request_id"] == str(extension_id)
+
+    response = client.post(
+        f"/report/{request_id}/extend", json={"end_date": "2025-08-01"}
+    )
+    assert response.status_code == 422
+    response = client.post(f"/report/{uuid4()}/extend", json={"end_date": "2025-09-01"})
+    assert response.status_code == 404
+
+    # Reports without a stored request can not be extended
+    legacy_id = uuid4()
+    api.storage_manager.update_status(legacy_id, WorkflowStatus.IN_PROGRESS)
+    complete(api, legacy_id, request_body, report)
+    response = client.post(
+        f"/report/{legacy_id}/extend", json={"end_date": "2025-09-01"}
+    )
+    assert response.status_code == 409
+
+
+def test_list_reports(api, client, request_body, report):
+    completed_id = store_report(api, request_body, report)
+    energy_body = {**request_body, "main_theme": "Energy Transition"}
+    queued_id = client.post("/risk-analysis", json=energy_body).json()["request_id"]
+    watchlist_id = client.post(
+        "/risk-analysis", json={**energy_body, "companies": "W1"}
+    ).json()["request_id"]
+
+    # Most recent first
+    page = client.get("/reports", params={"limit": 2}).json()
+    assert [item["request_id"] for item in page["items"]] == [watchlist_id, queued_id]
+    page = client.get(
+        "/reports", params={"limit": 2, "cursor": page["next_cursor"]}
+    ).json()
+    assert [item["request_id"] for item in page["items"]] == [str(completed_id)]
+    assert page["next_cursor"] is None
+    (completed,) = page["items"]
+    assert completed["status"] == WorkflowStatus.COMPLETED
+    assert (completed["theme"], completed["start_date"], completed["end_date"]) == (
+        request_body["main_theme"],
+        "2025-06-01",
+        "2025-08-01",
+    )
+    assert completed["content_size"] == 3
+
+    page = client.get("/reports", params={"status": WorkflowStatus.QUEUED}).json()
+    assert [item["request_id"] for item in page["items"]] == [watchlist_id, queued_id]
+    assert all(item["content_size"] is None for item in page["items"])
+    page = client.get("/reports", params={"theme": "Energy Transition"}).json()
+    assert [item["request_id"] for item in page["items"]] == [watchlist_id, queued_id]
+    page = client.get("/reports", params={"watchlist": "W1"}).json()
+    assert [(item["request_id"], item["watchlist_id"]) for item in page["items"]] == [
+        (watchlist_id, "W1")
+    ]
+    page = client.get(
+        "/reports", params={"created_after": date.today() + timedelta(days=1)}
+    ).json()
+    assert page == {"items": [], "next_cursor": None}
+
+    assert client.get("/reports", params={"limit": 0}).status_code == 422
+    assert client.get("/reports", params={"status": "unknown"}).status_code == 422
+
+
+def test_analytics_scores(api, client, request_body, report):
+    tariff_id = store_report(api, request_body, report)
+    energy_report = report.model_copy(deep=True)
+    scoring = energy_report.risk_scoring.root["Acme"]
+    scoring.composite_score = 5
+    scoring.risks = RiskScore(root={"Input Costs": 4})
+    energy_id = store_report(
+        api, {**request_body, "main_theme": "Energy Transition"}, energy_report
+    )
+
+    # Composite scores of the most recent reports first
+    page = client.get("/analytics/scores", params={"limit": 1}).json()
+    assert [(item["report_id"], item["score"]) for item in page["items"]] == [
+        (str(energy_id), 5)
+    ]
+    page = client.get(
+        "/analytics/scores", params={"limit": 1, "cursor": page["next_cursor"]}
+    ).json()
+    assert [(item["report_id"], item["score"]) for item in page["items"]] == [
+        (str(tariff_id), 3)
+    ]
+    assert page["next_cursor"] is None
+
+    page = client.get(
+        "/analytics/scores", params={"ticker": "ACM", "theme": "tariffs"}
+    ).json()
+    assert [item["report_id"] for item in page["items"]] == [str(tariff_id)]
+    page = client.get("/analytics/scores", params={"risk": "Input Costs"}).json()
+    assert [
+        (item["risk"], item["score"], item["composite_score"]) for item in page["items"]
+    ] == [("Input Costs", 4, 5), ("Input Costs", 3, 3)]
+    page = client.get("/analytics/scores", params={"sector": "S2"}).json()
+    assert page == {"items": [], "next_cursor": None}
+
+    aggregates = client.get("/analytics/scores/aggregate").json()
+    assert aggregates == [
+        {
+            "group": "Acme",
+            "period": None,
+            "reports": 2,
+            "count": 2,
+            "mean_score": 4.0,
+            "min_score": 3,
+            "max_score": 5,
+        }
+    ]
+    aggregates = client.get(
+        "/analytics/scores/aggregate",
+        params={"group_by": "theme", "interval": "month", "risk": "Input Costs"},
+    ).json()
+    first_day = date.today().replace(day=1).isoformat()
+    assert sorted(
+        (aggregate["group"], aggregate["period"], aggregate["mean_score"])
+        for aggregate in aggregates
+    ) == [
+        ("Energy Transition", first_day, 4.0),
+        ("US Import Tariffs against China", first_day, 3.0),
+    ]
+    response = client.get("/analytics/scores/aggregate", params={"group_by": "risk"})
+    assert response.status_code == 422
+
+
+def test_parallelism_with_process_workers(api, client, monkeypatch, request_body):
+    monkeypatch.setattr(api.settings, "JOB_WORKER_TYPE", WorkerType.PROCESS)
+    body = {**request_body, "parallelism": 2}
+    assert client.post("/risk-analysis", json=body).status_code == 422
+    response = client.post("/risk-analysis/batch", json={"requests": [body]})
+    assert response.status_code == 422
+    assert api.scheduler.queue_depth == 0
+
+    monkeypatch.setattr(api.settings, "JOB_WORKER_TYPE", WorkerType.THREAD)
+    assert client.post("/risk-analysis", json=body).status_code == 202
+
+
+def test_batch(api, client, request_body, report):
+    other_body = {**request_body, "main_theme": "Energy Transition"}
+    completed_id = store_report(api, other_body, report)
+
+    response = client.post(
+        "/risk-analysis/batch",
+        json={"requests": [request_body, other_body, request_body]},
+    )
+    assert response.status_code == 202
+    batch = response.json()
+    first, other, repeated = batch["requests"]
+    # Repeated requests share a job, completed ones reuse their report
+    assert repeated == first
+    assert first["status"] == WorkflowStatus.QUEUED
+    assert (other["request_id"], other["status"], other["cached"]) == (
+        str(completed_id),
+        WorkflowStatus.COMPLETED,
+        True,
+    )
+    assert api.scheduler.queue_depth == 1
+
+    status = client.get(f"/risk-analysis/batch/{batch['batch_id']}").json()
+    assert status["status"] == WorkflowStatus.IN_PROGRESS
+    assert status["counts"] == {
+        WorkflowStatus.QUEUED: 1,
+        WorkflowStatus.IN_PROGRESS: 0,
+        WorkflowStatus.COMPLETED: 1,
+        WorkflowStatus.FAILED: 0,
+    }
+    assert [entry["request_id"] for entry in status["requests"]] == [
+        first["request_id"],
+        str(completed_id),
+        first["request_id"],
+    ]
+
+    # The whole batch is rejected when the queue can not take all its new jobs
+    response = client.post(
+        "/risk-analysis/batch",
+        json={
+            "requests": [
+                {**request_body, "main_theme": main_theme}
+                for main_theme in ("Second", "Third")
+            ]
+        },
+    )
+    assert response.status_code == 429
+    assert api.scheduler.queue_depth == 1
+
+    assert client.get(f"/risk-analysis/batch/{uuid4()}").status_code == 404
+
+
+class FakeStorageManager(AsyncStorageManager):
+    """Storage manager streaming the given evidence, without a database."""
+
+    def __init__(self, chunks: list[LabeledChunk]):
+        self.chunks = [chunk.model_dump() for chunk in chunks]
+
+    async def stream_report_content(self, request_id, batch_size=500):
+        for start in range(0, len(self.chunks), 2):
+            yield self.chunks[start : start + 2]
+
+
+async def collect(parts) -> str:
+    return "".join([part async for part in parts])
+
+
+@pytest.mark.parametrize("n_chunks", [0, 1, 5])
+def test_stream_report(n_chunks):
+    chunks = [
+        LabeledChunk(
+            time_period="Jun 2025",
+            date="2025-06-01",
+            company="Acme",
+            sector="S1",
+            industry="I1",
+            country="US",
+            ticker="ACM",
+            document_id=f"DOC{i}",
+            headline="Headline",
+            quote='A "quoted" café',
+            motivation="Motivation",
+            sub_scenario="Input Costs",
+            risk_channel="Supply Chain Risk/Input Costs",
+            risk_factor="Supply Chain Risk",
+            highlights=["café"],
+        )
+        for i in range(n_chunks)
+    ]
+    report = RiskAnalysisResponse(
+        risk_scoring=RiskScoring(root={}),
+        risk_taxonomy=RiskTaxonomy(label="Root", node=0, summary=None),
+        content=LabeledContent(root=[]),
+    )
+    storage_manager = FakeStorageManager(chunks)
+    request_id = uuid4()
+    expected = report.model_copy(update={"content": LabeledContent(root=chunks)})
+
+    body = asyncio.run(collect(stream_report_json(request_id, report, storage_manager)))
+    assert RiskAnalysisResponse.model_validate_json(body) == expected
+
+    lines = asyncio.run(
+        collect(stream_report_ndjson(request_id, report, storage_manager))
+    ).splitlines()
+    assert json.loads(lines[0]) == report.model_dump(mode="json", exclude={"content"})
+    assert [LabeledChunk.model_validate_json(line) for line in lines[1:]] == chunks
+
+    status = RiskAnalyzerStatusResponse(
+        request_id=str(request_id),
+        last_updated=datetime(2025, 6, 1),
+        status=WorkflowStatus.COMPLETED,
+        logs=["done"],
+    )
+    body = asyncio.run(collect(stream_status_json(status, report, storage_manager)))
+    assert RiskAnalyzerStatusResponse.model_validate_json(body) == status.model_copy(
+        update={"report": expected}
+    )
@@ -0,0 +1,177 @@
+from unittest import mock
+from uuid import uuid4
+
+import pandas as pd
+import pytest
+from bigdata_client.models.entities import Company
+from bigdata_research_tools.tree import SemanticTree
+from bigdata_research_tools.utils.observer import Observable
+from bigdata_research_tools.workflows.utils import get_scored_df
+from sqlmodel import SQLModel
+
+from bigdata_risk_analyzer import service
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.api.models import RiskAnalysisRequest, WorkflowStatus
+from bigdata_risk_analyzer.api.storage import StorageManager
+from bigdata_risk_analyzer.backends import (
+    Backend,
+    BackendMode,
+    RecordedBigdata,
+    RecordingNotFoundError,
+    frame_key,
+)
+from bigdata_risk_analyzer.service import prepare_companies, process_request
+
+
+class LiveAnalyzer(Observable):
+    """Stand-in for the live `RiskAnalyzer`, finds one chunk per company."""
+
+    instances = 0
+
+    def __init__(self, companies, **kwargs):
+        super().__init__()
+        LiveAnalyzer.instances += 1
+        self.companies = companies
+
+    def create_taxonomy(self):
+        tree = SemanticTree(
+            label="Root",
+            node=1,
+            summary="Root node",
+            children=[SemanticTree(label="Risk1", node=2, summary="Risk1")],
+        )
+        return tree, ["Summary"], ["Risk1"]
+
+    def retrieve_results(self, sentences, frequency, document_limit, batch_size):
+        return pd.DataFrame(
+            {
+                "Company": [company.name for company in self.companies],
+                "Document ID": [f"D-{company.id}" for company in self.companies],
+            }
+        )
+
+    def label_search_results(
+        self, df_sentences, terminal_labels, risk_tree, additional_prompt_fields
+    ):
+        df_labeled = df_sentences.assign(
+            **{
+                "Time Period": "Jan 2025",
+                "Date": "2025-01-01",
+                "Sector": "S",
+                "Industry": "I",
+                "Country": "US",
+                "Ticker": "T",
+                "Headline": "Headline",
+                "Quote": "Quote",
+                "Motivation": "Motivation",
+                "Sub-Scenario": "Risk1",
+                "Risk Channel": "Risk1",
+                "Risk Factor": "Risk1",
+                "Highlights": [[] for _ in range(len(df_sentences))],
+            }
+        )
+        return df_sentences, df_labeled
+
+    def generate_results(self, df_labeled):
+        df_company = get_scored_df(
+            df_labeled,
+            index_columns=["Company", "Ticker", "Sector", "Industry"],
+            pivot_column="Sub-Scenario",
+        )
+        df_motivation = pd.DataFrame(
+            {"Company": df_company["Company"], "Motivation": "Recorded motivation"}
+        )
+        return df_company, None, df_motivation
+
+
+class OfflineAnalyzer:
+    def __init__(self, **kwargs):
+        raise AssertionError("The live analyzer must not be used when replaying")
+
+
+def test_frame_key():
+    df = pd.DataFrame({"A": [1, 2], "B": [["x"], []]})
+    assert frame_key(df) == frame_key(df.copy().set_index(pd.Index([5, 6])))
+    assert frame_key(df) != frame_key(df.iloc[:1])
+    assert frame_key(df.iloc[:0]) == "empty"
+
+
+def test_recorded_bigdata(tmp_path):
+    companies = [Company(id=f"C{i}", name=f"Company {i}") for i in range(3)]
+    bigdata = mock.Mock()
+    bigdata.watchlists.get.return_value.items = ["C0", "C1", "C2"]
+    bigdata.knowledge_graph.get_entities.side_effect = lambda ids: [
+        companies[int(entity_id[1])] for entity_id in ids
+    ]
+    recording = RecordedBigdata(
+        Backend(BackendMode.RECORD, str(tmp_path)).store, bigdata
+    )
+    assert prepare_companies("W1", recording) == companies
+
+    replay = RecordedBigdata(Backend(BackendMode.REPLAY, str(tmp_path)).store)
+    assert prepare_companies("W1", replay) == companies
+    assert prepare_companies(["C2"], replay) == companies[2:]
+    with pytest.raises(RecordingNotFoundError):
+        prepare_companies(["C3"], replay)
+
+
+def test_backend_requires_recordings_dir():
+    assert Backend().mode == BackendMode.LIVE
+    with pytest.raises(ValueError):
+        Backend(mode=BackendMode.REPLAY)
+
+
+def test_process_request_record_and_replay(monkeypatch, tmp_path):
+    companies = [Company(id=f"C{i}", name=f"Company {i}") for i in range(3)]
+    bigdata = mock.Mock()
+    bigdata.knowledge_graph.get_entities.side_effect = lambda ids: [
+        companies[int(entity_id[1])] for entity_id in ids
+    ]
+    engine = create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    request = RiskAnalysisRequest(
+        main_theme="Theme",
+        focus="Focus",
+        companies=["C0", "C1", "C2"],
+        start_date="2025-01-01",
+        end_date="2025-01-31",
+        frequency="M",
+    )
+
+    def run(backend, bigdata_client):
+        request_id = uuid4()
+        storage_manager.enqueue_job(request_id, request)
+        process_request(
+            request,
+            bigdata=bigdata_client,
+            request_id=request_id,
+            storage_manager=storage_manager,
+            labeling_batch_size=2,
+            backend=backend,
+        )
+        assert storage_manager.get_status(request_id) == WorkflowStatus.COMPLETED
+        return storage_manager.get_analysis_report(request_id)
+
+    monkeypatch.setattr(service, "RiskAnalyzer", LiveAnalyzer)
+    backend = Backend(mode=BackendMode.RECORD, recordings_dir=str(tmp_path))
+    recorded = run(backend, RecordedBigdata(backend.store, bigdata))
+    assert LiveAnalyzer.instances == 1
+    recorded_request = backend.store.load(request.request_hash(), "request")
+    assert recorded_request is not None and recorded_request["main_theme"] == "Theme"
+
+    monkeypatch.setattr(service, "RiskAnalyzer", OfflineAnalyzer)
+    backend = Backend(mode=BackendMode.REPLAY, recordings_dir=str(tmp_path))
+    replayed = run(backend, backend.bigdata_client("fake-key"))
+    assert replayed.risk_scoring == recorded.risk_scoring
+    assert replayed.content == recorded.content
+    assert len(replayed.content.root) == 3
+    # The report keeps the time spent in each stage, up to its storage
+    assert list(recorded.stage_timings) == [
+        "company_resolution",
+        "taxonomy",
+        "search",
+        "labeling",
+        "scoring",
+        "build_response",
+    ]
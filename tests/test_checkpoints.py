@@ -0,0 +1,88 @@
+import json
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+import pytest
+from bigdata_client.models.entities import Company
+from bigdata_research_tools.tree import SemanticTree
+
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+
+
+def test_save_and_load(tmp_path):
+    store = CheckpointStore(tmp_path)
+    request_id = uuid4()
+    df = pd.DataFrame({"Company": ["A", "B"], "Score": [1, 2]})
+
+    assert store.load(request_id, "search") is None
+    assert store.names(request_id) == []
+
+    store.save(request_id, "search", df)
+    store.save(request_id, "taxonomy", ("tree", ["summary"], ["label"]))
+    pd.testing.assert_frame_equal(store.load(request_id, "search"), df)
+    assert store.load(request_id, "taxonomy") == ("tree", ["summary"], ["label"])
+    assert store.names(request_id) == ["search", "taxonomy"]
+    # Checkpoints of other workflows are kept apart
+    assert store.names(uuid4()) == []
+
+    store.save(request_id, "search", df.iloc[:1])
+    loaded = store.load(request_id, "search")
+    assert loaded is not None and len(loaded) == 1
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_delete(tmp_path):
+    store = CheckpointStore(tmp_path)
+    request_id = uuid4()
+    store.save(request_id, "search", [1, 2, 3])
+    store.delete(request_id)
+    assert store.load(request_id, "search") is None
+    assert store.names(request_id) == []
+    # Deleting a workflow without checkpoints is a no-op
+    store.delete(uuid4())
+
+
+def test_round_trip(tmp_path):
+    store = CheckpointStore(tmp_path)
+    request_id = uuid4()
+    df = pd.DataFrame(
+        {
+            "Timestamp": pd.to_datetime(
+                ["2024-01-01T10:00:00Z", "2024-01-02T12:30:00Z"]
+            ),
+            "Entities": [["A", "B"], []],
+            "Score": [0.5, np.nan],
+            "Count": np.array([1, 2], dtype="int64"),
+        },
+        index=pd.Index([3, 7]),
+    )
+    tree = SemanticTree(
+        label="Root",
+        node=1,
+        summary="Root node",
+        children=[SemanticTree(label="Risk1", node=2, summary="Risk1")],
+    )
+    company = Company(id="C0", name="Company 0")
+    value = {"labeled": df, "taxonomy": (tree, ["Summary"], ["Risk1"])}
+
+    store.save(request_id, "results", value)
+    store.save(request_id, "universe", [company])
+    store.save(request_id, "request", {"request_id": request_id})
+
+    loaded = store.load(request_id, "results")
+    assert loaded is not None
+    pd.testing.assert_frame_equal(loaded["labeled"], df)
+    loaded_tree, summaries, labels = loaded["taxonomy"]
+    assert loaded_tree._to_dict() == tree._to_dict()
+    assert (summaries, labels) == (["Summary"], ["Risk1"])
+    assert store.load(request_id, "universe") == [company]
+    assert store.load(request_id, "request") == {"request_id": request_id}
+    # Checkpoints are plain JSON, loading one never runs code
+    json.loads((tmp_path / str(request_id) / "results.json").read_text())
+
+
+def test_unsupported_type(tmp_path):
+    store = CheckpointStore(tmp_path)
+    with pytest.raises(TypeError):
+        store.save(uuid4(), "search", object())
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+from bigdata_client.models.entities import Company
+from sqlmodel import SQLModel
+
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.entity_cache import EntityCache
+
+
+def make_company(entity_id: str) -> Company:
+    return Company(
+        id=entity_id,
+        name=f"Company {entity_id}",
+        volume=None,
+        description=None,
+        entity_type="COMP",
+        company_type=None,
+        country="US",
+        sector=None,
+        industry_group=None,
+        industry=None,
+        ticker=None,
+        webpage=None,
+        isin_values=[],
+        cusip_values=[],
+        sedol_values=[],
+        listing_values=[],
+    )
+
+
+class FakeFetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(ids)
+        # IDs starting with X are not companies
+        return {
+            entity_id: None if entity_id.startswith("X") else make_company(entity_id)
+            for entity_id in ids
+        }
+
+
+@pytest.fixture
+def engine():
+    engine = create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_only_missing_ids_are_fetched():
+    cache = EntityCache()
+    fetch = FakeFetcher()
+
+    companies = cache.get_companies(["A", "B", "X1"], fetch)
+    assert companies["A"] == make_company("A")
+    assert companies["X1"] is None
+
+    companies = cache.get_companies(["A", "C", "X1", "A"], fetch)
+    assert set(companies) == {"A", "C", "X1"}
+    assert fetch.calls == [["A", "B", "X1"], ["C"]]
+
+    stats = cache.stats()
+    assert stats["company_hits"] == 2
+    assert stats["company_misses"] == 4
+
+
+def test_entries_expire():
+    cache = EntityCache(ttl_seconds=0)
+    fetch = FakeFetcher()
+    cache.get_companies(["A"], fetch)
+    time.sleep(0.01)
+    cache.get_companies(["A"], fetch)
+    assert fetch.calls == [["A"], ["A"]]
+
+
+def test_least_recently_used_are_evicted():
+    cache = EntityCache(max_size=2)
+    fetch = FakeFetcher()
+    cache.get_companies(["A", "B"], fetch)
+    cache.get_companies(["A"], fetch)
+    cache.get_companies(["C"], fetch)
+
+    cache.get_companies(["A", "B"], fetch)
+    assert fetch.calls == [["A", "B"], ["C"], ["B"]]
+
+
+def test_watchlist_items():
+    cache = EntityCache()
+    calls = []
+
+    def fetch(watchlist_id):
+        calls.append(watchlist_id)
+        return ["A", "B"]
+
+    assert cache.get_watchlist_items("W1", fetch) == ["A", "B"]
+    assert cache.get_watchlist_items("W1", fetch) == ["A", "B"]
+    assert calls == ["W1"]
+    assert cache.stats()["watchlist_hits"] == 1
+
+
+def test_watchlists_expire_before_companies():
+    cache = EntityCache(watchlist_ttl_seconds=0)
+    fetch = FakeFetcher()
+    calls = []
+
+    def fetch_watchlist(watchlist_id):
+        calls.append(watchlist_id)
+        return ["A", f"B{len(calls)}"]
+
+    assert cache.get_watchlist_items("W1", fetch_watchlist) == ["A", "B1"]
+    assert cache.get_watchlist_items("W1", fetch_watchlist) == ["A", "B2"]
+    cache.get_companies(["A"], fetch)
+    cache.get_companies(["A"], fetch)
+    assert fetch.calls == [["A"]]
+
+
+def test_persistent_cache(engine):
+    fetch = FakeFetcher()
+    EntityCache(engine=engine).get_companies(["A", "X1"], fetch)
+    EntityCache(engine=engine).get_watchlist_items("W1", lambda _: ["A"])
+
+    # A new cache, e.g. after a restart, reads the entries stored in the database
+    cache = EntityCache(engine=engine)
+    companies = cache.get_companies(["A", "X1"], fetch)
+    assert companies == {"A": make_company("A"), "X1": None}
+    assert cache.get_watchlist_items("W1", lambda _: ["B"]) == ["A"]
+    assert fetch.calls == [["A", "X1"]]
+
+    # Entries stored with a longer TTL, e.g. before it was lowered, are fetched again
+    cache = EntityCache(engine=engine, watchlist_ttl_seconds=60)
+    assert cache.get_watchlist_items("W1", lambda _: ["B"]) == ["B"]
+    assert EntityCache(engine=engine).get_watchlist_items("W1", lambda _: ["C"]) == [
+        "B"
+    ]
+
+    cache.clear()
+    EntityCache(engine=engine).get_companies(["A"], fetch)
+    assert fetch.calls == [["A", "X1"], ["A"]]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bigdata_risk_analyzer.metrics import StageTimer, WorkflowStage, timed_db_operation
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_timer():
+    before = sample("risk_analyzer_workflow_stage_seconds_count", stage="labeling")
+    timer = StageTimer()
+    for _ in range(2):
+        with timer.stage(WorkflowStage.LABELING):
+            pass
+    with pytest.raises(RuntimeError):
+        with timer.stage(WorkflowStage.SCORING):
+            raise RuntimeError("LLM error")
+    timer.add(WorkflowStage.LABELING, 1.5)
+
+    assert timer.timings[WorkflowStage.LABELING] >= 1.5
+    assert list(timer.rounded()) == ["labeling", "scoring"]
+    # The workflow is observed once, with the time of all its batches
+    timer.observe()
+    assert (
+        sample("risk_analyzer_workflow_stage_seconds_count", stage="labeling")
+        == before + 1
+    )
+
+
+def test_timed_db_operation():
+    class Storage:
+        @timed_db_operation
+        def get_value(self, value):
+            return value
+
+        @timed_db_operation
+        async def get_value_async(self, value):
+            return value
+
+    storage = Storage()
+    assert storage.get_value(1) == 1
+    assert asyncio.run(storage.get_value_async(2)) == 2
+    for operation in ("get_value", "get_value_async"):
+        assert (
+            sample("risk_analyzer_db_operation_seconds_count", operation=operation) == 1
+        )
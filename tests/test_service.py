@@ -1,14 +1,35 @@
+from unittest import mock
+from uuid import uuid4
+
 import pandas as pd
 import pytest
 from bigdata_research_tools.tree import SemanticTree
+from bigdata_research_tools.workflows.risk_analyzer import RiskAnalyzer
+from sqlmodel import SQLModel
 
+from bigdata_risk_analyzer import service
+from bigdata_risk_analyzer.api.db import create_db_engine
+from bigdata_risk_analyzer.api.models import RiskAnalysisRequest
+from bigdata_risk_analyzer.api.storage import StorageManager
+from bigdata_risk_analyzer.checkpoints import CheckpointStore
+from bigdata_risk_analyzer.entity_cache import EntityCache
+from bigdata_risk_analyzer.metrics import StageTimer, WorkflowStage
 from bigdata_risk_analyzer.models import (
     LabeledContent,
     RiskAnalysisResponse,
     RiskScoring,
     RiskTaxonomy,
 )
-from bigdata_risk_analyzer.service import build_response
+from bigdata_risk_analyzer.service import (
+    ExtensionBase,
+    build_response,
+    find_taxonomy,
+    load_extension_base,
+    prepare_companies,
+    run_extension_stages,
+    run_workflow_stages,
+    tree_taxonomy,
+)
 
 
 @pytest.fixture
@@ -113,3 +134,527 @@ def test_build_response(df_company, df_motivation, df_labeled, risk_tree):
     assert isinstance(response.risk_scoring, RiskScoring)
     assert isinstance(response.content, LabeledContent)
     assert len(response.content.root) == 2
+
+
+def test_build_response_scores_and_content(
+    df_company, df_motivation, df_labeled, risk_tree
+):
+    response = build_response(df_company, df_motivation, df_labeled, risk_tree)
+
+    scoring = response.risk_scoring.root
+    assert list(scoring) == ["A", "B"]
+    # Risks a company is not exposed to (NaN in the dataframe) are left out
+    assert scoring["A"].risks.root == {"Risk1": 55}
+    assert scoring["B"].risks.root == {"Risk1": 45, "Risk 2 with long name": 5}
+    assert scoring["A"].motivation == "Growth"
+    assert scoring["B"].composite_score == 50
+
+    assert response.content is not None
+    chunk = response.content.root[1]
+    assert chunk.document_id == "D2"
+    assert chunk.sub_scenario == "Sub2"
+    assert chunk.highlights == ["Highlight2.1", "Highlight2.2"]
+
+
+def test_build_response_without_motivation(
+    df_company, df_motivation, df_labeled, risk_tree
+):
+    response = build_response(df_company, df_motivation.iloc[:1], df_labeled, risk_tree)
+    assert response.risk_scoring.root["B"].motivation is None
+
+
+def test_prepare_companies_with_entity_cache():
+    def entity(entity_id, entity_type="COMP"):
+        return mock.Mock(
+            entity_type=entity_type,
+            model_dump=lambda: {
+                "id": entity_id,
+                "name": entity_id,
+                "entity_type": entity_type,
+            },
+        )
+
+    bigdata = mock.Mock()
+    bigdata.watchlists.get.return_value.items = ["A", "P", "B"]
+    bigdata.knowledge_graph.get_entities.side_effect = lambda ids: [
+        entity(i, "PEOP" if i == "P" else "COMP") for i in ids
+    ]
+    cache = EntityCache()
+
+    companies = prepare_companies("W1", bigdata, entity_cache=cache)
+    assert [c.id for c in companies] == ["A", "B"]
+    companies = prepare_companies(["B", "C"], bigdata, entity_cache=cache)
+    assert [c.id for c in companies] == ["B", "C"]
+
+    assert bigdata.watchlists.get.call_count == 1
+    assert bigdata.knowledge_graph.get_entities.call_args_list == [
+        mock.call(["A", "P", "B"]),
+        mock.call(["C"]),
+    ]
+
+
+class FakeAnalyzer(RiskAnalyzer):
+    """Runs the workflow stages on fixed data, failing the n-th labeling call if asked."""
+
+    companies = ["A", "B"]
+
+    def __init__(self, risk_tree, df_sentences, fail_labeling_call=None):
+        self.risk_tree = risk_tree
+        self.df_sentences = df_sentences
+        self.fail_labeling_call = fail_labeling_call
+        self.calls = []
+
+    def notify_observers(self, message):
+        pass
+
+    def create_taxonomy(self):
+        self.calls.append("taxonomy")
+        return self.risk_tree, ["Summary"], ["Risk1"]
+
+    def retrieve_results(
+        self, sentences, frequency="3M", document_limit=10, batch_size=10
+    ):
+        self.calls.append("search")
+        return self.df_sentences
+
+    def label_search_results(
+        self, df_sentences, terminal_labels, risk_tree, additional_prompt_fields=None
+    ):
+        self.calls.append(("label", list(df_sentences["Document ID"])))
+        if len([c for c in self.calls if c[0] == "label"]) == self.fail_labeling_call:
+            raise RuntimeError("Rate limit exceeded")
+        return df_sentences, df_sentences.sort_values(["Company", "Date"])
+
+    def generate_results(self, df_labeled, word_range=(50, 100)):
+        self.calls.append("results")
+        return pd.DataFrame({"Company": ["A", "B"]}), None, pd.DataFrame()
+
+
+def test_run_workflow_stages_resumes_from_checkpoints(tmp_path, risk_tree):
+    df_sentences = pd.DataFrame(
+        {
+            "Company": ["B", "A", "B", "A", "A"],
+            "Date": [
+                "2025-01-05",
+                "2025-01-04",
+                "2025-01-03",
+                "2025-01-02",
+                "2025-01-01",
+            ],
+            "Sub-Scenario": ["Risk1"] * 5,
+            "Document ID": ["D1", "D2", "D3", "D4", "D5"],
+        }
+    )
+    request = mock.Mock(frequency="M", document_limit=10, batch_size=10)
+    request_id = uuid4()
+    checkpoints = CheckpointStore(tmp_path)
+
+    analyzer = FakeAnalyzer(risk_tree, df_sentences, fail_labeling_call=2)
+    with pytest.raises(RuntimeError):
+        run_workflow_stages(
+            analyzer, request, request_id, checkpoints, labeling_batch_size=2
+        )
+    assert checkpoints.names(request_id) == ["labels-00000000", "search", "taxonomy"]
+
+    analyzer = FakeAnalyzer(risk_tree, df_sentences)
+    timer = StageTimer()
+    results = run_workflow_stages(
+        analyzer, request, request_id, checkpoints, labeling_batch_size=2, timer=timer
+    )
+    assert analyzer.calls == [
+        ("label", ["D3", "D4"]),
+        ("label", ["D5"]),
+        "results",
+    ]
+    # Stages loaded from checkpoints are not timed
+    assert set(timer.timings) == {WorkflowStage.LABELING, WorkflowStage.SCORING}
+    assert list(results["df_labeled"]["Document ID"]) == ["D5", "D4", "D2", "D3", "D1"]
+    assert results["risk_tree"] == risk_tree
+
+    # Once the results are saved, no stage is run again
+    analyzer = FakeAnalyzer(risk_tree, df_sentences)
+    run_workflow_stages(analyzer, request, request_id, checkpoints)
+    assert analyzer.calls == []
+
+
+def test_run_workflow_stages_without_checkpoints(risk_tree):
+    df_sentences = pd.DataFrame(
+        {
+            "Company": ["A"],
+            "Date": ["2025-01-01"],
+            "Sub-Scenario": ["Risk1"],
+            "Document ID": ["D1"],
+        }
+    )
+    request = mock.Mock(frequency="M", document_limit=10, batch_size=10)
+    analyzer = FakeAnalyzer(risk_tree, df_sentences)
+    timer = StageTimer()
+    results = run_workflow_stages(analyzer, request, uuid4(), timer=timer)
+    assert analyzer.calls == ["taxonomy", "search", ("label", ["D1"]), "results"]
+    assert len(results["df_labeled"]) == 1
+    assert list(timer.rounded()) == ["taxonomy", "search", "labeling", "scoring"]
+
+
+def test_run_workflow_stages_with_stored_taxonomy(tmp_path, risk_tree):
+    df_sentences = pd.DataFrame(
+        {
+            "Company": ["A"],
+            "Date": ["2025-01-01"],
+            "Sub-Scenario": ["Risk1"],
+            "Document ID": ["D1"],
+        }
+    )
+    request = mock.Mock(frequency="M", document_limit=10, batch_size=10)
+    taxonomy_id = uuid4()
+    taxonomy = (risk_tree, ["Summary"], ["Risk1"])
+
+    analyzer = FakeAnalyzer(risk_tree, df_sentences)
+    results = run_workflow_stages(
+        analyzer,
+        request,
+        uuid4(),
+        CheckpointStore(tmp_path),
+        taxonomy=taxonomy,
+        taxonomy_id=taxonomy_id,
+    )
+    assert "taxonomy" not in analyzer.calls
+    assert results["taxonomy_id"] == taxonomy_id
+    assert results["taxonomy"] == taxonomy
+
+    # Generated taxonomies have no ID until they are stored
+    analyzer = FakeAnalyzer(risk_tree, df_sentences)
+    results = run_workflow_stages(analyzer, request, uuid4())
+    assert analyzer.calls[0] == "taxonomy"
+    assert results["taxonomy_id"] is None
+
+
+def test_tree_taxonomy(risk_tree):
+    risk_taxonomy = RiskTaxonomy.model_validate(risk_tree._to_dict())
+    tree, risk_summaries, terminal_labels = tree_taxonomy(risk_taxonomy)
+    assert tree._to_dict() == risk_tree._to_dict()
+    assert risk_summaries == risk_tree.get_terminal_summaries()
+    assert terminal_labels == ["Risk1", "Risk 2 with long name"]
+
+
+def test_find_taxonomy():
+    storage_manager = mock.Mock()
+    storage_manager.get_taxonomy.return_value = RiskTaxonomy(
+        label="Tree", node=1, summary=None
+    )
+    storage_manager.find_taxonomy.return_value = (
+        "latest-id",
+        RiskTaxonomy(label="Latest", node=1, summary=None),
+    )
+    taxonomy_id = uuid4()
+
+    request = mock.Mock(taxonomy_id=taxonomy_id, reuse_taxonomy=True)
+    found_id, taxonomy = find_taxonomy(request, storage_manager)
+    assert found_id == taxonomy_id
+    assert taxonomy is not None and taxonomy[0].label == "Tree"
+
+    request = mock.Mock(taxonomy_id=None, reuse_taxonomy=True)
+    found_id, taxonomy = find_taxonomy(request, storage_manager)
+    assert found_id == "latest-id"
+    assert taxonomy is not None and taxonomy[0].label == "Latest"
+
+    request = mock.Mock(taxonomy_id=None, reuse_taxonomy=False)
+    assert find_taxonomy(request, storage_manager) == (None, None)
+
+    storage_manager.get_taxonomy.return_value = None
+    request = mock.Mock(taxonomy_id=taxonomy_id, reuse_taxonomy=False)
+    with pytest.raises(ValueError):
+        find_taxonomy(request, storage_manager)
+
+
+def test_run_extension_stages(df_company, df_motivation, df_labeled, risk_tree):
+    base_report = build_response(df_company, df_motivation, df_labeled, risk_tree)
+    taxonomy_id = uuid4()
+    base = ExtensionBase(
+        request=mock.Mock(end_date="2025-01-31"),
+        report=base_report,
+        taxonomy_id=taxonomy_id,
+        taxonomy=(risk_tree, ["Summary"], ["Risk1"]),
+    )
+    # A new chunk for company A only, dated before the chunk of the report
+    df_new = df_labeled.iloc[:1].assign(
+        **{"Date": "2024-12-31", "Document ID": "D3", "Sub-Scenario": "Sub2"}
+    )
+
+    class ExtensionAnalyzer(FakeAnalyzer):
+        def generate_results(self, df_labeled, word_range=(50, 100)):
+            self.calls.append(("results", sorted(set(df_labeled["Company"]))))
+            return None, None, pd.DataFrame({"Company": ["A"], "Motivation": ["New"]})
+
+    analyzer = ExtensionAnalyzer(risk_tree, df_new)
+    request = mock.Mock(
+        frequency="M", document_limit=10, batch_size=10, end_date="2025-02-28"
+    )
+    results = run_extension_stages(analyzer, request, base)
+
+    assert analyzer.calls == ["search", ("label", ["D3"]), ("results", ["A"])]
+    assert list(results["df_labeled"]["Document ID"]) == ["D3", "D1", "D2"]
+    assert results["taxonomy_id"] == taxonomy_id
+    scores = results["df_company"].set_index("Company")
+    assert scores.loc["A", "Sub1"] == 1 and scores.loc["A", "Sub2"] == 1
+    assert scores.loc["B", "Sub2"] == 1
+    motivations = dict(results["df_motivation"].values)
+    assert motivations == {"A": "New", "B": "Decline"}
+
+    # Without new chunks, no motivation is generated again
+    analyzer = ExtensionAnalyzer(risk_tree, df_new.iloc[:0])
+    results = run_extension_stages(analyzer, request, base)
+    assert analyzer.calls == ["search"]
+    assert len(results["df_labeled"]) == 2
+    assert dict(results["df_motivation"].values) == {"A": "Growth", "B": "Decline"}
+
+
+def test_load_extension_base():
+    storage_manager = mock.Mock()
+    storage_manager.get_job_request.return_value = mock.Mock(end_date="2025-01-31")
+    taxonomy_id = uuid4()
+    storage_manager.get_analysis_report.return_value = mock.Mock(
+        taxonomy_id=taxonomy_id,
+        risk_taxonomy=RiskTaxonomy(label="Report", node=1, summary=None),
+    )
+    storage_manager.get_taxonomy.return_value = RiskTaxonomy(
+        label="Tree", node=1, summary=None
+    )
+
+    request = mock.Mock(extends_report_id=uuid4(), end_date="2025-02-28")
+    base = load_extension_base(request, storage_manager)
+    assert base.taxonomy_id == taxonomy_id
+    assert base.taxonomy[0].label == "Tree"
+
+    # Without a stored taxonomy, the taxonomy of the report is used
+    storage_manager.get_taxonomy.return_value = None
+    base = load_extension_base(request, storage_manager)
+    assert base.taxonomy_id is None
+    assert base.taxonomy[0].label == "Report"
+
+    request = mock.Mock(extends_report_id=uuid4(), end_date="2025-01-31")
+    with pytest.raises(ValueError, match="must be after"):
+        load_extension_base(request, storage_manager)
+
+    storage_manager.get_analysis_report.return_value = None
+    with pytest.raises(ValueError, match="not found"):
+        load_extension_base(request, storage_manager)
+
+
+def test_process_request_extends_report(
+    monkeypatch, df_company, df_motivation, df_labeled, risk_tree
+):
+    engine = create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    base_request = RiskAnalysisRequest(
+        main_theme="Theme",
+        focus="Focus",
+        companies=["A", "B"],
+        start_date="2025-01-01",
+        end_date="2025-01-31",
+        frequency="M",
+    )
+    # A report of a previous version, without a stored taxonomy
+    base_id = uuid4()
+    storage_manager.enqueue_job(base_id, base_request)
+    storage_manager.mark_workflow_as_completed(
+        base_id,
+        base_request,
+        build_response(df_company, df_motivation, df_labeled, risk_tree),
+    )
+
+    df_new = df_labeled.iloc[:1].assign(
+        **{"Date": "2025-02-10", "Document ID": "D3", "Sub-Scenario": "Sub2"}
+    )
+
+    class ExtensionAnalyzer(FakeAnalyzer):
+        def register_observer(self, observer):
+            pass
+
+        def generate_results(self, df_labeled, word_range=(50, 100)):
+            return None, None, pd.DataFrame({"Company": ["A"], "Motivation": ["New"]})
+
+    analyzers = []
+
+    def create_analyzer(request, companies, start_date, backend):
+        analyzers.append(ExtensionAnalyzer(None, df_new))
+        analyzers[-1].start_date = start_date
+        return analyzers[-1]
+
+    monkeypatch.setattr(service, "prepare_companies", lambda *args, **kwargs: [])
+    monkeypatch.setattr(service, "create_analyzer", create_analyzer)
+
+    request = RiskAnalysisRequest.model_validate(
+        {
+            **base_request.model_dump(),
+            "end_date": "2025-02-28",
+            "extends_report_id": base_id,
+        }
+    )
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request)
+    service.process_request(request, mock.Mock(), request_id, storage_manager)
+
+    assert analyzers[0].start_date == "2025-02-01"
+    assert analyzers[0].calls == ["search", ("label", ["D3"])]
+    report = storage_manager.get_analysis_report(request_id)
+    assert report is not None and report.content is not None
+    assert [chunk.document_id for chunk in report.content.root] == ["D1", "D3", "D2"]
+    assert report.risk_scoring.root["A"].motivation == "New"
+    assert report.risk_scoring.root["B"].motivation == "Decline"
+    # The taxonomy of the report is stored with the extended report
+    assert report.taxonomy_id is not None
+    taxonomy = storage_manager.get_taxonomy(report.taxonomy_id)
+    assert taxonomy == RiskTaxonomy.model_validate(risk_tree._to_dict())
+
+
+class EmptyAnalyzer(FakeAnalyzer):
+    """Analyzer that finds no chunks, with the results of the library for them."""
+
+    def register_observer(self, observer):
+        pass
+
+    def generate_results(self, df_labeled, word_range=(50, 100)):
+        self.calls.append("results")
+        return RiskAnalyzer.generate_results(self, df_labeled, word_range)
+
+
+def test_process_request_without_chunks(monkeypatch, df_labeled, risk_tree):
+    engine = create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    storage_manager = StorageManager(engine)
+    request = RiskAnalysisRequest(
+        main_theme="Theme",
+        focus="Focus",
+        companies=["A", "B"],
+        start_date="2025-01-01",
+        end_date="2025-01-31",
+        frequency="M",
+    )
+    analyzers = []
+
+    def create_analyzer(request, companies, start_date, backend):
+        analyzers.append(EmptyAnalyzer(risk_tree, df_labeled.iloc[:0]))
+        return analyzers[-1]
+
+    monkeypatch.setattr(service, "prepare_companies", lambda *args, **kwargs: [])
+    monkeypatch.setattr(service, "create_analyzer", create_analyzer)
+
+    request_id = uuid4()
+    storage_manager.enqueue_job(request_id, request)
+    service.process_request(request, mock.Mock(), request_id, storage_manager)
+
+    assert analyzers[0].calls == ["taxonomy", "search"]
+    report = storage_manager.get_analysis_report(request_id)
+    assert report is not None
+    assert report.risk_scoring == RiskScoring(root={})
+    assert report.content == LabeledContent(root=[])
+
+    # Extending a report without chunks, without new chunks either
+    extension = RiskAnalysisRequest.model_validate(
+        {
+            **request.model_dump(),
+            "end_date": "2025-02-28",
+            "extends_report_id": request_id,
+        }
+    )
+    extension_id = uuid4()
+    storage_manager.enqueue_job(extension_id, extension)
+    service.process_request(extension, mock.Mock(), extension_id, storage_manager)
+
+    assert analyzers[1].calls == ["search"]
+    report = storage_manager.get_analysis_report(extension_id)
+    assert report is not None
+    assert report.risk_scoring == RiskScoring(root={})
+    assert report.content == LabeledContent(root=[])
+
+
+class ShardAnalyzer(FakeAnalyzer):
+    """Analyzer created by the shard workers, finds one chunk per company, tagged with the
+    run it was found in."""
+
+    fail_company = None
+    run = 1
+
+    def __init__(self, companies, **kwargs):
+        super().__init__(risk_tree=None, df_sentences=None)
+        self.companies = companies
+
+    def retrieve_results(
+        self, sentences, frequency="3M", document_limit=10, batch_size=10
+    ):
+        if self.fail_company in self.companies:
+            raise RuntimeError("Rate limit exceeded")
+        return pd.DataFrame(
+            {
+                "Company": self.companies,
+                "Ticker": self.companies,
+                "Sector": "S",
+                "Industry": "I",
+                "Date": "2025-01-01",
+                "Sub-Scenario": "Risk1",
+                "Document ID": [f"D-{c}-{self.run}" for c in self.companies],
+            }
+        )
+
+    def generate_results(self, df_labeled, word_range=(50, 100)):
+        motivations = [f"Motivation {company}" for company in df_labeled["Company"]]
+        return (
+            None,
+            None,
+            pd.DataFrame({"Company": df_labeled["Company"], "Motivation": motivations}),
+        )
+
+
+def test_run_workflow_stages_in_shards(monkeypatch, tmp_path, risk_tree):
+    # Shard workers are forked, so they use the patched analyzer
+    monkeypatch.setattr(service, "RiskAnalyzer", ShardAnalyzer)
+    monkeypatch.setattr(ShardAnalyzer, "fail_company", "D")
+    request = RiskAnalysisRequest(
+        main_theme="Theme",
+        focus="Focus",
+        companies=["E", "B", "C", "D", "A"],
+        start_date="2025-01-01",
+        end_date="2025-01-31",
+        frequency="M",
+        parallelism=3,
+    )
+    request_id = uuid4()
+    checkpoints = CheckpointStore(tmp_path)
+    taxonomy = (risk_tree, ["Summary"], ["Risk1"])
+
+    def run():
+        return run_workflow_stages(
+            ShardAnalyzer(request.companies),
+            request,
+            request_id,
+            checkpoints,
+            taxonomy=taxonomy,
+            parallelism=request.parallelism,
+        )
+
+    with pytest.raises(RuntimeError):
+        run()
+    # Shards of [E], [B, C] and [D, A], the ones that completed are saved
+    assert checkpoints.names(request_id) == [
+        "shard-0000-of-0003",
+        "shard-0001-of-0003",
+        "taxonomy",
+    ]
+
+    # On resume only the failed shard runs again
+    monkeypatch.setattr(ShardAnalyzer, "fail_company", None)
+    monkeypatch.setattr(ShardAnalyzer, "run", 2)
+    results = run()
+    assert list(results["df_labeled"]["Document ID"]) == [
+        "D-A-2",
+        "D-B-1",
+        "D-C-1",
+        "D-D-2",
+        "D-E-1",
+    ]
+    assert list(results["df_company"]["Composite Score"]) == [1] * 5
+    assert sorted(results["df_motivation"]["Motivation"]) == [
+        f"Motivation {company}" for company in "ABCDE"
+    ]
+    assert results["taxonomy"] == taxonomy